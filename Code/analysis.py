@@ -1,109 +1,672 @@
 import numpy as np
 import pandas as pd
-import scipy.interpolate as interp
-import matplotlib.pyplot as plt
 import os
+import hashlib
+import json
+import shutil
+from utils import interpolate_curves, PricingCache
+import indicators as indicators
+import rolling_analytics as rolling_analytics
+import events as events
+import vol_surface as vol_surface
+from events import dividend_arrays, paid_dividends
 
 
 
 #Class: Read and process stock data so it can be used for back testing investment strategies. 
 class DataProcess:
+    #Increase when the processed data or the cache layout changes so old caches are rebuilt.
+    cache_version = 2
+    #Parameters that do not change the processed data and so are not part of the cache fingerprint.
+    runtime_parameters = ['cache_directory', 'pricing_cache_size', 'streaming', 'chunk_size', 'required_data']
+    #Datasets of the data file. Each dataset is read, processed and cached on its own, so a run only parses the tabs it needs.
+    datasets = ['prices', 'dividends', 'interest_rates', 'implied_vol']
+    implied_vol_list = ['30IV', '60IV','90IV','180IV','360IV']
+
     def __init__(self,file,**kwargs):
         self.file = file
 
         self.prices = None
         self.dividends = None
         self.interest_rates = None
-        self.implied_vol = {}
+        self.implied_vol = None
         self.kwargs = kwargs
+        self.fingerprint = None
+        self.indicators = None
+        self.calendar = None
+        self.vol_surface = None
+        self.pricing_cache = None
+        #In streaming mode the processed data stays in the cache files and is read in chunks by stream.
+        #A frame is only loaded into memory when it is requested with its get function.
+        self.streaming = self.kwargs.get('streaming', False)
+        #Datasets loaded with the DataProcess, e.g. those the strategies need (strategies.required_data). Every dataset when not given.
+        #Any other dataset is loaded the first time it is requested with its get function.
+        self.required_data = self.kwargs.get('required_data') or self.datasets
 
         self.load_data()
 
-    #Function: Load the tabs in the excel file and organize them into categories.
+    #Function: Load the required datasets. Each is loaded from the cache if it exists there, otherwise it is processed from the excel file and cached.
+    #The cache is only used when a cache directory is given.
     def load_data(self):
-        stock_data = pd.ExcelFile(self.file)
-        self.prices = pd.read_excel(stock_data, sheet_name='Price', index_col = 0, parse_dates=True)
-        self.dividends = pd.read_excel(stock_data, sheet_name='Dividend', index_col = 0, parse_dates=['Date','ExDate','RecordDate','PayDate'])
-        self.interest_rates = pd.read_excel(stock_data, sheet_name='Interest Rate', index_col = 0, header = 1, parse_dates=True)
-        implied_vol_list = ['30IV', '60IV','90IV','180IV','360IV']
-        for iv in implied_vol_list:
-            self.implied_vol[iv] = pd.read_excel(stock_data, sheet_name=iv, index_col = 0, header = 1, parse_dates=True)
-        
-        self.clean_data()
+        cache_path = self.get_cache_path()
+        if self.streaming and cache_path is None:
+            raise Exception("Please input a cache directory to use streaming mode.")
+        if not self.streaming:
+            self.load_datasets(self.required_data)
+            return
+
+        #Streaming reads every dataset from the cache, so the datasets missing from it are processed and cached first.
+        self.load_datasets([name for name in self.datasets if not os.path.exists(self.get_dataset_path(cache_path, name) + '/manifest.json')])
+        self.prices, self.dividends, self.interest_rates, self.implied_vol = None, None, None, None
+
+    #Function: Load datasets from the cache where they exist. The others are read and processed together from the excel file and cached.
+    def load_datasets(self, names):
+        cache_path = self.get_cache_path()
+        missing = []
+        for name in names:
+            dataset_path = self.get_dataset_path(cache_path, name)
+            if dataset_path is not None and os.path.exists(dataset_path + '/manifest.json'):
+                self.load_cache(dataset_path, name)
+            else:
+                missing.append(name)
+        if len(missing) == 0:
+            return
+
+        self.read_data(missing)
+        self.clean_data(missing)
+        self.interpolate_data(missing)
+        self.convert_percent(missing)
+
+        if cache_path is not None:
+            for name in missing:
+                self.save_cache(self.get_dataset_path(cache_path, name), name)
+
+    #Function: Load the tabs of the datasets in names from the excel file and organize them into categories. Every dataset when names is not given.
+    def read_data(self, names = None):
+        names = names or self.datasets
+        with pd.ExcelFile(self.file) as stock_data:
+            if 'prices' in names:
+                self.prices = pd.read_excel(stock_data, sheet_name='Price', index_col = 0, parse_dates=True)
+            if 'dividends' in names:
+                self.dividends = pd.read_excel(stock_data, sheet_name='Dividend', index_col = 0, parse_dates=['Date','ExDate','RecordDate','PayDate'])
+            if 'interest_rates' in names:
+                self.interest_rates = pd.read_excel(stock_data, sheet_name='Interest Rate', index_col = 0, header = 1, parse_dates=True)
+            if 'implied_vol' in names:
+                self.implied_vol = {}
+                for iv in self.implied_vol_list:
+                    self.implied_vol[iv] = pd.read_excel(stock_data, sheet_name=iv, index_col = 0, header = 1, parse_dates=True)
 
     #Function: Organize dividends and implied vols index to have same index as stock prices.
     #Implied vols are missing first 10 days of data.
-    def clean_data(self):
-        self.prices = self.prices.dropna(axis=1)
-        self.dividends = self.dividends.reindex(self.prices.index)
-        for iv in self.implied_vol.keys():
-            self.implied_vol[iv] = self.implied_vol[iv].reindex(self.prices.index, fill_value = 0)
-        
-        self.interpolate_data()
+    def clean_data(self, names = None):
+        names = names or self.datasets
+        if 'prices' in names:
+            self.prices = self.prices.dropna(axis=1)
+        if 'dividends' in names:
+            self.dividends = self.dividends.reindex(self.get_prices().index)
+        if 'implied_vol' in names:
+            for iv in self.implied_vol.keys():
+                self.implied_vol[iv] = self.implied_vol[iv].reindex(self.get_prices().index, fill_value = 0)
 
     #Function: Interpolate required data for back test strategies.
     #Interpolate 9 month implied vol and interest rates for put options in collar strategy.
-    def interpolate_data(self):
-        interpolate_maturity = self.kwargs['interpolate_maturity']
-        #Interpolate implied vol.
-        implied_vol_maturity = [int(iv_mat[:-2]) for iv_mat in self.implied_vol.keys()]
-        interpolate_iv = pd.DataFrame(data = 0, index = self.implied_vol['30IV'].index, columns = self.implied_vol['30IV'].columns)
-        #Need to interpolate implied vols across maturities for the same strike so we need to reformat the implied vol in the format (strike x maturity) for each date.
-        for date in interpolate_iv.index:
-            interpolate_date = np.zeros((interpolate_iv.shape[1],len(self.implied_vol)))
-            for j,iv in enumerate(self.implied_vol.keys()):
-                interpolate_date[:,j] = self.implied_vol[iv].loc[date].values
-            for strike, iv_per_strike in enumerate(interpolate_date):
-
-                interpolate_iv.loc[date,interpolate_iv.columns[strike]] = np.interp(interpolate_maturity,implied_vol_maturity,iv_per_strike)
-        self.implied_vol[str(interpolate_maturity)+"IV"] = interpolate_iv
-
-        interpolate_interest_rate = self.kwargs['interpolate_interest_rate']
-        #Interpolate interest rate. There is an error in the 7 day and 60 day interest rates. They remain constant over the 2022-2023 rate hike cycle.
-        interpolate_ir = pd.DataFrame(data = 0, index = self.interest_rates.index, columns = [interpolate_interest_rate])
-        for date in interpolate_ir.index:
-            interpolate_ir.loc[date,interpolate_interest_rate] = np.interp(interpolate_interest_rate, self.interest_rates.columns.to_numpy(),self.interest_rates.loc[date].values)
-        self.interest_rates = pd.concat([self.interest_rates,interpolate_ir],axis=1)
-
-        self.convert_percent()
+    #interpolate_maturity and interpolate_interest_rate can be a single maturity or a list of maturities.
+    def interpolate_data(self, names = None):
+        names = names or self.datasets
+        if 'implied_vol' in names:
+            interpolate_maturity = np.atleast_1d(self.kwargs['interpolate_maturity']).tolist()
+            #Interpolate implied vol.
+            #Stack the implied vol sheets into a (date x strike x maturity) array so every date and strike is interpolated across maturities at once.
+            implied_vol_maturity = sorted(self.implied_vol.keys(), key = lambda iv_mat: int(iv_mat[:-2]))
+            implied_vol_stack = np.stack([self.implied_vol[iv].to_numpy(dtype = float) for iv in implied_vol_maturity], axis = -1)
+            interpolate_iv = interpolate_curves(interpolate_maturity, [int(iv_mat[:-2]) for iv_mat in implied_vol_maturity], implied_vol_stack)
+            for j, maturity in enumerate(interpolate_maturity):
+                self.implied_vol[str(maturity)+"IV"] = pd.DataFrame(data = interpolate_iv[:,:,j], index = self.implied_vol['30IV'].index, columns = self.implied_vol['30IV'].columns)
+
+        if 'interest_rates' in names:
+            interpolate_interest_rate = [maturity for maturity in np.atleast_1d(self.kwargs['interpolate_interest_rate']).tolist() if maturity not in self.interest_rates.columns]
+            #Interpolate interest rate. There is an error in the 7 day and 60 day interest rates. They remain constant over the 2022-2023 rate hike cycle.
+            interest_rate_maturity = np.sort(self.interest_rates.columns.to_numpy())
+            interpolate_ir = interpolate_curves(interpolate_interest_rate, interest_rate_maturity, self.interest_rates.loc[:,interest_rate_maturity].to_numpy(dtype = float))
+            interpolate_ir = pd.DataFrame(data = interpolate_ir, index = self.interest_rates.index, columns = interpolate_interest_rate)
+            self.interest_rates = pd.concat([self.interest_rates,interpolate_ir],axis=1)
 
     #Function: Convert dividend yields, interest rates and implied vol from percentages to actual value, this makes it easier when performing calculations.
-    def convert_percent(self):
+    def convert_percent(self, names = None):
+        names = names or self.datasets
         denominator = 100
-        self.prices['12M Div Yield'] /= denominator
-        self.interest_rates /= denominator
-        for iv in self.implied_vol.keys():
-            self.implied_vol[iv] /= denominator
+        if 'prices' in names:
+            self.prices['12M Div Yield'] /= denominator
+        if 'interest_rates' in names:
+            self.interest_rates /= denominator
+        if 'implied_vol' in names:
+            for iv in self.implied_vol.keys():
+                self.implied_vol[iv] /= denominator
+
+    #Function: Hash of the data file contents and the data parameters. Used to identify the processed data in the cache.
+    def get_fingerprint(self):
+        if self.fingerprint is None:
+            file_hash = hashlib.sha256()
+            with open(self.file, 'rb') as file:
+                for block in iter(lambda: file.read(1 << 20), b''):
+                    file_hash.update(block)
+            parameters = {key : value for key, value in self.kwargs.items() if key not in self.runtime_parameters}
+            file_hash.update(json.dumps([self.cache_version, parameters], sort_keys = True, default = str).encode())
+            self.fingerprint = file_hash.hexdigest()[:16]
+        return self.fingerprint
+
+    #Function: Location of the cached data for the current data file and parameters.
+    def get_cache_path(self):
+        cache_directory = self.kwargs.get('cache_directory')
+        if cache_directory is None:
+            return None
+        dir_path = os.path.dirname(os.path.realpath(__file__))
+        return '{}{}/{}_{}'.format(dir_path, cache_directory, os.path.splitext(os.path.basename(self.file))[0], self.get_fingerprint())
+
+    #Function: Location of the cached data of one dataset. Each dataset has its own directory in the cache.
+    def get_dataset_path(self, cache_path, name):
+        return None if cache_path is None else '{}/{}'.format(cache_path, name)
+
+    #Function: Processed frames of a dataset by name. The implied vol frames are named 'implied_vol/<tab name>'.
+    def get_frames(self, name):
+        if name == 'implied_vol':
+            return {'implied_vol/' + iv : frame for iv, frame in self.implied_vol.items()}
+        return {name : getattr(self, name)}
+
+    #Function: Store every processed frame of a dataset column by column as .npy files, with a manifest describing how to rebuild the frames.
+    #The cache is written to a temporary directory first so a partially written cache is never read.
+    #The files are read without pickle, so text columns are stored as fixed width unicode and listed in the manifest to be turned back into objects.
+    def save_cache(self, dataset_path, name):
+        frames = self.get_frames(name)
+
+        temp_path = '{}.tmp{}'.format(dataset_path, os.getpid())
+        os.makedirs(temp_path, exist_ok = True)
+        manifest = {}
+        for number, (frame_name, frame) in enumerate(frames.items()):
+            index, text_index = self.cache_values(frame.index.to_numpy(), frame_name, 'index')
+            np.save('{}/{}_index.npy'.format(temp_path, number), index, allow_pickle = False)
+            text_columns = []
+            for i, column in enumerate(frame.columns):
+                values, text = self.cache_values(frame[column].to_numpy(), frame_name, column)
+                np.save('{}/{}_{}.npy'.format(temp_path, number, i), values, allow_pickle = False)
+                if text:
+                    text_columns.append(i)
+            manifest[frame_name] = {'number' : number, 'index_name' : frame.index.name, 'columns' : frame.columns.tolist(), 'text_index' : text_index, 'text_columns' : text_columns}
+        with open(temp_path + '/manifest.json', 'w') as file:
+            json.dump(manifest, file)
+
+        try:
+            os.rename(temp_path, dataset_path)
+        except OSError:
+            #Another run has already written the same cache.
+            shutil.rmtree(temp_path, ignore_errors = True)
+
+    #Function: Rebuild the processed frames of a dataset from the cache.
+    def load_cache(self, dataset_path, name):
+        manifest = self.load_manifest(dataset_path)
+        frames = {frame_name : self.load_frame(dataset_path, manifest, frame_name) for frame_name in manifest.keys()}
+        if name == 'implied_vol':
+            self.implied_vol = {frame_name.split('/')[1] : frame for frame_name, frame in frames.items()}
+        else:
+            setattr(self, name, frames[name])
+
+    #Function: Values of a column (or the index) of a frame to store in the cache, and whether they are text. Object columns of strings are
+    #stored as fixed width unicode. Other object columns (e.g. text mixed with numbers or missing values) would need pickle, so they are rejected.
+    def cache_values(self, values, frame_name, column):
+        if values.dtype != object:
+            return values, False
+        if not all(isinstance(value, str) for value in values):
+            raise Exception("The {} column of the {} data has values that are not numbers, dates or text and can not be cached. Please fix the data or run without a cache directory.".format(column, frame_name))
+        return np.array(values.tolist(), dtype = str), True
+
+    #Function: Values of a column (or the index) loaded from the cache, with text turned back into objects as in the processed frame.
+    def cached_values(self, values, text):
+        return values.astype(object) if text else values
+
+    def load_manifest(self, cache_path):
+        with open(cache_path + '/manifest.json', 'r') as file:
+            return json.load(file)
+
+    #Function: Rebuild one processed frame from the cache. With mmap_mode 'r' the columns are memory mapped and only the rows used are read from disk,
+    #and the text columns are turned back into objects when the rows are read (see stream).
+    def load_frame(self, cache_path, manifest, name, mmap_mode = None):
+        frame = manifest[name]
+        index = np.load('{}/{}_index.npy'.format(cache_path, frame['number']), mmap_mode = mmap_mode)
+        columns = [np.load('{}/{}_{}.npy'.format(cache_path, frame['number'], i), mmap_mode = mmap_mode) for i in range(len(frame['columns']))]
+        if mmap_mode is not None:
+            return index, columns
+        index = self.cached_values(index, frame.get('text_index', False))
+        columns = [self.cached_values(values, i in frame.get('text_columns', [])) for i, values in enumerate(columns)]
+        return pd.DataFrame(dict(zip(frame['columns'], columns)), index = pd.Index(index, name = frame['index_name']), columns = frame['columns'])
+
+    #Function: Iterate over the processed data in chunks of chunk_size dates, aligned with the price dates.
+    #Each chunk is a dict with the prices, dividends and interest rates frames and a dict of the implied vol frames for the dates of the chunk.
+    #In streaming mode the chunks are read from the memory mapped cache files, so only one chunk of every frame is in memory at a time.
+    #Otherwise the chunks are slices of the loaded frames, and the implied vols are only included when they are loaded (no streaming strategy uses them).
+    def stream(self, chunk_size = None, after = None):
+        chunk_size = chunk_size or self.kwargs.get('chunk_size', 10000)
+        if self.streaming:
+            cache_path = self.get_cache_path()
+            manifest = {}
+            frames = {}
+            for dataset in self.datasets:
+                dataset_path = self.get_dataset_path(cache_path, dataset)
+                dataset_manifest = self.load_manifest(dataset_path)
+                manifest.update(dataset_manifest)
+                frames.update({name : self.load_frame(dataset_path, dataset_manifest, name, mmap_mode = 'r') for name in dataset_manifest.keys()})
+        else:
+            manifest = None
+            frames = {'prices' : self.get_prices(), 'dividends' : self.get_dividends(), 'interest_rates' : self.get_interest_rates()}
+            if self.implied_vol is not None:
+                frames.update(self.get_frames('implied_vol'))
+
+        dates = frames['prices'][0] if self.streaming else frames['prices'].index.to_numpy()
+        #Only the dates after a date (e.g. the last date of a back test checkpoint) are streamed when after is given.
+        first = 0 if after is None else np.searchsorted(dates, np.datetime64(after), side = 'right')
+        for start in range(first, len(dates), chunk_size):
+            chunk_dates = pd.DatetimeIndex(np.array(dates[start:start+chunk_size]), name = 'Date')
+            chunk = {'implied_vol' : {}}
+            for name, frame in frames.items():
+                if self.streaming:
+                    #Rows of the frame between the first and last date of the chunk. The frames are sorted by date.
+                    index, columns = frame
+                    first, last = np.searchsorted(index, chunk_dates[[0, -1]].to_numpy())
+                    last = min(last + 1, len(index))
+                    text_columns = manifest[name].get('text_columns', [])
+                    frame = pd.DataFrame({column : self.cached_values(np.array(values[first:last]), i in text_columns) for i, (column, values) in enumerate(zip(manifest[name]['columns'], columns))}, index = pd.Index(np.array(index[first:last])), columns = manifest[name]['columns'])
+                frame = frame.reindex(chunk_dates) if self.streaming or name == 'interest_rates' else frame.iloc[start:start+chunk_size]
+                if name.startswith('implied_vol/'):
+                    chunk['implied_vol'][name.split('/')[1]] = frame
+                else:
+                    chunk[name] = frame
+            yield chunk
 
     #The following functions are used to get stock data from the DataProcess class.
+    #A dataset that is not loaded yet (not required, or in streaming mode) is loaded on its first request and kept.
     def get_prices(self):
+        if self.prices is None:
+            self.load_datasets(['prices'])
         return self.prices
 
     def get_dividends(self):
+        if self.dividends is None:
+            self.load_datasets(['dividends'])
         return self.dividends
     
     def get_interest_rates(self):
+        if self.interest_rates is None:
+            self.load_datasets(['interest_rates'])
         return self.interest_rates
     
     def get_implied_vol(self):
+        if self.implied_vol is None:
+            self.load_datasets(['implied_vol'])
+        return self.implied_vol
+
+    #Rolling indicators are shared by every strategy using this data.
+    def get_indicators(self):
+        if self.indicators is None:
+            self.indicators = indicators.Indicators(self)
+        return self.indicators
+
+    #The event calendar (dividends, option maturities and rolls) is shared by the back tests and strategies using this data.
+    def get_calendar(self):
+        if self.calendar is None:
+            self.calendar = events.EventCalendar(self)
+        return self.calendar
+
+    #The implied vol surface is built once and shared by the strategies using this data.
+    def get_vol_surface(self):
+        if self.vol_surface is None:
+            self.vol_surface = vol_surface.VolSurface(self)
+        return self.vol_surface
+
+    #Option prices are shared by every strategy using this data and saved next to the data cache so later runs reuse them.
+    def get_pricing_cache(self):
+        if self.pricing_cache is None:
+            cache_path = self.get_cache_path()
+            file = cache_path + '/pricing_cache.pkl' if cache_path is not None and os.path.exists(cache_path) else None
+            self.pricing_cache = PricingCache(max_size = self.kwargs.get('pricing_cache_size', 100000), file = file)
+        return self.pricing_cache
+
+
+#Class: Zero-copy view of a date range of a DataProcess, e.g. the in-sample and out-of-sample windows of a walk-forward analysis.
+#Rows start to stop of the price dates. The frames are row slices of the DataProcess frames and share their memory.
+#The indicators are those of the whole history sliced to the range, so the indicators at the start of the range use the history before it.
+#The event calendar is built for the range, so a strategy on the view starts at the start of the range. Option prices go through the DataProcess pricing cache.
+class DataView:
+
+    def __init__(self,data_process,start,stop):
+        self.data_process = data_process
+        self.kwargs = data_process.kwargs
+        self.start = start
+        self.stop = stop
+        self.prices = self.data_process.get_prices().iloc[start:stop]
+        self.dates = self.prices.index
+        self.dividends = self.slice(self.data_process.get_dividends())
+        self.interest_rates = self.slice(self.data_process.get_interest_rates())
+        self.implied_vol = None
+        self.indicators = None
+        self.calendar = None
+        self.vol_surface = None
+
+    #Function: Rows of a frame sorted by date from the first to the last date of the view.
+    def slice(self,frame):
+        return frame.iloc[frame.index.searchsorted(self.dates[0]):frame.index.searchsorted(self.dates[-1], side = 'right')]
+
+    def get_prices(self):
+        return self.prices
+
+    def get_dividends(self):
+        return self.dividends
+
+    def get_interest_rates(self):
+        return self.interest_rates
+
+    def get_implied_vol(self):
+        if self.implied_vol is None:
+            self.implied_vol = {name : self.slice(frame) for name, frame in self.data_process.get_implied_vol().items()}
         return self.implied_vol
 
+    def get_indicators(self):
+        if self.indicators is None:
+            self.indicators = indicators.IndicatorView(self.data_process.get_indicators(), self.start, self.stop)
+        return self.indicators
+
+    def get_calendar(self):
+        if self.calendar is None:
+            self.calendar = events.EventCalendar(self)
+        return self.calendar
+
+    def get_vol_surface(self):
+        if self.vol_surface is None:
+            self.vol_surface = vol_surface.VolSurface(self)
+        return self.vol_surface
+
+    def get_pricing_cache(self):
+        return self.data_process.get_pricing_cache()
+
+    #Function: Chunks of the view in the layout of DataProcess.stream. The chunks are views of the frames, which are already in memory.
+    def stream(self, chunk_size = None, after = None):
+        chunk_size = chunk_size or self.kwargs.get('chunk_size', 10000)
+        first = 0 if after is None else self.dates.searchsorted(after, side = 'right')
+        for start in range(self.start + first, self.stop, chunk_size):
+            chunk = DataView(self.data_process, start, min(start + chunk_size, self.stop))
+            yield {'prices' : chunk.get_prices(), 'dividends' : chunk.get_dividends(), 'interest_rates' : chunk.get_interest_rates().reindex(chunk.dates),
+                   'implied_vol' : chunk.get_implied_vol()}
+
+#Function: Bars of a chunk of DataProcess.stream or DataView.stream, one dict per date as a live feed would deliver them. A bar has the date, price,
+#dividend yield and overnight interest rate of the day, and the ex-date flag, pay date and amount of a dividend. With market_data the bar also has
+#the implied vol of every tab by strike ('Implied Vol', e.g. bar['Implied Vol']['30IV'][1.05]) and the interest rate of every maturity ('Interest Rates').
+def chunk_bars(chunk, market_data = False):
+    dates = chunk['prices'].index
+    prices = chunk['prices'].loc[:,'Price'].to_numpy(dtype = float)
+    dividend_yield = chunk['prices'].loc[:,'12M Div Yield'].to_numpy(dtype = float)
+    ex_dates = chunk['dividends'].loc[:,'ExDate'].notnull().to_numpy()
+    pay_dates = chunk['dividends'].loc[:,'PayDate'].tolist()
+    dividend_amounts = chunk['dividends'].loc[:,'Amount'].to_numpy()
+    interest_rates = chunk['interest_rates'].loc[:,1].to_numpy(dtype = float)
+    if market_data:
+        rate_maturities = chunk['interest_rates'].columns.tolist()
+        rates = chunk['interest_rates'].to_numpy(dtype = float)
+        implied_vol = {name : (frame.columns.tolist(), frame.to_numpy(dtype = float)) for name, frame in chunk['implied_vol'].items()}
+
+    for i, date in enumerate(dates):
+        bar = {'Date' : date, 'Price' : prices[i], '12M Div Yield' : dividend_yield[i], 'Interest Rate' : interest_rates[i],
+               'ExDate' : ex_dates[i], 'PayDate' : pay_dates[i], 'Dividend' : dividend_amounts[i]}
+        if market_data:
+            bar['Implied Vol'] = {name : dict(zip(strikes, vols[i])) for name, (strikes, vols) in implied_vol.items()}
+            bar['Interest Rates'] = dict(zip(rate_maturities, rates[i]))
+        yield bar
+
+#Class: Panel of stock data for a universe of assets. Prices, dividends paid and dividend yields are stored as date x asset float64 arrays,
+#so memory grows linearly with assets x days. Interest rates are shared by the assets and have the same layout as DataProcess (a column per maturity in days).
+#dividends holds the dividend per share paid on each date, following the same ex-date and pay date rules as the single stock back test.
+class PanelData:
+
+    def __init__(self,prices,interest_rates,**kwargs):
+        self.kwargs = kwargs
+        self.dates = prices.index
+        self.assets = list(prices.columns)
+        self.prices = prices.to_numpy(dtype = float)
+        self.interest_rates = interest_rates.reindex(self.dates)
+        dividends = self.kwargs.get('dividends')
+        self.dividends = np.zeros(self.prices.shape) if dividends is None else dividends.reindex(index = self.dates, columns = self.assets).fillna(0).to_numpy(dtype = float)
+        dividend_yield = self.kwargs.get('dividend_yield')
+        self.dividend_yield = np.zeros(self.prices.shape) if dividend_yield is None else dividend_yield.reindex(index = self.dates, columns = self.assets).to_numpy(dtype = float)
+        self.indicators = None
+
+    #Function: Build the panel from one processed DataProcess per asset (a dict of asset name to DataProcess).
+    #Only the dates every asset has data for are kept. The interest rates of the first asset are used.
+    @classmethod
+    def from_data_processes(cls,data_processes):
+        assets = list(data_processes.keys())
+        dates = data_processes[assets[0]].get_prices().index
+        for asset in assets[1:]:
+            dates = dates.intersection(data_processes[asset].get_prices().index)
+
+        prices = pd.DataFrame({asset : data_processes[asset].get_prices().loc[dates,'Price'] for asset in assets}, index = dates)
+        dividend_yield = pd.DataFrame({asset : data_processes[asset].get_prices().loc[dates,'12M Div Yield'] for asset in assets}, index = dates)
+        dividends = pd.DataFrame({asset : paid_dividends(*dividend_arrays(dates,data_processes[asset].get_dividends().reindex(dates)))[0] for asset in assets}, index = dates)
+        return cls(prices,data_processes[assets[0]].get_interest_rates(),dividends = dividends,dividend_yield = dividend_yield)
+
+    #The frames are views of the panel arrays.
+    def get_prices(self):
+        return pd.DataFrame(self.prices, index = self.dates, columns = self.assets, copy = False)
+
+    def get_dividends(self):
+        return pd.DataFrame(self.dividends, index = self.dates, columns = self.assets, copy = False)
+
+    def get_dividend_yield(self):
+        return pd.DataFrame(self.dividend_yield, index = self.dates, columns = self.assets, copy = False)
+
+    def get_interest_rates(self):
+        return self.interest_rates
+
+    def get_indicators(self):
+        if self.indicators is None:
+            self.indicators = indicators.Indicators(self)
+        return self.indicators
 
 #Class: Creates a log for each transaction
 class Transactions:
 
-    def __init__(self, data_process):
+    transaction_types = ['Buy', 'Sell', 'Transaction Costs', 'Dividend']
+
+    #The transactions are stored as typed columns in fixed size chunks that are allocated when the previous chunk is full,
+    #so logging never copies the transactions already logged. Assets are stored as codes into a list of the asset names.
+    def __init__(self, data_process, **kwargs):
         self.data_process = data_process
-        self.transactions = []
+        self.kwargs = kwargs
+        self.chunk_size = self.kwargs.get('chunk_size', 4096)
+        self.chunks = []
+        self.size = 0 #Number of transactions in the last chunk.
+        self.assets = []
+        self.asset_codes = {}
+        self.type_codes = {transaction_type : code for code, transaction_type in enumerate(self.transaction_types)}
+        #Aggregates are updated as transactions are logged so the metrics do not need to scan the log.
+        self.turnover = 0
+        self.total_transaction_costs = 0
+        self.transactions_frame = None
+
+    def new_chunk(self):
+        self.chunks.append({'Date' : np.empty(self.chunk_size, dtype = 'datetime64[ns]'), 'Asset' : np.empty(self.chunk_size, dtype = np.int32),
+                            'Quantity' : np.empty(self.chunk_size), 'Price' : np.empty(self.chunk_size), 'Transaction Type' : np.empty(self.chunk_size, dtype = np.int8)})
+        self.size = 0
+
+    def asset_code(self,asset):
+        if asset not in self.asset_codes:
+            self.asset_codes[asset] = len(self.assets)
+            self.assets.append(asset)
+        return self.asset_codes[asset]
 
     def log_transaction(self,date,asset,quantity,price,transaction_type):
-        self.transactions.append([date,asset,quantity,price,transaction_type])
-
+        self.log_transactions([date],asset,[quantity],[price],transaction_type)
+
+    #Function: Log many transactions of one type at once, e.g. every dividend paid between two trades or every asset bought on a day.
+    #asset, quantities and prices are single values or have one value per date.
+    def log_transactions(self,dates,asset,quantities,prices,transaction_type):
+        if transaction_type not in self.type_codes:
+            raise Exception("Please input a valid transaction type.")
+        dates = np.asarray(dates, dtype = 'datetime64[ns]')
+        quantities = np.broadcast_to(np.asarray(quantities, dtype = float), dates.shape)
+        prices = np.broadcast_to(np.asarray(prices, dtype = float), dates.shape)
+        asset_code = self.asset_code(asset) if np.ndim(asset) == 0 else np.array([self.asset_code(name) for name in asset], dtype = np.int32)
+        written = 0
+        while written < len(dates):
+            if len(self.chunks) == 0 or self.size == len(self.chunks[-1]['Date']):
+                self.new_chunk()
+            chunk = self.chunks[-1]
+            count = min(len(dates) - written, len(chunk['Date']) - self.size)
+            chunk['Date'][self.size:self.size+count] = dates[written:written+count]
+            chunk['Asset'][self.size:self.size+count] = asset_code if np.ndim(asset_code) == 0 else asset_code[written:written+count]
+            chunk['Quantity'][self.size:self.size+count] = quantities[written:written+count]
+            chunk['Price'][self.size:self.size+count] = prices[written:written+count]
+            chunk['Transaction Type'][self.size:self.size+count] = self.type_codes[transaction_type]
+            self.size += count
+            written += count
+
+        #Summed in logging order, the same as summing the log.
+        for quantity, price in zip(quantities.tolist(), prices.tolist()):
+            if transaction_type in ['Buy', 'Sell']:
+                self.turnover += quantity
+            elif transaction_type == 'Transaction Costs':
+                self.total_transaction_costs += price * quantity
+        self.transactions_frame = None
+
+    def __len__(self):
+        return sum(len(chunk['Date']) for chunk in self.chunks[:-1]) + self.size
+
+    #Function: Merge the chunks into a single chunk holding exactly the logged transactions.
+    def consolidate(self):
+        if len(self.chunks) == 0:
+            self.new_chunk()
+        if len(self.chunks) == 1 and self.size == len(self.chunks[0]['Date']):
+            return self.chunks[0]
+        columns = {column : np.concatenate([chunk[column] for chunk in self.chunks[:-1]] + [self.chunks[-1][column][:self.size]]) for column in self.chunks[0].keys()}
+        self.chunks = [columns]
+        self.size = len(columns['Date'])
+        return columns
+
+    #The log frame is only rebuilt when new transactions have been logged since the last call.
+    #The frame is a view of the ledger columns, with the asset and transaction type as categoricals.
     def get_log(self):
-        self.transactions = np.array(self.transactions)
-        self.transactions_frame = pd.DataFrame(data = self.transactions[:,1:],index = self.transactions[:,0], columns = ['Asset', 'Quantity', 'Price', 'Transaction Type'])
+        if self.transactions_frame is None:
+            columns = self.consolidate()
+            self.transactions_frame = pd.DataFrame({'Asset' : pd.Categorical.from_codes(columns['Asset'], categories = self.assets),
+                                                    'Quantity' : columns['Quantity'], 'Price' : columns['Price'],
+                                                    'Transaction Type' : pd.Categorical.from_codes(columns['Transaction Type'], categories = self.transaction_types)},
+                                                   index = pd.DatetimeIndex(columns['Date']), copy = False)
         return self.transactions_frame
 
+    #Function: Total quantity bought and sold and total transaction costs paid.
+    def get_aggregates(self):
+        return {'Turnover Quantity' : self.turnover, 'Transaction Costs' : self.total_transaction_costs}
+
+    #Function: Export the transaction log to a Parquet file. Requires pyarrow or fastparquet.
+    def to_parquet(self,file):
+        self.get_log().to_parquet(file)
+
+    #The data is not pickled with the log (e.g. when sent back from a worker process).
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['data_process'] = None
+        return state
+
+#Class: Streaming version of the portfolio performance metrics. The BackTest updates it at the end of every day
+#so the metrics are available as soon as the back test finishes. Uses the same definitions as Analysis.performance_metrics.
+class MetricsAccumulator:
+
+    def __init__(self):
+        self.first_date = None
+        self.last_date = None
+        self.terminal_value = None
+        self.previous_value = None
+        self.count = 0
+        self.excess_growth = 1
+        #Running mean and sum of squared deviations of the daily excess returns (Welford's method).
+        self.excess_mean = 0
+        self.excess_m2 = 0
+        self.running_max = None
+        self.max_drawdown = None
+        self.max_drawdown_date = None
+
+    #Function: Add the portfolio value and annual overnight interest rate of the next date.
+    #Missing portfolio values are treated as unchanged from the previous value, the same as pct_change in performance_metrics.
+    def update(self,date,portfolio_value,interest_rate):
+        if self.first_date is None:
+            self.first_date = date
+        elif self.previous_value is not None:
+            current_value = self.previous_value if np.isnan(portfolio_value) else portfolio_value
+            excess_return = current_value/self.previous_value - 1 - ((1+interest_rate)**(1/365) - 1)
+            if not np.isnan(excess_return):
+                self.excess_growth *= 1 + excess_return
+                self.count += 1
+                delta = excess_return - self.excess_mean
+                self.excess_mean += delta/self.count
+                self.excess_m2 += delta*(excess_return - self.excess_mean)
+
+        if not np.isnan(portfolio_value):
+            self.previous_value = portfolio_value
+            self.running_max = portfolio_value if self.running_max is None else max(self.running_max,portfolio_value)
+            drawdown = (self.running_max-portfolio_value)/self.running_max
+            if self.max_drawdown is None or drawdown > self.max_drawdown:
+                self.max_drawdown = drawdown
+                self.max_drawdown_date = date
+        self.last_date = date
+        self.terminal_value = portfolio_value
+
+    #Function: Add the portfolio values and annual overnight interest rates of several dates at once. Gives the same metrics as calling update for each date.
+    #The daily excess return statistics of the new dates are combined with the existing ones (Chan's parallel variance formula).
+    def extend(self,dates,portfolio_values,interest_rates):
+        if len(dates) == 0:
+            return
+        portfolio_values = np.asarray(portfolio_values, dtype = float)
+        if self.first_date is None:
+            self.first_date = dates[0]
+
+        previous_values = pd.Series(np.append(np.nan if self.previous_value is None else self.previous_value, portfolio_values)).ffill().to_numpy()
+        excess_returns = previous_values[1:]/previous_values[:-1] - 1 - ((1+np.asarray(interest_rates, dtype = float))**(1/365) - 1)
+        excess_returns = excess_returns[~np.isnan(excess_returns)]
+        if len(excess_returns) > 0:
+            count = self.count + len(excess_returns)
+            mean = np.mean(excess_returns)
+            delta = mean - self.excess_mean
+            self.excess_growth *= np.prod(1 + excess_returns)
+            self.excess_m2 += np.sum((excess_returns - mean)**2) + delta**2 * self.count * len(excess_returns) / count
+            self.excess_mean += delta * len(excess_returns) / count
+            self.count = count
+
+        valid = ~np.isnan(portfolio_values)
+        if valid.any():
+            values = portfolio_values[valid]
+            running_max = np.maximum.accumulate(values)
+            if self.running_max is not None:
+                running_max = np.maximum(running_max, self.running_max)
+            drawdowns = (running_max-values)/running_max
+            worst = np.argmax(drawdowns)
+            if self.max_drawdown is None or drawdowns[worst] > self.max_drawdown:
+                self.max_drawdown = drawdowns[worst]
+                self.max_drawdown_date = dates[np.flatnonzero(valid)[worst]]
+            self.previous_value = values[-1]
+            self.running_max = running_max[-1]
+        self.last_date = dates[-1]
+        self.terminal_value = portfolio_values[-1]
+
+    def get_metrics(self):
+        metrics = {}
+        days = (self.last_date - self.first_date).days
+        annualized_excess_return = self.excess_growth ** (365/days) - 1
+        annualized_excess_return_volatility = np.sqrt(self.excess_m2/(self.count-1)) * np.sqrt(365)
+
+        metrics['Terminal Value'] = self.terminal_value
+        metrics['Annualized Excess Return'] = annualized_excess_return
+        metrics['Annualized Excess Return Volatility'] = annualized_excess_return_volatility
+        metrics['Sharpe Ratio'] = annualized_excess_return / annualized_excess_return_volatility
+        metrics['Maximum Drawdown'] = self.max_drawdown
+        metrics['Maximum Drawdown Date'] = self.max_drawdown_date
+        return metrics
+
 #Class: Analyze Backtest Results
 class Analysis:
 
@@ -116,11 +679,15 @@ class Analysis:
         self.timestr = self.kwargs['timestr']
         dir_path = os.path.dirname(os.path.realpath(__file__))
         self.directory = kwargs['directory']
-        self.directory = str(dir_path)+self.directory+self.timestr+'/'+self.strategy_name
-        if not os.path.exists(self.directory):
-            os.makedirs(self.directory)
+        #No output directory is created when directory is None, e.g. when only the metrics are needed.
+        if self.directory is not None:
+            self.directory = str(dir_path)+self.directory+self.timestr+'/'+self.strategy_name
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
 
+    #pyplot is imported when the first chart is made, so runs without charts do not load it.
     def plot_mv(self):
+        import matplotlib.pyplot as plt
         portfolio_value = self.backtest.get_portfolio_value_frame()
         portfolio_value.plot()
         plt.xlabel('Date')
@@ -129,11 +696,49 @@ class Analysis:
         plt.savefig('{}/{}.png'.format(self.directory,self.strategy_name))          
         plt.show()
 
+    #Function: Save the portfolio value chart without displaying it. Uses its own figure and the Agg canvas instead of pyplot,
+    #so charts can be rendered from a background thread.
+    def save_mv(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        figure = Figure()
+        FigureCanvasAgg(figure)
+        axes = figure.add_subplot()
+        self.backtest.get_portfolio_value_frame().plot(ax = axes)
+        axes.set_xlabel('Date')
+        axes.set_ylabel('Portfolio Value ($)')
+        axes.set_title('{} {} {}'.format(self.strategy_name, 'Strategy', 'Portfolio Value'))
+        figure.savefig('{}/{}.png'.format(self.directory,self.strategy_name))
+
     def display_transactions(self):
-        print('Transactions {} Strategy : '.format(self.strategy_name), self.transactions.get_log())
-        self.transactions.get_log().to_csv('{}/Transaction_Log_{}.csv'.format(self.directory,self.strategy_name))
+        transactions = self.transactions.get_log()
+        print('Transactions {} Strategy : '.format(self.strategy_name), transactions)
+        self.save_transactions()
+
+    def save_transactions(self):
+        transactions = self.transactions.get_log()
+        #Large logs can be written to Parquet instead of csv.
+        if self.kwargs.get('transaction_log_format', 'csv') == 'parquet':
+            self.transactions.to_parquet('{}/Transaction_Log_{}.parquet'.format(self.directory,self.strategy_name))
+        else:
+            transactions.to_csv('{}/Transaction_Log_{}.csv'.format(self.directory,self.strategy_name))
 
     def performance_metrics(self):
+        metrics = self.calculate_metrics()
+        metrics_frame = pd.DataFrame(metrics.items(),columns=['Performance Metric', 'Value'])
+        metrics_frame.to_csv('{}/Metrics_{}.csv'.format(self.directory,self.strategy_name),index=False)
+        if self.kwargs.get('rolling_windows') is not None:
+            self.rolling_metrics()
+        return metrics
+
+    #Function: Rolling performance metrics of the portfolio value over the windows in rolling_windows (in days), saved to Rolling_Metrics_<strategy>.csv.
+    def rolling_metrics(self):
+        portfolio_value = self.backtest.get_portfolio_value_frame().to_frame(self.strategy_name)
+        rolling_frame = rolling_analytics.rolling_frame(portfolio_value, self.data_process.get_interest_rates().loc[:,1], self.kwargs['rolling_windows']).droplevel('Series', axis = 1)
+        rolling_frame.to_csv('{}/Rolling_Metrics_{}.csv'.format(self.directory,self.strategy_name))
+        return rolling_frame
+
+    def calculate_metrics(self):
         metrics = {}
         #Returns Metrics
         portfolio_value = self.backtest.get_portfolio_value_frame()
@@ -151,20 +756,18 @@ class Analysis:
         sharpe_ratio = annualized_excess_return / annualized_excess_return_volatility
 
         #Drawdown Metrics
-        drawdowns = pd.Series(0,index=portfolio_value.index)
-        for date in portfolio_value.index:
-            drawdowns.loc[date] = ((portfolio_value.loc[:date]).max()-portfolio_value.loc[date])/(portfolio_value.loc[:date]).max()
+        #The running maximum gives the peak portfolio value up to each date in a single pass.
+        running_max = portfolio_value.cummax()
+        drawdowns = (running_max-portfolio_value)/running_max
 
         max_drawdown = drawdowns.max()
         max_drawdown_date = drawdowns.idxmax()
-        quantile_loss = portfolio_return.quantile(q=0.05)
 
         #Transaction Metrics
-        transactions = self.transactions.get_log()
-        turnover = (transactions.loc[transactions['Transaction Type'].str.contains('Buy|Sell')]['Quantity']).sum()
-        transaction_costs = transactions.loc[transactions['Transaction Type'] == 'Transaction Costs']
-        total_transaction_costs = (transaction_costs['Price']).T.dot(transaction_costs['Quantity'])
-        
+        transaction_aggregates = self.transactions.get_aggregates()
+        turnover = transaction_aggregates['Turnover Quantity']
+        total_transaction_costs = transaction_aggregates['Transaction Costs']
+
 
         metrics['Terminal Value'] = terminal_value
         metrics['Annualized Excess Return'] = annualized_excess_return
@@ -173,9 +776,7 @@ class Analysis:
         metrics['Maximum Drawdown'] = max_drawdown
         metrics['Turnover Quantity'] = turnover
         metrics['Transaction Costs'] = total_transaction_costs
-
-        metrics_frame = pd.DataFrame(metrics.items(),columns=['Performance Metric', 'Value'])
-        metrics_frame.to_csv('{}/Metrics_{}.csv'.format(self.directory,self.strategy_name),index=False)
+        return metrics
 
 
 
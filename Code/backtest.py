@@ -1,36 +1,287 @@
 import numpy as np
 import pandas as pd
+import pickle
+import os
+import analysis as analysis
+import events as events
 
 #Class: Runs the event-driven back test and executes the desired trading strategy.
+#A back test can be saved to a checkpoint with save_checkpoint and resumed from it with the resume_from keyword. A resumed back test
+#only processes the dates after the last date of the checkpoint, so new data can be added to a long history without running it again.
 class BackTest:
+    #Attributes saved in a checkpoint. The strategy lists its own in checkpoint_state.
+    checkpoint_state = ['cash','holdings','portfolio_value','dividend_pay_date','dividend_payment','portfolio_value_frame','metrics','last_date']
+
     def __init__(self, data_process, strategy, transactions, **kwargs):
         self.data_process = data_process
         self.strategy = strategy
         self.kwargs = kwargs
         self.stock_name = self.kwargs['stock_name']
         self.cash = self.kwargs['starting_balance']
+        #'event' looks up the daily data by date label. 'array' pulls the daily data into numpy arrays once and gives the same results faster.
+        #'vectorized' computes the whole back test with array operations for strategies with a whole-series signals method and uses 'array' otherwise.
+        #'stream' reads the data in chunks from DataProcess.stream and gives the strategy one bar at a time through its on_bar method.
+        #'live' runs nothing when created. The bars of a live or replayed feed are given one at a time to on_bar.
+        self.engine = self.kwargs.get('engine','event')
         self.transactions = transactions
         self.holdings = {}
         self.portfolio_value = {}
         self.dividend_pay_date = np.NaN
         self.dividend_payment = {}
-        self.portfolio_value_frame = pd.Series(data= 0, index = self.data_process.get_prices().index)
+        self.portfolio_value_frame = None
+        self.metrics = analysis.MetricsAccumulator()
+        self.last_date = None #Last date processed, the back test starts after it when resumed.
+        self.live_dates = [] #Dates and portfolio values of the live bars not yet added to the portfolio value frame.
+        self.live_values = []
 
-        
+        if self.kwargs.get('resume_from') is not None:
+            self.load_checkpoint(self.kwargs['resume_from'])
         self.backtest()
 
     #Function: Loop through each date and perform the necessary portfolio management procedures.
     def backtest(self):
+        if self.engine == 'live':
+            return
+        if self.engine == 'vectorized' and hasattr(self.strategy,'signals'):
+            self.backtest_vectorized()
+            return
+        if self.engine in ['array','vectorized']:
+            self.backtest_array()
+            return
+        if self.engine == 'stream':
+            self.backtest_stream()
+            return
+
         prices = self.data_process.get_prices()
-        for date in prices.index:
+        start = self.start_position(prices.index)
+        portfolio_value_frame = pd.Series(data= 0, index = prices.index[start:])
+        for date in prices.index[start:]:
             current_price = prices.loc[date,'Price']
             signal = self.strategy.signal(date)
             self.rebalance(signal,date,current_price)
             self.portfolio_value -= self.cash
             self.dividends(date)
-            self.interest(date)
+            interest_rate = self.interest(date)
+            self.portfolio_value = self.cash + self.portfolio_value
+            portfolio_value_frame.loc[date] = self.portfolio_value
+            self.metrics.update(date,self.portfolio_value,interest_rate)
+        self.append_portfolio_values(portfolio_value_frame)
+
+    #Function: Same portfolio management procedures as backtest, with the daily prices, dividends and interest rates pulled into numpy arrays once.
+    #Days are addressed by position and the portfolio values are written into a preallocated float64 buffer which is turned into a Series at the end.
+    def backtest_array(self):
+        dates = self.data_process.get_prices().index
+        prices = self.data_process.get_prices().loc[:,'Price'].to_numpy(dtype = float)
+        ex_dates, pay_dates, pay_date_index, dividend_amounts = self.dividend_arrays()
+        interest_rates = self.data_process.get_interest_rates().loc[dates,1].to_numpy(dtype = float)
+        start = self.start_position(dates)
+        portfolio_value_frame = np.empty(len(dates) - start)
+        #Position of the pay date of a dividend declared before the checkpoint.
+        dividend_pay_index = dates.get_indexer([self.dividend_pay_date])[0] if pd.notnull(self.dividend_pay_date) else -1
+
+        for i in range(start, len(dates)):
+            date = dates[i]
+            current_price = prices[i]
+            signal = self.strategy.signal(date)
+            self.rebalance(signal,date,current_price)
+            self.portfolio_value -= self.cash
+            if ex_dates[i]:
+                self.dividend_pay_date = pay_dates.iloc[i]
+                dividend_pay_index = pay_date_index[i]
+                self.dividend_payment = {'Quantity' : self.holdings, 'Price' : dividend_amounts[i]}
+            if i == dividend_pay_index:
+                self.pay_dividend(date)
+            self.cash *= (1+interest_rates[i])**(1/365)
             self.portfolio_value = self.cash + self.portfolio_value
-            self.portfolio_value_frame.loc[date] = self.portfolio_value
+            portfolio_value_frame[i - start] = self.portfolio_value
+            self.metrics.update(date,self.portfolio_value,interest_rates[i])
+
+        self.append_portfolio_values(pd.Series(data = portfolio_value_frame, index = dates[start:]))
+
+    #Function: Same portfolio management procedures as backtest, over the chunks of data from DataProcess.stream.
+    #Only the current chunk of data is held in memory, along with the portfolio values. The strategy receives each bar (see analysis.chunk_bars)
+    #through on_bar and keeps whatever history it needs itself.
+    def backtest_stream(self):
+        if not hasattr(self.strategy,'on_bar'):
+            raise Exception("Please input a strategy that supports streaming.")
+        #Only the live collar reads the implied vols and interest rates of the bars.
+        market_data = getattr(self.strategy,'live',False)
+        portfolio_value_frames = []
+        for chunk in self.data_process.stream(after = self.last_date):
+            dates = chunk['prices'].index
+            portfolio_value_frame = np.empty(len(dates))
+            for i, bar in enumerate(analysis.chunk_bars(chunk, market_data)):
+                portfolio_value_frame[i] = self.step(bar)
+            portfolio_value_frames.append(pd.Series(data = portfolio_value_frame, index = dates))
+            self.last_date = dates[-1]
+
+        if len(portfolio_value_frames) > 0:
+            self.append_portfolio_values(pd.concat(portfolio_value_frames))
+
+    #Function: Portfolio management procedures of one bar, in the same order as backtest. Returns the portfolio value at the end of the bar.
+    def step(self,bar):
+        date = bar['Date']
+        current_price = bar['Price']
+        signal = self.strategy.on_bar(bar)
+        self.rebalance(signal,date,current_price)
+        self.portfolio_value -= self.cash
+        if bar['ExDate']:
+            self.dividend_pay_date = bar['PayDate']
+            self.dividend_payment = {'Quantity' : self.holdings, 'Price' : bar['Dividend']}
+        if date == self.dividend_pay_date:
+            self.pay_dividend(date)
+        self.cash *= (1+bar['Interest Rate'])**(1/365)
+        self.portfolio_value = self.cash + self.portfolio_value
+        self.metrics.update(date,self.portfolio_value,bar['Interest Rate'])
+        return self.portfolio_value
+
+    #Function: Process the next bar of a live feed (engine 'live'). The portfolio value is kept in a list until the portfolio value frame is requested,
+    #so a bar does not copy the frame. Returns the portfolio value at the end of the bar.
+    def on_bar(self,bar):
+        portfolio_value = self.step(bar)
+        self.live_dates.append(bar['Date'])
+        self.live_values.append(portfolio_value)
+        self.last_date = bar['Date']
+        return portfolio_value
+
+    #Function: Vectorized back test for signal-only strategies, which buy with all available cash on a 1 signal and sell all stock on a -1 signal.
+    #The strategy provides all of its signals at once through signals(). Its own rebalance is called on the days it can trade, sell signals and buy signals
+    #with enough cash for a share, so the share quantities and transaction log are the same as the event-driven back test. A strategy whose rebalance
+    #also acts on a buy signal without enough cash (the trend strategy logs a zero quantity buy) does not set skip_unfunded_buys, and its rebalance is
+    #called on every buy signal.
+    #Between two trading days the holdings are fixed and the cash only receives dividends and overnight interest. It is carried forward with cumulative
+    #products of the daily interest growth, restarted with the dividend on each pay date. This is the same order of operations as the event-driven back test,
+    #so the cash and portfolio values are identical to it. The cash is carried forward in stretches that double in length until the next trading day is found,
+    #so each day is only carried forward a bounded number of times and the back test is linear in the number of days.
+    def backtest_vectorized(self):
+        dates = self.data_process.get_prices().index
+        prices = self.data_process.get_prices().loc[:,'Price'].to_numpy(dtype = float)
+        ex_dates, pay_dates, pay_date_index, dividend_amounts = self.dividend_arrays()
+        interest_rates = self.data_process.get_interest_rates().loc[dates,1].to_numpy(dtype = float)
+        growth = (1+interest_rates)**(1/365)
+        signals = np.asarray(self.strategy.signals())
+        transaction_costs = self.strategy.transaction_costs
+        skip_unfunded_buys = getattr(self.strategy,'skip_unfunded_buys',False)
+        buy = signals == 1
+        sell = signals == -1
+        share_cost = prices + transaction_costs
+
+        #Dividend per share paid on each date.
+        dividends, dividend_paid = events.paid_dividends(ex_dates, pay_dates, pay_date_index, dividend_amounts)
+        ex_date_index = np.flatnonzero(ex_dates)
+        #The cash path restarts on each pay date, when the dividend is added before the interest.
+        restarts = np.append(np.flatnonzero(dividend_paid), len(dates))
+
+        start = self.start_position(dates)
+        cash_start = np.empty(len(dates)) #Cash after rebalancing
+        cash_end = np.empty(len(dates)) #Cash after dividends and interest
+        quantity = np.empty(len(dates))
+        i = start
+        while i < len(dates):
+            if sell[i] or (buy[i] and (not skip_unfunded_buys or self.cash >= share_cost[i])):
+                self.holdings, self.portfolio_value, self.cash = self.strategy.rebalance(signals[i],dates[i],prices[i],self.holdings,self.cash)
+            stock_quantity = self.holdings.get(self.stock_name,0)
+
+            #Carry the cash forward until the next day where the strategy trades: cash_end[t] = (cash_end[t-1] + dividends[t]) * growth[t]
+            j = i
+            cash = self.cash
+            stretch = 64
+            while True:
+                stop = min(restarts[np.searchsorted(restarts, j, side = 'right')], j + stretch, len(dates))
+                cash_end[j:stop] = np.cumprod(np.append(cash + stock_quantity*dividends[j], growth[j:stop]))[1:]
+                #A trade on a day depends on the cash at the end of the day before.
+                days = slice(j + 1, min(stop + 1, len(dates)))
+                trade = sell[days] | (buy[days] & ((cash_end[j:days.stop - 1] >= share_cost[days]) | (not skip_unfunded_buys)))
+                if trade.any():
+                    next_i = j + 1 + np.argmax(trade)
+                    break
+                if stop == len(dates):
+                    next_i = len(dates)
+                    break
+                j = stop
+                cash = cash_end[stop - 1]
+                stretch *= 2
+
+            cash_start[i] = self.cash
+            cash_start[i+1:next_i] = cash_end[i:next_i-1]
+            quantity[i:next_i] = stock_quantity
+            if stock_quantity > 0:
+                pay_index = np.flatnonzero(dividend_paid[i:next_i]) + i
+                self.transactions.log_transactions(dates[pay_index],self.stock_name,stock_quantity,dividends[pay_index],'Dividend')
+            self.cash = cash_end[next_i-1]
+            i = next_i
+
+        if start == len(dates):
+            return
+        #Same order of operations as the event-driven back test. The days before a resumed back test's start were not written.
+        cash_start, cash_end, quantity = cash_start[start:], cash_end[start:], quantity[start:]
+        portfolio_value_frame = cash_end + ((quantity*prices[start:] + cash_start) - cash_start)
+        self.portfolio_value = portfolio_value_frame[-1]
+        self.append_portfolio_values(pd.Series(data = portfolio_value_frame, index = dates[start:]))
+        self.metrics.extend(dates[start:],portfolio_value_frame,interest_rates[start:])
+        if len(ex_date_index) > 0:
+            self.dividend_pay_date = pay_dates.iloc[ex_date_index[-1]]
+            self.dividend_payment = {'Quantity' : self.holdings, 'Price' : dividend_amounts[ex_date_index[-1]]}
+
+    #Function: Position of the first date after the last processed date.
+    def start_position(self,dates):
+        if self.last_date is None:
+            return 0
+        return dates.searchsorted(self.last_date, side = 'right')
+
+    #Function: Add the portfolio values of the processed dates to the ones before them and move the last date.
+    def append_portfolio_values(self,portfolio_value_frame):
+        if len(portfolio_value_frame) == 0:
+            return
+        if self.portfolio_value_frame is not None:
+            portfolio_value_frame = pd.concat([self.portfolio_value_frame,portfolio_value_frame])
+        self.portfolio_value_frame = portfolio_value_frame
+        self.last_date = portfolio_value_frame.index[-1]
+
+    #Function: Save the state of the back test, the strategy and the transaction log after the last processed date.
+    #The data is not saved. The last price is kept to check that the data of a resumed back test starts with the same history.
+    def save_checkpoint(self,file):
+        self.get_portfolio_value_frame()
+        checkpoint = {'backtest' : {name : getattr(self,name) for name in self.checkpoint_state},
+                      'strategy' : {name : getattr(self.strategy,name) for name in getattr(self.strategy,'checkpoint_state',[])},
+                      'strategy_name' : type(self.strategy).__name__,
+                      'strategy_parameters' : repr(sorted(self.strategy.kwargs.items())),
+                      'engine' : self.engine,
+                      'transactions' : self.transactions,
+                      'last_price' : self.data_process.get_prices().loc[self.last_date,'Price']}
+        #Written to a temporary file first so a failed save does not overwrite the last checkpoint.
+        with open(file + '.tmp', 'wb') as checkpoint_file:
+            pickle.dump(checkpoint, checkpoint_file, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(file + '.tmp', file)
+
+    #Function: Restore the state of the back test, the strategy and the transaction log from a checkpoint.
+    #The holdings, the dividend payment and the option holdings share objects, so they are saved and restored together in one pickle.
+    def load_checkpoint(self,file):
+        with open(file, 'rb') as checkpoint_file:
+            checkpoint = pickle.load(checkpoint_file)
+        if checkpoint['strategy_name'] != type(self.strategy).__name__ or checkpoint['strategy_parameters'] != repr(sorted(self.strategy.kwargs.items())):
+            raise Exception("The checkpoint was saved with a different strategy or strategy parameters.")
+        #The engines keep the cash, metrics and strategy state in their own way (e.g. the live collar), so a back test only resumes with the engine that saved it.
+        if checkpoint.get('engine','event') != self.engine:
+            raise Exception("The checkpoint was saved with the {} engine, not the {} engine.".format(checkpoint.get('engine','event'), self.engine))
+        last_date = checkpoint['backtest']['last_date']
+        prices = self.data_process.get_prices()
+        if last_date not in prices.index or prices.loc[last_date,'Price'] != checkpoint['last_price']:
+            raise Exception("The data does not contain the history of the checkpoint.")
+
+        for name, value in checkpoint['backtest'].items():
+            setattr(self,name,value)
+        for name, value in checkpoint['strategy'].items():
+            setattr(self.strategy,name,value)
+        #The transaction log keeps its own data.
+        transactions = checkpoint['transactions'].__dict__
+        transactions['data_process'] = self.transactions.data_process
+        self.transactions.__dict__.update(transactions)
+
+    #Function: Dividend data as arrays from the event calendar. Ex-date flags, pay dates, position of each pay date in the back test dates and dividend amounts.
+    def dividend_arrays(self):
+        calendar = self.data_process.get_calendar()
+        return calendar.ex_dates, calendar.pay_dates, calendar.pay_date_index, calendar.dividend_amounts
 
     #Function: Rebalance the portfolio based on the trading strategy
     def rebalance(self,signal,date,current_price):
@@ -38,24 +289,174 @@ class BackTest:
     
     #Function: Determine dividends received from owning stock.
     def dividends(self,date):
-        dividends = self.data_process.get_dividends()
+        calendar = self.data_process.get_calendar()
+        date_index = calendar.position(date)
         
         #Get dividend amount and date for upcoming dividend and the stock holdings just before the Ex-Date.
-        if pd.notnull(dividends.loc[date,'ExDate']):
-            self.dividend_pay_date = dividends.loc[date,'PayDate']
-            self.dividend_payment = {'Quantity' : self.holdings, 'Price' : dividends.loc[date,'Amount']}
+        if calendar.ex_dates[date_index]:
+            self.dividend_pay_date = calendar.pay_dates.iloc[date_index]
+            self.dividend_payment = {'Quantity' : self.holdings, 'Price' : calendar.dividend_amounts[date_index]}
 
         if date == self.dividend_pay_date:
-            self.cash += self.dividend_payment['Quantity'].get(self.stock_name,0)*self.dividend_payment['Price']
-            if self.dividend_payment['Quantity'].get(self.stock_name,0) > 0:
-                self.transactions.log_transaction(date,self.stock_name,self.dividend_payment['Quantity'].get(self.stock_name,0),self.dividend_payment['Price'],'Dividend')
+            self.pay_dividend(date)
+
+    #Function: Receive the upcoming dividend on the stock holdings.
+    def pay_dividend(self,date):
+        self.cash += self.dividend_payment['Quantity'].get(self.stock_name,0)*self.dividend_payment['Price']
+        if self.dividend_payment['Quantity'].get(self.stock_name,0) > 0:
+            self.transactions.log_transaction(date,self.stock_name,self.dividend_payment['Quantity'].get(self.stock_name,0),self.dividend_payment['Price'],'Dividend')
     
     #Function: Collect overnight interest rate on cash. Overnight rate is used so cash can be quickly deployed if needed.
+    #Returns the annual overnight interest rate of the date, which the metrics also use.
     def interest(self,date):
-        self.cash *= (1+self.data_process.get_interest_rates().loc[date,1])**(1/365)
+        interest_rate = self.data_process.get_interest_rates().loc[date,1]
+        self.cash *= (1+interest_rate)**(1/365)
+        return interest_rate
     
 
     def get_portfolio_value_frame(self):
+        if len(self.live_values) > 0:
+            self.append_portfolio_values(pd.Series(data = self.live_values, index = pd.DatetimeIndex(self.live_dates)))
+            self.live_dates, self.live_values = [], []
         return self.portfolio_value_frame
 
+    #Function: Performance metrics accumulated during the back test.
+    def get_metrics(self):
+        return self.metrics.get_metrics()
+
+    #Only the results of the back test are pickled (e.g. when sent back from a worker process), not the data or the strategy.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['data_process'] = None
+        state['strategy'] = None
+        return state
+
+
+#Class: Back test of a signal-only strategy over a universe of assets held in a PanelData.
+#The starting balance is split between the assets (equally unless allocation gives the weight of each asset) and each asset's cash is managed
+#with the same rules as the single stock vectorized back test: buy with all of the asset's cash on a 1 signal and sell all of the asset on a -1 signal.
+#Holdings and cash are arrays over the assets and every day is updated for all assets at once.
+#The strategy's signals() gives a date x asset array, or one signal per date that is used for every asset.
+#Only the days on which an asset trades or is paid a dividend are processed one at a time. Between them the holdings are fixed and the cash of every
+#asset only collects interest, so it is carried forward with cumulative products of the daily interest growth, in stretches that double in length
+#until the next such day is found (as in BackTest.backtest_vectorized). This is the same order of operations as processing every day.
+class MultiAssetBackTest:
+    def __init__(self, panel_data, strategy, transactions, **kwargs):
+        self.panel_data = panel_data
+        self.strategy = strategy
+        self.transactions = transactions
+        self.kwargs = kwargs
+        self.assets = self.panel_data.assets
+        allocation = np.asarray(self.kwargs.get('allocation', np.full(len(self.assets), 1/len(self.assets))), dtype = float)
+        self.cash = self.kwargs['starting_balance'] * allocation
+        self.holdings = np.zeros(len(self.assets))
+        self.portfolio_value = None
+        self.asset_value_frame = None
+        self.portfolio_value_frame = None
+        self.metrics = analysis.MetricsAccumulator()
+
+        self.backtest()
+
+    #Function: Trade, receive dividends and collect interest for every asset at once on the days an asset trades or is paid a dividend,
+    #and carry the cash forward between them. Assets without a price on a date are not traded and are valued at their last price.
+    def backtest(self):
+        dates = self.panel_data.dates
+        prices = self.panel_data.prices
+        valuation_prices = self.panel_data.get_prices().ffill().fillna(0).to_numpy()
+        dividends = self.panel_data.dividends
+        interest_rates = self.panel_data.get_interest_rates().loc[:,1].to_numpy(dtype = float)
+        growth = (1+interest_rates)**(1/365)
+        signals = np.asarray(self.strategy.signals())
+        signals = np.broadcast_to(signals.reshape(len(dates),-1), prices.shape)
+        transaction_costs = self.strategy.transaction_costs
+        asset_value_frame = np.empty(prices.shape)
+        with np.errstate(invalid = 'ignore'):
+            share_cost = prices + transaction_costs
+        buy_signals = signals == 1
+        sell_signals = signals == -1
+        paying = dividends != 0
+
+        i = 0
+        while i < len(dates):
+            self.trade(dates[i], prices[i], share_cost[i], buy_signals[i], sell_signals[i], dividends[i], transaction_costs)
+            self.cash *= growth[i]
+            asset_value_frame[i] = self.holdings * valuation_prices[i] + self.cash
+            i += 1
+
+            #Carry the cash forward until the next day where an asset trades or is paid a dividend, which depends on the cash at the end of the day before.
+            stretch = 4
+            while i < len(dates):
+                stop = min(i + stretch, len(dates))
+                cash = np.cumprod(np.vstack([self.cash, np.broadcast_to(growth[i:stop,None], (stop - i, len(self.cash)))]), axis = 0)
+                held = self.holdings > 0
+                with np.errstate(invalid = 'ignore'):
+                    event = (buy_signals[i:stop] & (cash[:-1] >= share_cost[i:stop])) | ((sell_signals[i:stop] | paying[i:stop]) & held)
+                event_days = np.flatnonzero(event.any(axis = 1))
+                carried = event_days[0] if len(event_days) > 0 else stop - i
+                asset_value_frame[i:i+carried] = self.holdings * valuation_prices[i:i+carried] + cash[1:carried+1]
+                self.cash = cash[carried].copy()
+                i += carried
+                if len(event_days) > 0:
+                    break
+                stretch *= 2
+
+        self.asset_value_frame = pd.DataFrame(asset_value_frame, index = dates, columns = self.assets)
+        portfolio_value_frame = asset_value_frame.sum(axis = 1)
+        self.portfolio_value = portfolio_value_frame[-1]
+        self.portfolio_value_frame = pd.Series(data = portfolio_value_frame, index = dates)
+        self.metrics.extend(dates,portfolio_value_frame,interest_rates)
+
+    #Function: Buy the assets with a buy signal and enough cash for a share, sell the assets held with a sell signal and receive the dividends
+    #paid on the assets held, on one date. The prices, share costs (price plus transaction costs), signals and dividends are those of the date.
+    def trade(self, date, prices, share_cost, buy_signals, sell_signals, dividends, transaction_costs):
+        assets = np.array(self.assets, dtype = object)
+        with np.errstate(invalid = 'ignore'):
+            buy = buy_signals & (self.cash >= share_cost)
+            sell = sell_signals & (self.holdings > 0)
+
+        if buy.any():
+            purchase = self.cash[buy] // share_cost[buy]
+            self.holdings[buy] += purchase
+            self.cash[buy] -= purchase * share_cost[buy]
+            self.transactions.log_transactions(np.repeat(date,buy.sum()),assets[buy],purchase,prices[buy],'Buy')
+            self.transactions.log_transactions(np.repeat(date,buy.sum()),assets[buy],purchase,transaction_costs,'Transaction Costs')
+        if sell.any():
+            self.cash[sell] += self.holdings[sell] * (prices[sell] - transaction_costs)
+            self.transactions.log_transactions(np.repeat(date,sell.sum()),assets[sell],self.holdings[sell],prices[sell],'Sell')
+            self.transactions.log_transactions(np.repeat(date,sell.sum()),assets[sell],self.holdings[sell],transaction_costs,'Transaction Costs')
+            self.holdings[sell] = 0
+
+        paid = (dividends != 0) & (self.holdings > 0)
+        if paid.any():
+            self.cash[paid] += self.holdings[paid] * dividends[paid]
+            self.transactions.log_transactions(np.repeat(date,paid.sum()),assets[paid],self.holdings[paid],dividends[paid],'Dividend')
+
+    def get_portfolio_value_frame(self):
+        return self.portfolio_value_frame
+
+    #Function: Portfolio value of each asset's holdings and cash.
+    def get_asset_value_frame(self):
+        return self.asset_value_frame
+
+    def get_metrics(self):
+        return self.metrics.get_metrics()
+
+
+#Function: Run a strategy with each of the engines and the baseline engine and check they give exactly the same portfolio values and transaction log as the baseline.
+#Returns the portfolio values and transaction log of each engine. Used by the tests of the engines (tests/test_engine_parity.py).
+def check_engine_parity(data_process, strategy_class, engines = ['array','vectorized'], baseline = 'event', **kwargs):
+    results = {}
+    for engine in [baseline] + [engine for engine in engines if engine != baseline]:
+        transactions = analysis.Transactions(data_process)
+        strategy = strategy_class(data_process, transactions, **kwargs)
+        backtester = BackTest(data_process, strategy, transactions, engine = engine, **kwargs)
+        results[engine] = (backtester.get_portfolio_value_frame(), transactions.get_log())
+
+    baseline_values, baseline_log = results[baseline]
+    for engine in engines:
+        values, log = results[engine]
+        pd.testing.assert_series_equal(values, baseline_values, check_exact = True, check_names = False)
+        pd.testing.assert_frame_equal(log, baseline_log, check_exact = True)
+    return results
+
 
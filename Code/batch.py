@@ -0,0 +1,127 @@
+import contextlib
+import io
+import os
+import queue
+import threading
+import multiprocessing
+import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import strategies as strategy
+import backtest as backtest
+import analysis as analysis
+import rolling_analytics as rolling_analytics
+
+
+#Batch mode: run the strategies in strategy_names at the same time on a pool of worker processes sharing the loaded DataProcess.
+#The workers only back test. The charts, transaction logs and metrics are written by a background writer thread as each strategy finishes,
+#so no output waits on another strategy. Charts are rendered with the non-interactive Agg canvas and are not displayed.
+#When every strategy is done a comparison report of all strategies is written (Comparison.csv, Comparison.png and the rolling metrics side by side in Rolling_Comparison.csv).
+
+
+#Loaded data for the worker processes. Set once per worker by init_worker.
+data_process = None
+
+#Function: Store the loaded data in the worker process.
+def init_worker(shared_data_process):
+    global data_process
+    data_process = shared_data_process
+
+#Function: Back test one strategy in a worker. Returns the back test and its transaction log without the data.
+def run_strategy(run):
+    strategy_name, config = run
+    transaction_log = analysis.Transactions(data_process)
+    strat = strategy.create_strategy(strategy_name, data_process, transaction_log, config, live = config['engine'] == 'stream')
+    with contextlib.redirect_stdout(io.StringIO()):
+        backtester = backtest.BackTest(data_process, strat, transaction_log, stock_name = config['stock_name'], starting_balance = config['starting_balance'], engine = config['engine'])
+    return strategy_name, backtester, transaction_log
+
+#Class: Background thread that writes the output of each finished strategy. Results are queued with submit and written in order.
+#Errors in the thread are raised again by close.
+class ReportWriter(threading.Thread):
+
+    def __init__(self, data_process, **kwargs):
+        super().__init__(daemon = True)
+        self.data_process = data_process
+        self.kwargs = kwargs
+        self.queue = queue.Queue()
+        self.metrics = {}
+        self.portfolio_values = {}
+        self.error = None
+
+    def submit(self, strategy_name, backtester, transaction_log):
+        self.queue.put((strategy_name, backtester, transaction_log))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self.write(*item)
+            except Exception as error:
+                self.error = error
+
+    #Function: Write the chart, transaction log and metrics of one strategy.
+    def write(self, strategy_name, backtester, transaction_log):
+        results = analysis.Analysis(self.data_process, transaction_log, backtester, strategy_name = strategy_name, directory = self.kwargs['directory'], timestr = self.kwargs['timestr'], transaction_log_format = self.kwargs['transaction_log_format'], rolling_windows = self.kwargs['rolling_windows'])
+        results.save_mv()
+        results.save_transactions()
+        self.metrics[strategy_name] = results.performance_metrics()
+        self.portfolio_values[strategy_name] = backtester.get_portfolio_value_frame()
+
+    #Function: Wait for the queued results to be written.
+    def close(self):
+        self.queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+#Function: Write the metrics of all strategies side by side and a chart of all portfolio values.
+def comparison_report(metrics, portfolio_values, strategy_names, directory):
+    comparison = pd.DataFrame({strategy_name : metrics[strategy_name] for strategy_name in strategy_names})
+    comparison.index.name = 'Performance Metric'
+    comparison.to_csv('{}/Comparison.csv'.format(directory))
+
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    for strategy_name in strategy_names:
+        portfolio_values[strategy_name].plot(ax = axes, label = strategy_name)
+    axes.legend()
+    axes.set_xlabel('Date')
+    axes.set_ylabel('Portfolio Value ($)')
+    axes.set_title('Strategy Portfolio Values')
+    figure.savefig('{}/Comparison.png'.format(directory))
+    return comparison
+
+#Function: Run every strategy in the config over the worker pool and write all output. Returns the comparison table.
+def run_batch(config, data_process, timestr):
+    strategy_names = config['strategy_names']
+    processes = config['batch']['processes'] or min(len(strategy_names), os.cpu_count())
+    writer = ReportWriter(data_process, directory = config['analysis']['directory'], timestr = timestr, transaction_log_format = config['analysis']['transaction_log_format'], rolling_windows = config['analysis']['rolling_windows'])
+    writer.start()
+
+    #fork lets the workers share the loaded data without copying it.
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+    try:
+        with context.Pool(processes = processes, initializer = init_worker, initargs = (data_process,)) as pool:
+            #The strategies are started longest first (strategies.strategy_cost), so the slowest back test does not start last.
+            for strategy_name, backtester, transaction_log in pool.imap_unordered(run_strategy, [(strategy_name, config) for strategy_name in sorted(strategy_names, key = lambda strategy_name: strategy.strategy_cost[strategy_name], reverse = True)]):
+                print('{} Strategy finished.'.format(strategy_name))
+                writer.submit(strategy_name, backtester, transaction_log)
+    finally:
+        writer.close()
+
+    directory = os.path.dirname(os.path.realpath(__file__)) + config['analysis']['directory'] + timestr
+    comparison = comparison_report(writer.metrics, writer.portfolio_values, strategy_names, directory)
+    if config['analysis']['rolling_windows'] is not None:
+        portfolio_values = pd.DataFrame({strategy_name : writer.portfolio_values[strategy_name] for strategy_name in strategy_names})
+        rolling_analytics.rolling_frame(portfolio_values, data_process.get_interest_rates().loc[:,1], config['analysis']['rolling_windows']).to_csv('{}/Rolling_Comparison.csv'.format(directory))
+    print(comparison)
+    return comparison
@@ -0,0 +1,158 @@
+import yaml
+import contextlib
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import platform
+import numpy as np
+import pandas as pd
+import strategies as strategy
+import backtest as backtest
+import analysis as analysis
+
+
+#Benchmarks: time the hot paths of the back test on synthetic data of different lengths and keep a history of the timings.
+#The synthetic workbook has the same sheets and layout as Coding_Proj_Data.xls. Each length in the benchmark section of the config is timed for
+#the data loading phases (read, clean, interpolate, convert and loading from the cache), the back test of each strategy and the performance metrics.
+#Every timing is the fastest of repeat runs. The results are appended to the history file and compared with the last run of the same length,
+#and phases slower than regression_threshold times the last run are reported.
+
+
+#Function: Write a synthetic workbook with the Price, Dividend, Interest Rate and 30/60/90/180/360IV sheets of the data file.
+#Prices follow a geometric Brownian motion with quarterly dividends. freq is a pandas frequency, 'B' gives business days.
+#Excel sheets are limited to 1048576 rows, which is about 4000 years of business days or 160 years of hourly bars.
+def generate_data(file, days, freq = 'B', seed = 0, start = '2000-01-03'):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods = days, freq = freq, name = 'Date')
+    price = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.012, days)))
+    dividend_yield = 1.8 + 0.3 * np.sin(np.arange(days) / 250)
+    prices = pd.DataFrame({'Price' : price, '12M Div Yield' : dividend_yield}, index = dates)
+
+    #Quarterly dividends paid a month after the ex-date.
+    ex_dates = dates[60::63]
+    pay_dates = dates[np.minimum(np.arange(60, days, 63) + 21, days - 1)]
+    dividends = pd.DataFrame({'ExDate' : ex_dates, 'RecordDate' : ex_dates + pd.Timedelta(days = 2), 'PayDate' : pay_dates,
+                              'Amount' : price[60::63] * dividend_yield[60::63] / 400}, index = ex_dates)
+
+    rate_maturity = [1, 7, 30, 60, 90, 180, 360]
+    rate_level = 0.5 + 2 * np.sin(np.arange(days) / 1000) ** 2
+    interest_rates = pd.DataFrame({mat : rate_level + 0.003 * mat + rng.normal(0, 0.01, days) for mat in rate_maturity}, index = dates)
+
+    strikes = [0.8, 0.85, 0.9, 0.95, 0.975, 1.0, 1.025, 1.05, 1.1, 1.15, 1.2]
+    vol_level = 16 + 4 * np.sin(np.arange(days) / 500)
+    with pd.ExcelWriter(file) as writer:
+        prices.to_excel(writer, sheet_name = 'Price')
+        dividends.to_excel(writer, sheet_name = 'Dividend', index_label = 'Date')
+        #The interest rate and implied vol sheets have a title row above the header.
+        pd.DataFrame([['Interest Rate']]).to_excel(writer, sheet_name = 'Interest Rate', header = False, index = False)
+        interest_rates.to_excel(writer, sheet_name = 'Interest Rate', startrow = 1)
+        for mat in [30, 60, 90, 180, 360]:
+            implied_vol = pd.DataFrame({strike : vol_level + 10 * (1 - strike) + 0.005 * mat + rng.normal(0, 0.3, days) for strike in strikes}, index = dates)
+            #Implied vols are missing the first 10 days, as in the data file.
+            pd.DataFrame([['Implied Vol']]).to_excel(writer, sheet_name = '{}IV'.format(mat), header = False, index = False)
+            implied_vol.iloc[10:].to_excel(writer, sheet_name = '{}IV'.format(mat), startrow = 1)
+    return file
+
+#Function: Fastest time of repeat calls of function. Returns the time and the result of the last call.
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+#Function: Time each phase of the back test on one data file. Returns the timings and the errors of the phases that failed.
+def time_phases(config, file, repeat, directory):
+    timings = {}
+    errors = {}
+    data_parameters = {'interpolate_maturity' : config['data']['interpolate_maturity'], 'interpolate_interest_rate' : config['data']['interpolate_interest_rate']}
+    data_process = analysis.DataProcess(file, **data_parameters)
+
+    #Run the data processing phases again on the loaded DataProcess to time them one by one.
+    timings['read_data'] = best_time(data_process.read_data, repeat)[0]
+    #The other phases change the data in place, so each is timed once on the data just read.
+    for phase in ['clean_data', 'interpolate_data', 'convert_percent']:
+        timings[phase] = best_time(getattr(data_process, phase), 1)[0]
+
+    #Output directories are given relative to the code directory, as in the config.
+    relative_directory = '/' + os.path.relpath(directory, os.path.dirname(os.path.realpath(__file__)))
+    cache_directory = relative_directory + '/Cache'
+    analysis.DataProcess(file, cache_directory = cache_directory, **data_parameters)
+    timings['load_cache'] = best_time(lambda: analysis.DataProcess(file, cache_directory = cache_directory, **data_parameters), repeat)[0]
+
+    for strategy_name in config['strategy_names']:
+        def run():
+            #Every run starts without cached option prices.
+            data_process.pricing_cache = None
+            transaction_log = analysis.Transactions(data_process)
+            strat = strategy.create_strategy(strategy_name, data_process, transaction_log, config, live = config['engine'] == 'stream')
+            with contextlib.redirect_stdout(io.StringIO()):
+                backtester = backtest.BackTest(data_process, strat, transaction_log, stock_name = config['stock_name'], starting_balance = config['starting_balance'], engine = config['engine'])
+            return transaction_log, backtester
+        #A strategy that fails on the data is recorded with its error instead of stopping the benchmark.
+        try:
+            timings['backtest_' + strategy_name], (transaction_log, backtester) = best_time(run, repeat)
+        except Exception as error:
+            errors['backtest_' + strategy_name] = '{}: {}'.format(type(error).__name__, error)
+            continue
+
+        results = analysis.Analysis(data_process, transaction_log, backtester, strategy_name = strategy_name, directory = relative_directory + '/Backtest_', timestr = str(len(data_process.get_prices())))
+        timings['performance_metrics_' + strategy_name] = best_time(results.performance_metrics, repeat)[0]
+    return timings, errors
+
+#Function: Phases of a run that are slower than threshold times the last run in the history with the same length.
+def find_regressions(history, run, threshold):
+    previous = [entry for entry in history if entry['days'] == run['days'] and entry['freq'] == run['freq']]
+    if len(previous) == 0:
+        return {}
+    last = previous[-1]['timings']
+    return {phase : (last[phase], seconds) for phase, seconds in run['timings'].items() if phase in last and seconds > threshold * last[phase]}
+
+def main():
+
+    with open('config.yaml', 'r') as file:
+        config = yaml.safe_load(file)
+
+    settings = config['benchmark']
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    history_file = str(dir_path) + settings['history_file']
+    history = []
+    if os.path.exists(history_file):
+        with open(history_file, 'r') as file:
+            history = json.load(file)
+
+    directory = tempfile.mkdtemp(dir = dir_path)
+    runs = []
+    regressed = False
+    try:
+        for days in np.atleast_1d(settings['days']).tolist():
+            file = generate_data('{}/Benchmark_{}.xlsx'.format(directory, days), days, freq = settings['freq'])
+            timings, errors = time_phases(config, file, settings['repeat'], directory)
+            run = {'timestamp' : time.strftime("%Y-%m-%d %H:%M:%S"), 'days' : days, 'freq' : settings['freq'], 'repeat' : settings['repeat'],
+                   'python' : platform.python_version(), 'numpy' : np.__version__, 'pandas' : pd.__version__, 'timings' : timings, 'errors' : errors}
+            regressions = find_regressions(history, run, settings['regression_threshold'])
+            runs.append(run)
+            regressed = regressed or len(regressions) > 0
+
+            print('Benchmark {} days:'.format(days))
+            print(pd.Series(timings, name = 'Seconds').to_string())
+            for phase, error in errors.items():
+                print('Failed {}: {}'.format(phase, error))
+            for phase, (last, seconds) in regressions.items():
+                print('Regression in {}: {:.4f}s, last run {:.4f}s'.format(phase, seconds, last))
+    finally:
+        shutil.rmtree(directory)
+
+    with open(history_file, 'w') as file:
+        json.dump(history + runs, file, indent = 1)
+    #Exit with an error when any phase regressed so the benchmark can be used as a check.
+    if regressed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
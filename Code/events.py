@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+
+#Function: Dividend data as arrays. Ex-date flags, pay dates, position of each pay date in the back test dates and dividend amounts.
+#dividends is the Dividend tab aligned with dates. The pay date position is -1 when it is not a back test date and so the dividend is never paid.
+def dividend_arrays(dates,dividends):
+    ex_dates = dividends.loc[:,'ExDate'].notnull().to_numpy()
+    pay_dates = dividends.loc[:,'PayDate']
+    pay_date_index = dates.get_indexer(pay_dates)
+    dividend_amounts = dividends.loc[:,'Amount'].to_numpy()
+    return ex_dates, pay_dates, pay_date_index, dividend_amounts
+
+#Function: Dividend per share paid on each date and whether a dividend is paid on the date.
+#A dividend is only paid if its pay date is reached before the next ex-date, as in the event-driven back test.
+def paid_dividends(ex_dates,pay_dates,pay_date_index,dividend_amounts):
+    dividends = np.zeros(len(ex_dates))
+    dividend_paid = np.zeros(len(ex_dates), dtype = bool)
+    ex_date_index = np.flatnonzero(ex_dates)
+    for ex_index, next_ex_index in zip(ex_date_index, np.append(ex_date_index[1:],len(ex_dates))):
+        if ex_index <= pay_date_index[ex_index] < next_ex_index:
+            dividends[pay_date_index[ex_index]] = dividend_amounts[ex_index]
+            dividend_paid[pay_date_index[ex_index]] = True
+    return dividends, dividend_paid
+
+
+#Function: Maturity date that follows cur_date for a maturity of mat days, moved to the start of a month.
+#Since implied vols/option maturity is not exactly monthly, there can be times where the calculation of maturity dates gets stuck in a loop.
+#This prevents this infinite loop from occuring.
+def next_maturity_date(cur_date, mat):
+    cur_date = cur_date + pd.offsets.Day(mat)
+    prev_date = cur_date - pd.offsets.Day(1)
+    if prev_date.month == cur_date.month:
+        if cur_date.day <= 15:
+            cur_date -= pd.offsets.MonthBegin(1)
+        else:
+            cur_date += pd.offsets.MonthBegin(1)
+    return cur_date
+
+#Function: The date of candidates (sorted datetime64 array) nearest to each target date, the later one when two are as near.
+def nearest_dates(candidates, targets):
+    right = np.minimum(np.searchsorted(candidates, targets, side = 'left'), len(candidates) - 1)
+    left = np.maximum(right - 1, 0)
+    use_left = (targets - candidates[left]) < np.abs(candidates[right] - targets)
+    return candidates[np.where(use_left, left, right)]
+
+
+#Class: Calendar of the events of a back test as arrays aligned with the price dates, calculated once per dataset and shared by the back test and strategies.
+#Holds the dividend ex-date flags, pay dates and amounts, and gives the first date with data, the option maturity dates, the roll dates and the
+#maturity date of an option bought on each date. Daily checks are then a lookup by date position instead of a search of a frame or index.
+class EventCalendar:
+
+    def __init__(self, data_process):
+        self.data_process = data_process
+        self.dates = self.data_process.get_prices().index
+        self.ex_dates, self.pay_dates, self.pay_date_index, self.dividend_amounts = dividend_arrays(self.dates, self.data_process.get_dividends())
+        self.availability = {}
+        self.option_maturity_dates = {}
+
+    #Function: Position of a date in the price dates.
+    def position(self, date):
+        return self.dates.get_loc(date)
+
+    #Function: Whether implied vol data is available (non-zero) on each date for the implied vol tab name (e.g. '30IV') and strike column,
+    #and the position of the first date with data (-1 if there is none).
+    def data_start(self, name, column):
+        key = (name, column)
+        if key not in self.availability:
+            available = (self.data_process.get_implied_vol()[name].loc[:,column].reindex(self.dates) != 0).to_numpy()
+            self.availability[key] = (available, np.argmax(available) if available.any() else -1)
+        return self.availability[key]
+
+    #Function: Option maturity dates for a maturity in days, stepping mat days from the first date and moving each date to the start of a month.
+    #Using only start/end of month allows for easier option maturity management.
+    #The dates continue horizon days past the last date, so options bought near the end of the data mature on the same dates as when more data is added.
+    #Each step depends on the previous date, so the dates are built in a loop once per maturity and shared.
+    def maturity_dates(self, mat, horizon = 0):
+        key = (mat, horizon)
+        if key not in self.option_maturity_dates:
+            cur_date = self.dates.min()
+            end_date = self.dates.max() + pd.offsets.Day(horizon)
+            option_dates = []
+            while cur_date < end_date:
+                option_dates.append(cur_date)
+                cur_date = next_maturity_date(cur_date, mat)
+            option_dates.append(cur_date)
+            self.option_maturity_dates[key] = pd.DatetimeIndex(option_dates)
+        return self.option_maturity_dates[key]
+
+    #Function: Dates on which options maturing on maturity_dates are rolled. A maturity date that is not a price date (e.g. a weekend or holiday)
+    #is rolled on the next price date.
+    def roll_flags(self, maturity_dates):
+        flags = np.zeros(len(self.dates), dtype = bool)
+        roll_index = self.dates.searchsorted(maturity_dates, side = 'left')
+        flags[roll_index[roll_index < len(self.dates)]] = True
+        return flags
+
+    #Function: Maturity date of an option with maturity mat days bought on each date. The date of maturity_dates nearest to the date plus mat days,
+    #the later one when two are as near.
+    def nearest(self, maturity_dates, mat):
+        return nearest_dates(maturity_dates.sort_values().to_numpy(), (self.dates + pd.offsets.Day(mat)).to_numpy())
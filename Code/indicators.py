@@ -0,0 +1,96 @@
+import numpy as np
+
+
+#Class: Rolling statistics of the stock data. Each indicator is calculated once for the whole history and stored as a numpy array aligned with the price index.
+#Indicators are memoized by (column, window, statistic) so strategies and parameter sets using the same indicator share it.
+class Indicators:
+
+    def __init__(self, data_process):
+        self.data_process = data_process
+        self.indicators = {}
+
+    #Function: Rolling statistic (mean, std, var, min, max, sum or median) over the previous window values of a price column.
+    #The value at a date only uses the values before that date, so it is known at the start of the day. Dates without enough history are NaN.
+    #When column is None the statistic is calculated for every column of the prices, e.g. every asset of a PanelData, and is a date x column array.
+    def rolling(self, column, window, statistic = 'mean'):
+        key = (column, window, statistic)
+        if key not in self.indicators:
+            values = self.data_process.get_prices() if column is None else self.data_process.get_prices().loc[:,column]
+            self.indicators[key] = getattr(values.rolling(window), statistic)().shift(1).to_numpy()
+        return self.indicators[key]
+
+    def rolling_mean(self, column, window):
+        return self.rolling(column, window, 'mean')
+
+    def rolling_std(self, column, window):
+        return self.rolling(column, window, 'std')
+
+
+#Class: Indicators of a date range of the data (e.g. of a DataView), sliced from the indicators of the whole history.
+#The values are views of the full arrays, so the indicators at the start of the range use the prices before it.
+class IndicatorView(Indicators):
+
+    def __init__(self, indicators, start, stop):
+        self.indicators = indicators
+        self.start = start
+        self.stop = stop
+
+    def rolling(self, column, window, statistic = 'mean'):
+        return self.indicators.rolling(column, window, statistic)[self.start:self.stop]
+
+
+#Class: Fixed size buffer of the most recent values of a stream, e.g. the last 200 prices for a moving average.
+#Values are written over the oldest value once the buffer is full, so memory does not grow with the length of the stream.
+#For each window in windows (no longer than size) a running sum of the last window values is kept, so their mean is O(1) per value.
+class RingBuffer:
+
+    def __init__(self, size, windows = ()):
+        self.size = size
+        self.values = np.full(size, np.nan)
+        self.position = 0 #Where the next value is written.
+        self.count = 0
+        #Per window: running sum, its Kahan compensation and the number of NaN values in the window (left out of the sum).
+        self.sums = {window : [0.0, 0.0, 0] for window in windows}
+
+    #Function: Add a value to a running sum with Kahan compensation, which keeps the rounding error from growing with the length of the stream.
+    def add(self, running_sum, value):
+        if np.isnan(value):
+            running_sum[2] += 1
+            return
+        value -= running_sum[1]
+        total = running_sum[0] + value
+        running_sum[1] = (total - running_sum[0]) - value
+        running_sum[0] = total
+
+    def remove(self, running_sum, value):
+        if np.isnan(value):
+            running_sum[2] -= 1
+            return
+        self.add(running_sum, -value)
+
+    def append(self, value):
+        for window, running_sum in self.sums.items():
+            self.add(running_sum, value)
+            #The value leaving the window. Read before it is written over when the window is the size of the buffer.
+            if self.count >= window:
+                self.remove(running_sum, self.values[(self.position - window) % self.size])
+        self.values[self.position] = value
+        self.position = (self.position + 1) % self.size
+        self.count += 1
+
+    #Function: The last window values, oldest first. Fewer values are returned when fewer have been appended.
+    def last(self, window):
+        window = min(window, self.count, self.size)
+        start = (self.position - window) % self.size
+        if start + window <= self.size:
+            return self.values[start:start+window]
+        return np.concatenate([self.values[start:], self.values[:start+window-self.size]])
+
+    #Function: Mean of the last window values. NaN until window values have been appended, as with pandas rolling.
+    def mean(self, window):
+        if self.count < window:
+            return np.nan
+        if window in self.sums:
+            running_sum = self.sums[window]
+            return running_sum[0] / window if running_sum[2] == 0 else np.nan
+        return np.mean(self.last(window))
@@ -3,7 +3,11 @@ from utils import *
 import strategies as strategy
 import backtest as backtest
 import analysis as analysis
+import profiler as profiler
+import results_store as results_store
 import time
+import sys
+import os
 
 
 #readme:
@@ -11,9 +15,22 @@ import time
 #The config.yaml centralizes the parameters used throughout the backtest. 
 #The main.py file and function are used for running the backtester as well as specifying the arguments of the component classes.
 #The analysis.py file holds the classes for processing the input data, logging transactions and processing the output data.
-#The backtest.py file holds the actual event-driven backtester that performs the portfolio management.
+#The backtest.py file holds the actual event-driven backtester that performs the portfolio management. It also holds a multi-asset backtester for universes of assets held as date x asset arrays (PanelData in analysis.py).
 #The strategies.py file holds the different investment strategies and the investment process for the strategies.
 #The utils.py file contains utility functions which are helpful in performing certain calculations in the backtest. 
+#The indicators.py file holds the rolling indicators (e.g. simple moving averages) that are calculated once per dataset and shared by the strategies.
+#The events.py file holds the event calendar (dividend dates, option maturity and roll dates and the first date with data) calculated once per dataset and shared by the back tests and strategies.
+#The vol_surface.py file holds the implied vol surface (date x strike x maturity grid) built once per dataset, used by the collar when vol_surface is set in the config to price options at any strike and time to expiry.
+#The batch.py file runs the strategies at the same time on a pool of worker processes and writes their output and a comparison report from a background thread (batch mode).
+#The benchmark.py file times the data loading, back tests and performance metrics on synthetic data of configurable length and keeps a JSON history of the timings.
+#The profiler.py file holds the optional instrumentation of a run (phase timers, method call counts and times, cProfile and tracemalloc), enabled in the config or with the --profile flag.
+#The rolling_analytics.py file calculates the performance metrics over trailing windows (e.g. 1 and 3 year Sharpe ratio, volatility, drawdown and downside deviation) for many portfolio value series at once.
+#The simulation.py file runs the strategies on simulated price paths (geometric Brownian motion or block bootstrap of the returns) in chunks of paths and gives the distribution of their performance metrics.
+#The walkforward.py file picks the strategy parameters on rolling in-sample windows and tests them on the following out-of-sample windows in parallel, and stitches the out-of-sample portfolio values together.
+#The replay.py file paper trades the strategies on a bar by bar replay of the data through the live on_bar API, with per-bar latency histograms and parity checks against the back test.
+#The results_store.py file holds the SQLite store of the metrics, portfolio values and transaction logs of each run, keyed by a hash of the strategy parameters, starting balance, engine and data, which main.py uses to reuse the results of unchanged runs.
+#The sweep.py file runs the strategies over the parameter grids in the sweep section of the config in parallel and collects the performance metrics in one table.
+#The tests directory holds the pytest tests of the back tester, run on synthetic data from benchmark.py.
 
 
 #Assumptions:
@@ -33,25 +50,68 @@ def main():
         config = yaml.safe_load(file)
 
     timestr = time.strftime("%Y%m%d_%H%M%S")
-    data_process = analysis.DataProcess(config['data_file'],interpolate_maturity=config['data']['interpolate_maturity'],interpolate_interest_rate=config['data']['interpolate_interest_rate'])
-    
-    for strategy_name in config['strategy_names']:
-        transaction_log = analysis.Transactions(data_process)
-        if strategy_name == 'Buy_And_Hold':
-            strat = strategy.BuyandHoldStrategy(data_process,transaction_log,stock_name = config['stock_name'],transaction_costs = config['transaction_costs']['stock'])
-        if strategy_name == 'Trend':
-            strat = strategy.TrendStrategy(data_process,transaction_log,stock_name = config['stock_name'], short_average = config['trend']['short_average'], long_average = config['trend']['long_average']
-            ,transaction_costs = config['transaction_costs']['stock'])
-        if strategy_name == 'Collar':
-            strat = strategy.CollarStrategy(data_process,transaction_log,stock_name = config['stock_name'], call_strike = config['collar']['call_strike'],call_maturity = config['collar']['call_maturity']
-            ,put_strike = config['collar']['put_strike'],put_maturity = config['collar']['put_maturity'],contract_size = config['collar']['contract_size']
-            ,cash_buffer_percent = config['collar']['cash_buffer_percent'])
-        
-        backtester = backtest.BackTest(data_process,strat,transaction_log,stock_name = config['stock_name'], starting_balance = config['starting_balance'])
-        results = analysis.Analysis(data_process,transaction_log,backtester,strategy_name = strategy_name, directory = config['analysis']['directory'],timestr = timestr)
-        results.plot_mv()
-        results.display_transactions()
-        results.performance_metrics()
+    #Instrumentation of the run. Nothing is timed or wrapped unless enabled.
+    profile = profiler.Profiler(enabled = config['profile']['enabled'] or '--profile' in sys.argv[1:], cprofile = config['profile']['cprofile'], tracemalloc = config['profile']['tracemalloc'])
+    profile.instrument(analysis.DataProcess, ['read_data', 'clean_data', 'interpolate_data', 'convert_percent', 'load_cache', 'save_cache'])
+    profile.instrument(backtest.BackTest, ['rebalance', 'dividends', 'pay_dividend', 'interest'])
+    profile.instrument(analysis.MetricsAccumulator, ['update', 'extend'])
+    profile.instrument(analysis.Analysis, ['calculate_metrics'])
+    for strategy_class in [strategy.BuyandHoldStrategy, strategy.TrendStrategy, strategy.CollarStrategy]:
+        profile.instrument(strategy_class, ['signal', 'signals', 'on_bar', 'rebalance', 'price_options', 'value_options'])
+    profile.start()
+
+    with profile.phase('Load Data'):
+        data_process = analysis.DataProcess(config['data_file'],interpolate_maturity=config['data']['interpolate_maturity'],interpolate_interest_rate=config['data']['interpolate_interest_rate'],cache_directory=config['data']['cache_directory'],pricing_cache_size=config['data']['pricing_cache_size'],streaming=config['data']['streaming'],chunk_size=config['data']['chunk_size'],required_data=strategy.required_data(config['strategy_names']))
+
+    #Batch mode runs the strategies concurrently and only saves the charts. Enabled in the config or with the --batch flag.
+    if config['batch']['enabled'] or '--batch' in sys.argv[1:]:
+        import batch as batch
+        with profile.phase('Batch'):
+            batch.run_batch(config, data_process, timestr)
+    else:
+        #With checkpoints each strategy resumes from its last checkpoint and only back tests the dates added to the data since.
+        checkpoint_directory = os.path.dirname(os.path.realpath(__file__)) + config['checkpoint']['directory']
+        if config['checkpoint']['enabled']:
+            os.makedirs(checkpoint_directory, exist_ok = True)
+        #Runs whose strategy parameters, starting balance and data are in the results store are not back tested again.
+        #The store is not used when profiling, which times the back tests, or with checkpoints, which are saved from the back tests.
+        use_store = config['results_store']['enabled'] and not profile.enabled and not config['checkpoint']['enabled']
+        store = results_store.ResultsStore(results_store.store_file(config)) if use_store else None
+        for strategy_name in config['strategy_names']:
+            checkpoint_file = '{}/{}.pkl'.format(checkpoint_directory,strategy_name)
+            resume_from = checkpoint_file if config['checkpoint']['enabled'] and os.path.exists(checkpoint_file) else None
+            key = results_store.run_key(strategy_name, config, data_process) if store is not None else None
+            stored = store.load(key, data_process) if store is not None else None
+            if stored is not None:
+                print('Using the stored results of the {} strategy, run {}.'.format(strategy_name, key))
+                backtester, transaction_log = stored
+            else:
+                transaction_log = analysis.Transactions(data_process)
+                with profile.phase('Back Test {}'.format(strategy_name)):
+                    strat = strategy.create_strategy(strategy_name,data_process,transaction_log,config,live = config['engine'] == 'stream')
+                    backtester = backtest.BackTest(data_process,strat,transaction_log,stock_name = config['stock_name'], starting_balance = config['starting_balance'], engine = config['engine'], resume_from = resume_from)
+                if config['checkpoint']['enabled']:
+                    backtester.save_checkpoint(checkpoint_file)
+            with profile.phase('Analysis {}'.format(strategy_name)):
+                results = analysis.Analysis(data_process,transaction_log,backtester,strategy_name = strategy_name, directory = config['analysis']['directory'],timestr = timestr,transaction_log_format = config['analysis']['transaction_log_format'],rolling_windows = config['analysis']['rolling_windows'])
+                results.plot_mv()
+                results.display_transactions()
+                metrics = results.performance_metrics()
+            if store is not None and stored is None:
+                store.save(key, strategy_name, strategy.strategy_parameters(strategy_name, config), config, data_process, backtester, transaction_log, metrics)
+        if store is not None:
+            store.close()
+
+        if data_process.pricing_cache is not None:
+            data_process.pricing_cache.save()
+            print('Option pricing cache: {}'.format(data_process.pricing_cache.get_statistics()))
+
+    profile.stop()
+    #The report is written next to the strategy outputs in the Backtest_<timestr> directory.
+    if profile.enabled:
+        directory = os.path.dirname(os.path.realpath(__file__)) + config['analysis']['directory'] + timestr
+        os.makedirs(directory, exist_ok = True)
+        profile.report(directory)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,106 @@
+import contextlib
+import functools
+import time
+import io
+import cProfile
+import pstats
+import tracemalloc
+import pandas as pd
+
+
+#Class: Opt-in instrumentation of a back test run. Enabled with the profile section of the config or the --profile flag of main.py.
+#Records the wall time of each phase of the run (e.g. loading the data or back testing a strategy), the number of calls and cumulative time
+#of instrumented methods, and optionally a cProfile profile and the tracemalloc peak memory and largest allocations.
+#When disabled phase does nothing and no method is wrapped, so the back test runs the original methods.
+class Profiler:
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.enabled = self.kwargs.get('enabled', False)
+        self.cprofile = self.enabled and self.kwargs.get('cprofile', False)
+        self.tracemalloc = self.enabled and self.kwargs.get('tracemalloc', False)
+        self.phases = {}
+        self.methods = {}
+        self.instrumented = [] #(class, method name, original method) to restore when the run is finished.
+        self.profile = None
+        self.memory = None
+
+    #Function: Time a phase of the run. Phases with the same name are added together.
+    @contextlib.contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+
+    #Function: Count the calls and time of methods of a class. The methods are replaced on the class until stop is called.
+    def instrument(self, cls, method_names):
+        if not self.enabled:
+            return
+        for method_name in method_names:
+            if method_name not in vars(cls):
+                continue
+            method = vars(cls)[method_name]
+            self.instrumented.append((cls, method_name, method))
+            setattr(cls, method_name, self.wrap(method, '{}.{}'.format(cls.__name__, method_name)))
+
+    def wrap(self, method, label):
+        self.methods[label] = [0, 0]
+        statistics = self.methods[label]
+
+        @functools.wraps(method)
+        def timed_method(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                statistics[0] += 1
+                statistics[1] += time.perf_counter() - start
+        return timed_method
+
+    def start(self):
+        if self.cprofile:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        if self.tracemalloc:
+            tracemalloc.start()
+
+    #Function: Stop the captures and restore the instrumented methods.
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+        if self.tracemalloc and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            self.memory = {'peak' : tracemalloc.get_traced_memory()[1], 'top' : snapshot.statistics('lineno')[:10]}
+            tracemalloc.stop()
+        for cls, method_name, method in reversed(self.instrumented):
+            setattr(cls, method_name, method)
+        self.instrumented = []
+
+    #Function: Phase and method timings as frames.
+    def get_statistics(self):
+        phases = pd.DataFrame(list(self.phases.items()), columns = ['Phase', 'Seconds'])
+        methods = pd.DataFrame([[label, calls, seconds, seconds / calls * 1e6 if calls > 0 else 0] for label, (calls, seconds) in self.methods.items() if calls > 0],
+                               columns = ['Method', 'Calls', 'Seconds', 'Microseconds per Call'])
+        return phases, methods.sort_values('Seconds', ascending = False)
+
+    #Function: Write the summary report to Profile_Report.txt in the directory, and the cProfile data to Profile.prof when captured.
+    def report(self, directory):
+        if not self.enabled:
+            return
+        phases, methods = self.get_statistics()
+        lines = ['Phases', phases.to_string(index = False, float_format = '{:.6g}'.format), '', 'Methods', methods.to_string(index = False, float_format = '{:.6g}'.format)]
+        if self.profile is not None:
+            self.profile.dump_stats('{}/Profile.prof'.format(directory))
+            stream = io.StringIO()
+            pstats.Stats(self.profile, stream = stream).sort_stats('cumulative').print_stats(30)
+            lines += ['', 'cProfile (top 30 by cumulative time)', stream.getvalue()]
+        if self.memory is not None:
+            lines += ['', 'tracemalloc peak: {:.1f} MB'.format(self.memory['peak'] / 1e6), 'Largest allocations:'] + [str(statistic) for statistic in self.memory['top']]
+        with open('{}/Profile_Report.txt'.format(directory), 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        print('\n'.join(lines[:5]))
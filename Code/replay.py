@@ -0,0 +1,132 @@
+import yaml
+import os
+import time
+import contextlib
+import io
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import analysis as analysis
+import backtest as backtest
+import strategies as strategy
+
+
+#Replay: paper trade the strategies on a replay of the data, one bar at a time, as they would run on a live daily or intraday feed.
+#Each strategy keeps only the state it needs to give the signal of the next bar (running sums of the moving averages for the trend strategy,
+#the option book and the maturity dates around the current bar for the collar), so a bar takes the same time at the start and the end of a long feed.
+#The time of each bar (strategy signal, rebalance, dividends, interest and metrics) is recorded and summarized in a latency histogram.
+#The portfolio values and transaction log of the replay are checked against a back test of the same strategy on the whole data.
+
+
+#Function: Bars of the data as a live feed would deliver them, read in chunks from DataProcess.stream (see analysis.chunk_bars).
+def replay_feed(data_process, market_data = False):
+    for chunk in data_process.stream():
+        yield from analysis.chunk_bars(chunk, market_data)
+
+#Function: Replay the bars of the data through a live back test (engine 'live') of a strategy. Returns the back test, its transaction log
+#and the time of each bar in nanoseconds. The time to build the bars is not included, as it is the time of the feed.
+def replay_strategy(strategy_name, config, data_process):
+    transaction_log = analysis.Transactions(data_process)
+    strat = strategy.create_strategy(strategy_name, data_process, transaction_log, config, live = True)
+    backtester = backtest.BackTest(data_process, strat, transaction_log, stock_name = config['stock_name'], starting_balance = config['starting_balance'], engine = 'live')
+    latencies = []
+    #The strategies report days without enough data, which would be timed with the bar.
+    with contextlib.redirect_stdout(io.StringIO()):
+        for bar in replay_feed(data_process, getattr(strat,'live',False)):
+            start = time.perf_counter_ns()
+            backtester.on_bar(bar)
+            latencies.append(time.perf_counter_ns() - start)
+    return backtester, transaction_log, np.array(latencies)
+
+#Function: Compare a replay with a back test of the strategy on the whole data with the engine of the replay section of the config.
+#Portfolio values match when they are within the relative tolerance (or both missing), and the transaction logs when they have the same
+#transactions with quantities and prices within the tolerance.
+def check_parity(strategy_name, config, data_process, backtester, transaction_log):
+    reference_log = analysis.Transactions(data_process)
+    reference_strategy = strategy.create_strategy(strategy_name, data_process, reference_log, config, live = config['replay']['reference_engine'] == 'stream')
+    with contextlib.redirect_stdout(io.StringIO()):
+        reference = backtest.BackTest(data_process, reference_strategy, reference_log, stock_name = config['stock_name'], starting_balance = config['starting_balance'], engine = config['replay']['reference_engine'])
+    tolerance = config['replay']['tolerance']
+
+    values = backtester.get_portfolio_value_frame()
+    reference_values = reference.get_portfolio_value_frame()
+    same_dates = values.index.equals(reference_values.index)
+    if same_dates:
+        difference = np.abs(values.to_numpy() - reference_values.to_numpy()) / np.abs(reference_values.to_numpy())
+        values_match = bool(np.array_equal(np.isnan(values.to_numpy()), np.isnan(reference_values.to_numpy())) and np.all(np.nan_to_num(difference) <= tolerance))
+        max_difference = np.nanmax(difference) if np.isfinite(difference).any() else 0
+    else:
+        values_match, max_difference = False, np.nan
+
+    log = transaction_log.get_log()
+    reference_log = reference_log.get_log()
+    log_match = log.shape == reference_log.shape
+    if log_match:
+        numeric = log.select_dtypes(include = 'number').columns
+        other = log.columns.difference(numeric)
+        log_match = bool(log.loc[:,other].equals(reference_log.loc[:,other]) and np.allclose(log.loc[:,numeric].to_numpy(dtype = float), reference_log.loc[:,numeric].to_numpy(dtype = float), rtol = tolerance, atol = 0))
+
+    return {'Strategy' : strategy_name, 'Bars' : len(values), 'Same Dates' : same_dates, 'Portfolio Values Match' : values_match,
+            'Max Relative Difference' : max_difference, 'Transactions' : len(log), 'Transaction Log Match' : log_match,
+            'Parity' : same_dates and values_match and log_match}
+
+#Function: Histogram of the bar latencies in microseconds, with bins evenly spaced on a log scale. Returns a frame of the bins and the count of bars in each.
+def latency_histogram(latencies, bins = 30):
+    microseconds = latencies / 1e3
+    edges = np.logspace(np.log10(microseconds.min()), np.log10(microseconds.max()) + 1e-9, bins + 1)
+    counts, edges = np.histogram(microseconds, bins = edges)
+    return pd.DataFrame({'From (us)' : edges[:-1], 'To (us)' : edges[1:], 'Bars' : counts})
+
+#Function: Percentiles of the bar latencies in microseconds.
+def latency_summary(latencies):
+    microseconds = latencies / 1e3
+    return {'Mean (us)' : np.mean(microseconds), 'p50 (us)' : np.percentile(microseconds, 50), 'p90 (us)' : np.percentile(microseconds, 90),
+            'p99 (us)' : np.percentile(microseconds, 99), 'Max (us)' : np.max(microseconds), 'Bars per Second' : len(latencies) / (np.sum(latencies) / 1e9)}
+
+def save_chart(histograms, directory):
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    #Each histogram is drawn as a step outline from its bin counts (Axes.stairs needs matplotlib 3.4).
+    for strategy_name, histogram in histograms.items():
+        axes.hist(histogram.loc[:,'From (us)'].to_numpy(), bins = np.append(histogram.loc[:,'From (us)'].to_numpy(), histogram.loc[:,'To (us)'].iloc[-1]), weights = histogram.loc[:,'Bars'].to_numpy(), histtype = 'step', label = strategy_name)
+    axes.set_xscale('log')
+    axes.legend()
+    axes.set_xlabel('Latency per Bar (us)')
+    axes.set_ylabel('Bars')
+    axes.set_title('Replay Latency')
+    figure.savefig('{}/Replay_Latency.png'.format(directory))
+
+def main():
+
+    with open('config.yaml', 'r') as file:
+        config = yaml.safe_load(file)
+
+    timestr = time.strftime("%Y%m%d_%H%M%S")
+    strategy_names = config['replay']['strategy_names']
+    data_process = analysis.DataProcess(config['data_file'],interpolate_maturity=config['data']['interpolate_maturity'],interpolate_interest_rate=config['data']['interpolate_interest_rate'],cache_directory=config['data']['cache_directory'],pricing_cache_size=config['data']['pricing_cache_size'],streaming=config['data']['streaming'],chunk_size=config['data']['chunk_size'],required_data=strategy.required_data(strategy_names))
+
+    summary = []
+    histograms = {}
+    for strategy_name in strategy_names:
+        backtester, transaction_log, latencies = replay_strategy(strategy_name, config, data_process)
+        row = check_parity(strategy_name, config, data_process, backtester, transaction_log)
+        row.update(latency_summary(latencies))
+        summary.append(row)
+        histograms[strategy_name] = latency_histogram(latencies, config['replay']['bins'])
+    summary = pd.DataFrame(summary).set_index('Strategy')
+    print(summary.T)
+
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    directory = str(dir_path)+config['replay']['directory']+timestr
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    summary.to_csv('{}/Replay_Summary.csv'.format(directory))
+    pd.concat(histograms, names = ['Strategy', 'Bin']).to_csv('{}/Replay_Latency.csv'.format(directory))
+    save_chart(histograms, directory)
+    if not summary.loc[:,'Parity'].all():
+        raise Exception("The replay does not match the back test for: {}.".format(', '.join(summary.index[~summary.loc[:,'Parity']])))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import sqlite3
+import hashlib
+import json
+import os
+import time
+import yaml
+import numpy as np
+import pandas as pd
+import analysis as analysis
+import strategies as strategy
+
+
+#Results store: a SQLite database of the runs of main.py with their performance metrics, portfolio values and transaction logs.
+#A run is keyed by a hash of the strategy, its config entries (strategies.strategy_parameters), the starting balance, the engine and the fingerprint
+#of the data file and its processing parameters (DataProcess.get_fingerprint). The engine is part of the key as the engines can differ slightly
+#(e.g. the vectorized engine accumulates the performance metrics of many days at once, in a different order of operations).
+#When the key of a run is already stored its results are used instead of back testing it again. store_version is part of the key and is increased
+#when a change to the back test changes its results, so older runs are not reused.
+#The runs are indexed by strategy, parameter value and metric value, so past runs can be compared with SQL queries instead of reading their CSV files.
+
+store_version = 1
+
+schema = ['CREATE TABLE IF NOT EXISTS runs (key TEXT PRIMARY KEY, strategy_name TEXT NOT NULL, parameters TEXT NOT NULL, starting_balance REAL, data_file TEXT, data_fingerprint TEXT, engine TEXT, created TEXT)',
+          'CREATE TABLE IF NOT EXISTS parameters (key TEXT NOT NULL, name TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (key, name)) WITHOUT ROWID',
+          'CREATE TABLE IF NOT EXISTS metrics (key TEXT NOT NULL, metric TEXT NOT NULL, value REAL, PRIMARY KEY (key, metric)) WITHOUT ROWID',
+          'CREATE TABLE IF NOT EXISTS portfolio_values (key TEXT NOT NULL, date INTEGER NOT NULL, value REAL, PRIMARY KEY (key, date)) WITHOUT ROWID',
+          'CREATE TABLE IF NOT EXISTS transactions (key TEXT NOT NULL, number INTEGER NOT NULL, date INTEGER NOT NULL, asset TEXT, quantity REAL, price REAL, transaction_type TEXT, PRIMARY KEY (key, number)) WITHOUT ROWID',
+          'CREATE INDEX IF NOT EXISTS runs_strategy ON runs (strategy_name)',
+          'CREATE INDEX IF NOT EXISTS parameters_value ON parameters (name, value)',
+          'CREATE INDEX IF NOT EXISTS metrics_value ON metrics (metric, value)']
+
+
+#Function: Key of a run of a strategy with the config on the data.
+def run_key(strategy_name, config, data_process):
+    key = [store_version, strategy_name, strategy.strategy_parameters(strategy_name, config), config['starting_balance'], config['engine'], data_process.get_fingerprint()]
+    return hashlib.sha256(json.dumps(key, sort_keys = True, default = str).encode()).hexdigest()[:16]
+
+
+#Class: Results of a stored run, with the methods of BackTest used by Analysis.
+class StoredRun:
+
+    def __init__(self, portfolio_value_frame, metrics):
+        self.portfolio_value_frame = portfolio_value_frame
+        self.metrics = metrics
+
+    def get_portfolio_value_frame(self):
+        return self.portfolio_value_frame
+
+    def get_metrics(self):
+        return self.metrics
+
+
+#Class: SQLite store of the results of runs. Parameter values are stored as JSON, so a parameter is queried with the JSON of its value (e.g. '[90, 180]').
+#Dates are stored as nanoseconds since the epoch.
+class ResultsStore:
+
+    def __init__(self, file, **kwargs):
+        self.file = file
+        self.kwargs = kwargs
+        self.connection = sqlite3.connect(self.file)
+        with self.connection:
+            for statement in schema:
+                self.connection.execute(statement)
+
+    def close(self):
+        self.connection.close()
+
+    def contains(self, key):
+        return self.connection.execute('SELECT 1 FROM runs WHERE key = ?', (key,)).fetchone() is not None
+
+    #Function: Save the results of a run, replacing a stored run with the same key. parameters are the strategy's config entries (strategies.strategy_parameters),
+    #backtester a BackTest (or StoredRun) and metrics the performance metrics of Analysis.
+    def save(self, key, strategy_name, parameters, config, data_process, backtester, transactions, metrics):
+        portfolio_value_frame = backtester.get_portfolio_value_frame()
+        log = transactions.get_log()
+        with self.connection:
+            self.delete(key)
+            self.connection.execute('INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (key, strategy_name, json.dumps(parameters, sort_keys = True, default = str), float(config['starting_balance']),
+                                    data_process.file, data_process.get_fingerprint(), config['engine'], time.strftime("%Y-%m-%d %H:%M:%S")))
+            self.connection.executemany('INSERT INTO parameters VALUES (?, ?, ?)', [(key, name, json.dumps(value, default = str)) for name, value in parameters.items()])
+            self.connection.executemany('INSERT INTO metrics VALUES (?, ?, ?)', [(key, metric, float(value)) for metric, value in metrics.items()])
+            self.connection.executemany('INSERT INTO portfolio_values VALUES (?, ?, ?)', zip([key] * len(portfolio_value_frame), portfolio_value_frame.index.asi8.tolist(), portfolio_value_frame.to_numpy(dtype = float).tolist()))
+            self.connection.executemany('INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)', zip([key] * len(log), range(len(log)), log.index.asi8.tolist(), log.loc[:,'Asset'].astype(str).tolist(),
+                                        log.loc[:,'Quantity'].tolist(), log.loc[:,'Price'].tolist(), log.loc[:,'Transaction Type'].astype(str).tolist()))
+
+    def delete(self, key):
+        for table in ['runs', 'parameters', 'metrics', 'portfolio_values', 'transactions']:
+            self.connection.execute('DELETE FROM {} WHERE key = ?'.format(table), (key,))
+
+    #Function: Results of a stored run as a StoredRun and a transaction log on the data, or None when the key is not stored.
+    #The transactions are logged again in their original order, so the transaction aggregates are the same as in the run.
+    def load(self, key, data_process):
+        if not self.contains(key):
+            return None
+        metrics = dict(self.connection.execute('SELECT metric, value FROM metrics WHERE key = ?', (key,)).fetchall())
+        portfolio_values = pd.read_sql_query('SELECT date, value FROM portfolio_values WHERE key = ? ORDER BY date', self.connection, params = (key,))
+        portfolio_value_frame = pd.Series(data = portfolio_values.loc[:,'value'].to_numpy(dtype = float), index = pd.DatetimeIndex(portfolio_values.loc[:,'date'].to_numpy(dtype = 'M8[ns]'), name = 'Date'))
+
+        log = pd.read_sql_query('SELECT date, asset, quantity, price, transaction_type FROM transactions WHERE key = ? ORDER BY number', self.connection, params = (key,))
+        transactions = analysis.Transactions(data_process)
+        #Consecutive transactions of the same asset and type are logged together.
+        group = log.loc[:,['asset','transaction_type']]
+        boundaries = np.append(np.flatnonzero(group.ne(group.shift()).any(axis = 1).to_numpy()), len(log))
+        dates = log.loc[:,'date'].to_numpy(dtype = 'M8[ns]')
+        quantities = log.loc[:,'quantity'].to_numpy(dtype = float)
+        prices = log.loc[:,'price'].to_numpy(dtype = float)
+        for start, stop in zip(boundaries[:-1], boundaries[1:]):
+            transactions.log_transactions(dates[start:stop], log.loc[start,'asset'], quantities[start:stop], prices[start:stop], log.loc[start,'transaction_type'])
+        return StoredRun(portfolio_value_frame, metrics), transactions
+
+    #Function: Stored runs with their parameters and metrics as columns, one row per run. Only the runs of strategy_name when given and with the parameter values
+    #in parameters (e.g. {'trend.short_average' : 50}) are returned. Both filters use the indexes.
+    def query(self, strategy_name = None, parameters = None):
+        conditions = []
+        values = []
+        if strategy_name is not None:
+            conditions.append('runs.strategy_name = ?')
+            values.append(strategy_name)
+        for name, value in (parameters or {}).items():
+            conditions.append('runs.key IN (SELECT key FROM parameters WHERE name = ? AND value = ?)')
+            values += [name, json.dumps(value, default = str)]
+        where = ' WHERE ' + ' AND '.join(conditions) if len(conditions) > 0 else ''
+        runs = pd.read_sql_query('SELECT key, strategy_name, starting_balance, data_file, data_fingerprint, engine, created FROM runs' + where + ' ORDER BY created', self.connection, params = values)
+        keys = runs.loc[:,'key'].tolist()
+        if len(keys) == 0:
+            return runs.set_index('key')
+        placeholders = ', '.join(['?'] * len(keys))
+        parameter_values = pd.read_sql_query('SELECT key, name, value FROM parameters WHERE key IN ({})'.format(placeholders), self.connection, params = keys).pivot(index = 'key', columns = 'name', values = 'value')
+        metric_values = pd.read_sql_query('SELECT key, metric, value FROM metrics WHERE key IN ({})'.format(placeholders), self.connection, params = keys).pivot(index = 'key', columns = 'metric', values = 'value')
+        return runs.set_index('key').join(parameter_values).join(metric_values)
+
+    #Function: Portfolio values of stored runs side by side, one column per key.
+    def portfolio_values(self, keys):
+        placeholders = ', '.join(['?'] * len(keys))
+        portfolio_values = pd.read_sql_query('SELECT key, date, value FROM portfolio_values WHERE key IN ({})'.format(placeholders), self.connection, params = list(keys))
+        frame = portfolio_values.pivot(index = 'date', columns = 'key', values = 'value')
+        frame.index = pd.DatetimeIndex(frame.index.to_numpy(dtype = 'M8[ns]'), name = 'Date')
+        return frame.reindex(columns = list(keys))
+
+#Function: Location of the results store of the config, next to the code like the other outputs.
+def store_file(config):
+    return os.path.dirname(os.path.realpath(__file__)) + config['results_store']['file']
+
+def main():
+
+    with open('config.yaml', 'r') as file:
+        config = yaml.safe_load(file)
+
+    store = ResultsStore(store_file(config))
+    for strategy_name in config['strategy_names']:
+        print(store.query(strategy_name = strategy_name))
+    store.close()
+
+if __name__ == '__main__':
+    main()
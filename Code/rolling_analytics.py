@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+
+#Rolling performance metrics: the metrics of Analysis.performance_metrics over trailing windows of days, as full time series.
+#Every function works along the last axis of 2D (series x day) arrays, so many portfolio value series (e.g. strategies or parameter sets)
+#are computed at once. Window sums come from cumulative sums and window maxima from block prefix/suffix maxima, so every metric is O(n)
+#in the number of days whatever the window length. Returns are annualized with 365 days, as in performance_metrics.
+#The value on a date is NaN until the window has window daily returns.
+
+#Names of the rolling metrics, in the order they are written.
+metric_names = ['Annualized Excess Return', 'Annualized Volatility', 'Annualized Excess Return Volatility', 'Sharpe Ratio', 'Drawdown', 'Downside Deviation', 'Sortino Ratio']
+
+
+#Function: Sums over the trailing windows of window days along the last axis, as differences of cumulative sums.
+def rolling_sum(values, window):
+    sums = np.full(values.shape, np.nan)
+    if window > values.shape[-1]:
+        return sums
+    cumulative = np.cumsum(values, axis = -1)
+    sums[..., window-1] = cumulative[..., window-1]
+    sums[..., window:] = cumulative[..., window:] - cumulative[..., :-window]
+    return sums
+
+#Function: Maxima over the trailing windows of window days along the last axis (van Herk/Gil-Werman). The days are split into blocks of window days,
+#and the window ending on a day is covered by the maximum from its start to the end of its block and the maximum from the start of the next block to the day.
+def rolling_max(values, window):
+    days = values.shape[-1]
+    maxima = np.full(values.shape, np.nan)
+    if window > days:
+        return maxima
+    padded = np.concatenate([values, np.full(values.shape[:-1] + ((-days) % window,), -np.inf)], axis = -1)
+    blocks = padded.reshape(values.shape[:-1] + (-1, window))
+    prefix = np.maximum.accumulate(blocks, axis = -1).reshape(padded.shape)
+    suffix = np.maximum.accumulate(blocks[..., ::-1], axis = -1)[..., ::-1].reshape(padded.shape)
+    maxima[..., window-1:] = np.maximum(suffix[..., :days-window+1], prefix[..., window-1:days])
+    return maxima
+
+#Function: Carry the last valid value forward over missing values along the last axis. Values before the first valid one stay missing.
+def fill_forward(values):
+    valid = ~np.isnan(values)
+    index = np.maximum.accumulate(np.where(valid, np.arange(values.shape[-1]), 0), axis = -1)
+    return np.take_along_axis(values, index, axis = -1)
+
+#Function: Rolling metrics of portfolio values (series x day) for windows of window daily returns. dates are the dates of the days and
+#interest_rates the annual overnight rates. Missing portfolio values are treated as unchanged from the previous value, as in performance_metrics.
+#Returns a dict of metric name to a series x day array.
+def rolling_metrics(portfolio_values, dates, interest_rates, window):
+    portfolio_values = fill_forward(np.atleast_2d(np.asarray(portfolio_values, dtype = float)))
+    daily_interest_rates = (1 + np.asarray(interest_rates, dtype = float)) ** (1/365) - 1
+    returns = np.full(portfolio_values.shape, np.nan)
+    returns[:, 1:] = portfolio_values[:, 1:] / portfolio_values[:, :-1] - 1
+    excess_returns = returns - daily_interest_rates
+
+    #Windows with a missing return (before the first portfolio value) are NaN.
+    complete = rolling_sum(np.isnan(excess_returns).astype(float), window) == 0
+    def window_sum(values):
+        sums = rolling_sum(np.nan_to_num(values), window)
+        return np.where(complete, sums, np.nan)
+    #Standard deviation from the window sums of the values less their mean over all days, which avoids the loss of precision of large sums of squares.
+    def window_std(values):
+        centered = values - np.nanmean(values, axis = -1, keepdims = True)
+        first, second = window_sum(centered), window_sum(centered ** 2)
+        return np.sqrt(np.maximum(second - first ** 2 / window, 0) / (window - 1))
+
+    metrics = {}
+    years = np.full(len(dates), np.nan)
+    years[window:] = (dates[window:] - dates[:-window]).days.to_numpy() / 365
+    metrics['Annualized Excess Return'] = np.exp(window_sum(np.log1p(excess_returns))) ** (1 / years) - 1
+    metrics['Annualized Volatility'] = window_std(returns) * np.sqrt(365)
+    metrics['Annualized Excess Return Volatility'] = window_std(excess_returns) * np.sqrt(365)
+    metrics['Sharpe Ratio'] = metrics['Annualized Excess Return'] / metrics['Annualized Excess Return Volatility']
+
+    #Drawdown from the highest portfolio value of the window (window + 1 values, including the value before the first return).
+    peak = rolling_max(np.nan_to_num(portfolio_values, nan = -np.inf), window + 1)
+    metrics['Drawdown'] = np.where(complete, (peak - portfolio_values) / peak, np.nan)
+    metrics['Downside Deviation'] = np.sqrt(window_sum(np.minimum(excess_returns, 0) ** 2) / window) * np.sqrt(365)
+    metrics['Sortino Ratio'] = metrics['Annualized Excess Return'] / metrics['Downside Deviation']
+    return metrics
+
+#Function: Rolling metrics of the columns of a frame of portfolio values (date x series) for every window in windows.
+#Returns a frame indexed by date with a column per metric and series, named '<window> Day <metric>'.
+def rolling_frame(portfolio_value_frame, interest_rates, windows):
+    dates = portfolio_value_frame.index
+    interest_rates = interest_rates.reindex(dates).to_numpy()
+    columns = {}
+    for window in np.atleast_1d(windows).tolist():
+        metrics = rolling_metrics(portfolio_value_frame.to_numpy(dtype = float).T, dates, interest_rates, window)
+        for metric_name in metric_names:
+            for series, values in zip(portfolio_value_frame.columns, metrics[metric_name]):
+                columns[('{} Day {}'.format(window, metric_name), series)] = values
+    frame = pd.DataFrame(columns, index = dates)
+    frame.columns.names = ['Rolling Metric', 'Series']
+    return frame
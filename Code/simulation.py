@@ -0,0 +1,183 @@
+import yaml
+import os
+import time
+import numpy as np
+import pandas as pd
+from utils import *
+import strategies as strategy
+import backtest as backtest
+import analysis as analysis
+
+
+#Simulation: run the strategies on simulated price paths to get the distribution of their performance metrics instead of one historical path.
+#Paths are generated from the historical daily log returns of the price, either with a geometric Brownian motion calibrated to their mean and
+#volatility ('gbm') or with a stationary block bootstrap of the returns ('bootstrap'). Every path starts at the first historical price and has the
+#historical dates, interest rates, implied vols and dividend yields. Dividends are scaled by the path price relative to the historical price at the ex-date.
+#All paths are back tested at once as path x day arrays. The buy and hold and trend strategies run on the multi-asset back test with one asset per path
+#and the collar runs on PathCollarBackTest. Paths are simulated and back tested in chunks of chunk_size paths and only the metrics of each path are kept,
+#so memory is bounded by the chunk size.
+
+
+#Function: Price paths from a geometric Brownian motion with the mean and volatility of the daily log returns of prices. Returns a path x day array.
+def gbm_paths(prices, paths, rng):
+    log_returns = np.diff(np.log(prices))
+    simulated_returns = np.mean(log_returns) + np.std(log_returns, ddof = 1) * rng.standard_normal((paths, len(log_returns)))
+    return prices[0] * np.exp(np.concatenate([np.zeros((paths, 1)), np.cumsum(simulated_returns, axis = 1)], axis = 1))
+
+#Function: Price paths from a stationary block bootstrap of the daily log returns of prices. Returns a path x day array.
+#Blocks start at a random day and have a geometric length with mean block_length days. A block continuing past the last return wraps around to the first.
+def bootstrap_paths(prices, paths, block_length, rng):
+    log_returns = np.diff(np.log(prices))
+    days = len(log_returns)
+    new_block = rng.random((paths, days)) < 1/block_length
+    new_block[:, 0] = True
+    block_starts = rng.integers(0, days, (paths, days))
+    steps = np.arange(days)
+    #Day of the path where the current block started, and the return sampled for each day of the path.
+    block_start_day = np.maximum.accumulate(np.where(new_block, steps, 0), axis = 1)
+    sample = (np.take_along_axis(block_starts, block_start_day, axis = 1) + steps - block_start_day) % days
+    return prices[0] * np.exp(np.concatenate([np.zeros((paths, 1)), np.cumsum(log_returns[sample], axis = 1)], axis = 1))
+
+#Function: Dividend per share paid on each day of each path, as a path x day array. The historical dividend scaled by the path price relative to the historical price at the ex-date.
+#Dividends are paid on the same dates as in the historical back test.
+def path_dividends(calendar, prices, path_prices):
+    dividends = np.zeros(path_prices.shape)
+    ex_date_index = np.flatnonzero(calendar.ex_dates)
+    for ex_index, next_ex_index in zip(ex_date_index, np.append(ex_date_index[1:], len(calendar.ex_dates))):
+        pay_index = calendar.pay_date_index[ex_index]
+        if ex_index <= pay_index < next_ex_index:
+            dividends[:, pay_index] = calendar.dividend_amounts[ex_index] * (path_prices[:, ex_index] / prices[ex_index])
+    return dividends
+
+#Function: Performance metrics of every path from a day x path array of portfolio values, with the same definitions as MetricsAccumulator.
+#Missing portfolio values are treated as unchanged from the previous value.
+def path_metrics(portfolio_values, dates, interest_rates):
+    values = pd.DataFrame(portfolio_values).ffill().to_numpy()
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        excess_returns = values[1:]/values[:-1] - 1 - ((1+interest_rates[1:,None])**(1/365) - 1)
+        annualized_excess_return = np.nanprod(1 + excess_returns, axis = 0) ** (365/(dates[-1] - dates[0]).days) - 1
+        annualized_excess_return_volatility = np.nanstd(excess_returns, axis = 0, ddof = 1) * np.sqrt(365)
+        running_max = np.fmax.accumulate(values, axis = 0)
+        drawdowns = (running_max - values)/running_max
+    metrics = pd.DataFrame({'Terminal Value' : portfolio_values[-1],
+                            'Annualized Excess Return' : annualized_excess_return,
+                            'Annualized Excess Return Volatility' : annualized_excess_return_volatility,
+                            'Sharpe Ratio' : annualized_excess_return / annualized_excess_return_volatility,
+                            'Maximum Drawdown' : np.nanmax(drawdowns, axis = 0)})
+    return metrics
+
+
+#Class: The collar strategy back tested on many price paths at once. Uses the option book layout, roll dates, option maturity dates and market data
+#(implied vols, interest rates and dividend yields) of a CollarStrategy on the historical data, and applies the collar's rules to every path each day
+#with CollarStrategy.rebalance_paths, the rebalance of the back test. Stock and cash are arrays over the paths and the option book has a row per path.
+#The maturity dates of the legs are the same for every path, as the options are rolled on the same dates.
+#A single path of the historical prices gives the same portfolio values as BackTest with the CollarStrategy.
+class PathCollarBackTest:
+    def __init__(self, collar, path_prices, dividends, interest_rates, **kwargs):
+        self.collar = collar
+        self.path_prices = path_prices
+        self.dividends = dividends
+        self.interest_rates = interest_rates
+        self.kwargs = kwargs
+        paths = len(self.path_prices)
+        self.cash = np.full(paths, self.kwargs['starting_balance'], dtype = float)
+        self.stock = np.zeros(paths)
+        self.option_book = strategy.OptionBook(self.collar.option_maturity, paths = paths)
+        self.portfolio_value_frame = None
+
+        self.backtest()
+
+    #Function: Loop through each date and rebalance, receive dividends and collect interest for every path at once.
+    #Same order of operations as BackTest. The options are priced without the pricing cache, as the prices of the paths are not repeated.
+    def backtest(self):
+        dates = self.collar.data_process.get_prices().index
+        days = self.path_prices.shape[1]
+        growth = (1+self.interest_rates)**(1/365)
+        portfolio_value_frame = np.empty((days, len(self.path_prices)))
+        for date_index in range(days):
+            signal = self.collar.day_signal(date_index)
+            self.stock, self.cash, portfolio_value, trades = self.collar.rebalance_paths(signal, dates[date_index], date_index, self.path_prices[:, date_index], self.stock, self.cash, self.option_book, cached = False)
+            portfolio_value -= self.cash
+            self.cash += self.stock * self.dividends[:, date_index]
+            self.cash *= growth[date_index]
+            portfolio_value_frame[date_index] = self.cash + portfolio_value
+        self.portfolio_value_frame = portfolio_value_frame
+
+    def get_portfolio_value_frame(self):
+        return self.portfolio_value_frame
+
+
+#Function: Portfolio values of a strategy on every path, as a day x path array.
+def run_paths(strategy_name, config, data_process, path_prices, dividends, collar = None):
+    dates = data_process.get_prices().index
+    if strategy_name == 'Collar':
+        interest_rates = data_process.get_interest_rates().loc[dates,1].to_numpy(dtype = float)
+        return PathCollarBackTest(collar, path_prices, dividends, interest_rates, starting_balance = config['starting_balance']).get_portfolio_value_frame()
+
+    #One asset per path, each with the whole starting balance.
+    assets = list(range(len(path_prices)))
+    panel_data = analysis.PanelData(pd.DataFrame(path_prices.T, index = dates, columns = assets), data_process.get_interest_rates(),
+                                    dividends = pd.DataFrame(dividends.T, index = dates, columns = assets))
+    transaction_log = analysis.Transactions(panel_data)
+    strat = strategy.create_panel_strategy(strategy_name, panel_data, transaction_log, config)
+    backtester = backtest.MultiAssetBackTest(panel_data, strat, transaction_log, starting_balance = config['starting_balance'], allocation = np.ones(len(assets)))
+    return backtester.get_asset_value_frame().to_numpy()
+
+#Function: Simulate the paths in chunks and back test every strategy on them. Returns the metrics of every strategy and path.
+def simulate(config, data_process):
+    settings = config['simulation']
+    dates = data_process.get_prices().index
+    prices = data_process.get_prices().loc[:,'Price'].to_numpy(dtype = float)
+    interest_rates = data_process.get_interest_rates().loc[dates,1].to_numpy(dtype = float)
+    calendar = data_process.get_calendar()
+    #The collar's roll dates and market data are calculated once from the historical data and shared by every chunk.
+    collar = strategy.create_strategy('Collar', data_process, analysis.Transactions(data_process), config) if 'Collar' in config['strategy_names'] else None
+
+    chunks = range(0, settings['paths'], settings['chunk_size'])
+    #Each chunk has its own random stream, so a chunk's paths do not depend on the other chunks.
+    seeds = np.random.SeedSequence(settings['seed']).spawn(len(chunks))
+    metrics = []
+    for start, seed in zip(chunks, seeds):
+        rng = np.random.default_rng(seed)
+        paths = min(settings['chunk_size'], settings['paths'] - start)
+        if settings['method'] == 'gbm':
+            path_prices = gbm_paths(prices, paths, rng)
+        elif settings['method'] == 'bootstrap':
+            path_prices = bootstrap_paths(prices, paths, settings['block_length'], rng)
+        else:
+            raise Exception("Please input a valid simulation method.")
+        dividends = path_dividends(calendar, prices, path_prices)
+
+        for strategy_name in config['strategy_names']:
+            path_metric = path_metrics(run_paths(strategy_name, config, data_process, path_prices, dividends, collar), dates, interest_rates)
+            path_metric.insert(0, 'Path', np.arange(start, start + paths))
+            path_metric.insert(0, 'Strategy', strategy_name)
+            metrics.append(path_metric)
+    return pd.concat(metrics, ignore_index = True)
+
+#Function: Mean, standard deviation and percentiles of each metric for each strategy.
+def summarize(metrics):
+    return metrics.drop(columns = 'Path').groupby('Strategy', sort = False).describe(percentiles = [0.05, 0.25, 0.5, 0.75, 0.95]).T
+
+
+def main():
+
+    with open('config.yaml', 'r') as file:
+        config = yaml.safe_load(file)
+
+    timestr = time.strftime("%Y%m%d_%H%M%S")
+    data_process = analysis.DataProcess(config['data_file'],interpolate_maturity=config['data']['interpolate_maturity'],interpolate_interest_rate=config['data']['interpolate_interest_rate'],cache_directory=config['data']['cache_directory'],pricing_cache_size=config['data']['pricing_cache_size'],required_data=strategy.required_data(config['strategy_names']))
+
+    metrics = simulate(config, data_process)
+    summary = summarize(metrics)
+    print(summary)
+
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    directory = str(dir_path)+config['simulation']['directory']+timestr
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    metrics.to_csv('{}/Simulation_Metrics.csv'.format(directory),index=False)
+    summary.to_csv('{}/Simulation_Summary.csv'.format(directory))
+
+if __name__ == '__main__':
+    main()
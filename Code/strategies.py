@@ -1,10 +1,69 @@
 import numpy as np
 import pandas as pd 
+import bisect
 from utils import *
+import indicators as indicators
+import events as events
+
+
+#Config entries used by each strategy. A section name (e.g. 'trend') includes all of its entries.
+strategy_config = {'Buy_And_Hold' : ['stock_name', 'transaction_costs.stock'], 'Trend' : ['stock_name', 'transaction_costs.stock', 'trend'], 'Collar' : ['stock_name', 'transaction_costs', 'collar']}
+
+#Relative time to back test each strategy, used to start the longest back tests first when strategies run in parallel (batch.py).
+#The collar prices and values its options every day, so it takes far longer than the signal-only strategies.
+strategy_cost = {'Buy_And_Hold' : 1, 'Trend' : 2, 'Collar' : 40}
+
+#Datasets of the DataProcess used by each strategy and its back test. Only the collar prices options and needs the implied vols.
+strategy_data = {'Buy_And_Hold' : ['prices', 'dividends', 'interest_rates'], 'Trend' : ['prices', 'dividends', 'interest_rates'], 'Collar' : ['prices', 'dividends', 'interest_rates', 'implied_vol']}
+
+#Function: Datasets needed to back test the strategies in strategy_names, in the order they are listed in strategy_data.
+def required_data(strategy_names):
+    datasets = []
+    for strategy_name in strategy_names:
+        datasets += [dataset for dataset in strategy_data[strategy_name] if dataset not in datasets]
+    return datasets
+
+#Function: Create a strategy from its name with the parameters in the config.
+#live creates a collar that runs on the bars of a feed through on_bar, for the stream and live engines.
+def create_strategy(strategy_name, data_process, transactions, config, live = False):
+    if strategy_name == 'Buy_And_Hold':
+        return BuyandHoldStrategy(data_process,transactions,stock_name = config['stock_name'],transaction_costs = config['transaction_costs']['stock'])
+    elif strategy_name == 'Trend':
+        return TrendStrategy(data_process,transactions,stock_name = config['stock_name'], short_average = config['trend']['short_average'], long_average = config['trend']['long_average']
+        ,transaction_costs = config['transaction_costs']['stock'])
+    elif strategy_name == 'Collar':
+        return CollarStrategy(data_process,transactions,stock_name = config['stock_name'], call_strike = config['collar']['call_strike'],call_maturity = config['collar']['call_maturity']
+        ,put_strike = config['collar']['put_strike'],put_maturity = config['collar']['put_maturity'],contract_size = config['collar']['contract_size']
+        ,cash_buffer_percent = config['collar']['cash_buffer_percent'],transaction_costs = config['transaction_costs'],vol_surface = config['collar']['vol_surface']
+        ,live = live)
+    else:
+        raise Exception("Please input a valid strategy name.")
+
+#Function: Create a strategy for a multi-asset back test of a PanelData. Only the signal-only strategies can be run across assets.
+def create_panel_strategy(strategy_name, panel_data, transactions, config):
+    if strategy_name == 'Buy_And_Hold':
+        return BuyandHoldStrategy(panel_data,transactions,stock_name = None,transaction_costs = config['transaction_costs']['stock'])
+    elif strategy_name == 'Trend':
+        return TrendStrategy(panel_data,transactions,stock_name = None, short_average = config['trend']['short_average'], long_average = config['trend']['long_average']
+        ,transaction_costs = config['transaction_costs']['stock'], price_column = None)
+    else:
+        raise Exception("Please input a strategy that can be run on multiple assets.")
+
+#Function: The config entries used by a strategy, as a flat dictionary keyed by the dotted config path (e.g. 'trend.short_average').
+def strategy_parameters(strategy_name, config):
+    parameters = {}
+    for key, value in flatten_config(config).items():
+        if any(key == entry or key.startswith(entry + '.') for entry in strategy_config[strategy_name]):
+            parameters[key] = value
+    return parameters
 
 
 #Class: Buy and hold strategy. Put all cash into the stock and never sell. Used for comparison against the trend and collar strategies.
 class BuyandHoldStrategy:
+    #State saved in a back test checkpoint.
+    checkpoint_state = []
+    #A buy signal without enough cash for a share changes nothing, so the vectorized back test does not rebalance on it.
+    skip_unfunded_buys = True
 
     def __init__(self,data_process,transactions,**kwargs):
         self.data_process = data_process    
@@ -17,6 +76,14 @@ class BuyandHoldStrategy:
     def signal(self,date):
             return 1
 
+    #Function: Signal for the next bar of a streaming back test.
+    def on_bar(self,bar):
+        return 1
+
+    #Function: Signal for every date at once. Used by the vectorized back test.
+    def signals(self):
+        return np.ones(len(self.data_process.get_prices().index), dtype = int)
+
     #Any cash is immediatley invested into the stock.
     def rebalance(self,signal,date,current_price, holdings, cash): 
         purchase = max(cash // (current_price + self.transaction_costs),0)
@@ -31,6 +98,8 @@ class BuyandHoldStrategy:
 #Class: Trend Strategy. When the simple moving average (SMA) 50-day crosses above the SMA 200-day invest all cash in stock.
 #If the SMA 50-day crosses below SMA 200-day sell all stock if holding any.
 class TrendStrategy:
+    #State saved in a back test checkpoint. The SMA signals are recalculated from the data, the streaming history is saved.
+    checkpoint_state = ['price_buffer','previous_sma_signal']
 
     def __init__(self, data_process, transactions, **kwargs):
         self.data_process = data_process
@@ -40,36 +109,73 @@ class TrendStrategy:
         self.short_average = self.kwargs['short_average']
         self.long_average = self.kwargs['long_average']
         self.transaction_costs = self.kwargs['transaction_costs']
+        #Price column the SMAs are calculated on. None uses every column, e.g. every asset of a PanelData.
+        self.price_column = self.kwargs.get('price_column','Price')
+        #The SMAs of the whole history are calculated when first needed, so a streaming back test never loads the prices.
+        self.sma_signal = None
+        #Streaming state: the prices of the long average window and the last SMA comparison.
+        self.price_buffer = indicators.RingBuffer(self.long_average, windows = (self.short_average, self.long_average))
+        self.previous_sma_signal = None
 
     #Function: Calculate the signal if we should invest all cash in stock or sell all stock or do nothing.
     def signal(self,date):
-        prices = self.data_process.get_prices()
-        date_index = prices.index.get_loc(date)
-        #Need to have historical data as far back as longest average so that a proper signal can be calculated.
-        if prices.loc[:date].shape[0] <= self.long_average+1:
+        if self.sma_signal is None:
+            self.sma_signal = self.sma()
+        date_index = self.data_process.get_prices().index.get_loc(date)
+        #Need to have historical data as far back as longest average for the current and previous day so that a proper signal can be calculated.
+        #The SMAs can be available from the first date when the data is a view of a longer history.
+        if date_index == 0 or not (self.sma_available[date_index] and self.sma_available[date_index-1]):
             print("Not Enough Data to Generate Signal,", "Date:", date)
             return 0
         
-        #Calculate SMA 50-day & 200-day for current and previous day.
+        #Compare SMA 50-day & 200-day for current and previous day.
         #if they are the same do nothing as there was no crossing. If they are different either buy or sell all stock depending on crossing direction.
-        current_signal = self.sma(prices,date_index)
-        previous_signal = self.sma(prices,date_index-1)
+        current_signal = self.sma_signal[date_index]
+        previous_signal = self.sma_signal[date_index-1]
 
         if current_signal == previous_signal:
             return 0
         else:
             return current_signal
     
-    #Function: Calculate SMA 50-day and SMA 200-day. Determine which SMA is greater than the other.
-    def sma(self,prices,date_index):
-        short_sma = prices.loc[:,'Price'].iloc[date_index-self.short_average:date_index].mean()
-        long_sma = prices.loc[:,'Price'].iloc[date_index-self.long_average:date_index].mean()
-        
-        if short_sma > long_sma:
-            signal = 1
+    #Function: Signal for every date at once. Used by the vectorized back test.
+    #1 or -1 on the dates where the SMAs cross and 0 otherwise, including the dates without enough data.
+    #The SMAs can be date x asset arrays, in which case the signals are too.
+    def signals(self):
+        if self.sma_signal is None:
+            self.sma_signal = self.sma()
+        signals = np.zeros_like(self.sma_signal)
+        signals[1:] = np.where(self.sma_signal[1:] != self.sma_signal[:-1], self.sma_signal[1:], 0)
+        enough_data = np.zeros_like(self.sma_available)
+        enough_data[1:] = self.sma_available[1:] & self.sma_available[:-1]
+        signals[~enough_data] = 0
+        return signals
+
+    #Function: Signal for the next bar of a streaming back test or live feed. The same signal as signal(date), from the prices of the previous long average days kept in a ring buffer
+    #with running sums of both averages, so each bar is O(1).
+    def on_bar(self,bar):
+        bar_index = self.price_buffer.count
+        current_signal = 1 if self.price_buffer.mean(self.short_average) > self.price_buffer.mean(self.long_average) else -1
+        previous_signal = self.previous_sma_signal
+        self.previous_sma_signal = current_signal
+        self.price_buffer.append(bar[self.price_column])
+
+        if bar_index <= self.long_average:
+            print("Not Enough Data to Generate Signal,", "Date:", bar['Date'])
+            return 0
+        if current_signal == previous_signal:
+            return 0
         else:
-            signal = -1
-        return signal
+            return current_signal
+
+    #Function: Calculate SMA 50-day and SMA 200-day for every date. Determine which SMA is greater than the other.
+    #The SMA at a date uses the prices before that date. Dates without enough history for both SMAs are marked in sma_available.
+    def sma(self):
+        indicators = self.data_process.get_indicators()
+        short_sma = indicators.rolling_mean(self.price_column,self.short_average)
+        long_sma = indicators.rolling_mean(self.price_column,self.long_average)
+        self.sma_available = ~(np.isnan(short_sma) | np.isnan(long_sma))
+        return np.where(short_sma > long_sma, 1, -1)
     
     #Function: After knowing whether to buy or sell, calculate the amount of stock held and cash balance.
     #Log the transactions and calculate the portfolio value.
@@ -91,12 +197,54 @@ class TrendStrategy:
 
 
 
+#Class: Options held by the collar as a structured array with one column (leg) per option type and maturity, in the order of the maturities in the config,
+#and one row per path. The back test holds one path and the simulation one per simulated price path, all rolled on the same dates. Each leg holds the strike price and price of the option when it was bought, its maturity date and the quantity held.
+#The legs of an option type form a series ordered by maturity. Rolling a series shifts its legs one maturity shorter, so the shortest leg expires
+#and the longest maturity is free for a new option. Valuation and coverage are array operations over the legs.
+class OptionBook:
+    dtype = np.dtype([('strike_price','f8'),('initial_price','f8'),('maturity_date','M8[ns]'),('quantity','f8')])
+
+    def __init__(self, option_maturity, paths = 1):
+        legs = [(option, mat) for option in option_maturity.keys() for mat in option_maturity[option]]
+        self.legs = np.zeros((paths, len(legs)), dtype = self.dtype)
+        self.legs['maturity_date'] = np.datetime64('NaT')
+        self.option = np.array([option for option, mat in legs])
+        self.maturity = np.array([mat for option, mat in legs])
+        self.labels = ['{}, Maturity:{}'.format(option,mat) for option, mat in legs]
+        #Rows of each series and the number of legs in the series of each row.
+        self.series = {}
+        for option in option_maturity.keys():
+            rows = np.flatnonzero(self.option == option)
+            self.series[option] = slice(rows[0], rows[-1] + 1)
+        self.series_length = np.array([len(option_maturity[option]) for option, mat in legs])
+
+    def __len__(self):
+        return self.legs.shape[1]
+
+    #Function: Roll the legs of an option series one maturity shorter on every path. Returns the expired leg of each path.
+    def roll(self, option):
+        legs = self.legs[:, self.series[option]]
+        expired = legs[:, 0].copy()
+        legs[:, :-1] = legs[:, 1:]
+        return expired
+
+    #Function: Time to expiry of every leg of every path on a date in years.
+    #Need to floor the option time to expiry at zero to account for difference in option maturity based on implied vols and month end dates.
+    def time_to_expiry(self, date):
+        days = (self.legs['maturity_date'] - np.datetime64(date)) // np.timedelta64(1,'D')
+        option_present_time = np.maximum((self.maturity - days)/365, 0)
+        return self.maturity/365 - option_present_time
+
+
 #Class: Collar Strategy. Invest into stock and sell 1 month call options with a 105% strike that fully covers stock notional.
 # As well as, buy 3,6,9 and 12 month put options with 95% strike that are evenly distributed and fully cover stock notional.
 #Roll options at option expiry to maintain coverage on the stock.
-#Strategy has been organized to allow for multiple maturities for both calls and puts if needed.
+#Strategy has been organized to allow for multiple maturities for both calls and puts if needed. The options held are kept in an OptionBook.
 class CollarStrategy:
-    
+    #State saved in a back test checkpoint. The option book holds the options, their strike prices, initial prices and maturity dates.
+    #live_state holds the maturity dates of a live collar.
+    checkpoint_state = ['option_book','live_state']
+
     def __init__(self,data_process,transactions,**kwargs):
         self.data_process = data_process
         self.transaction_type = transactions
@@ -106,241 +254,366 @@ class CollarStrategy:
         call_maturity = self.kwargs['call_maturity']
         put_strike = self.kwargs['put_strike']
         put_maturity = self.kwargs['put_maturity']
-        self.transaction_costs = {self.stock_name : 0.03, 'call' : 0.04, 'put' : 0.04}
+        transaction_costs = self.kwargs['transaction_costs']
+        self.transaction_costs = {self.stock_name : transaction_costs['stock'], 'call' : transaction_costs['option'], 'put' : transaction_costs['option']}
         self.option_strike = {'call' : call_strike, 'put': put_strike}
         self.option_maturity = {'call' : call_maturity, 'put' :put_maturity}
         self.all_option_maturity_dates = {'call' : None, 'put' : None} #Container for all option maturity dates throughout the back test.
-        self.option_maturity_dates = {'call' : {}, 'put' : {}} #Container for current options held maturity dates.
-        self.option_strike_price = {'call' : {}, 'put': {}} #Actual strike price when entering into the option.
-        self.option_initial_price = {'call' : {}, 'put': {}} #Price of option when entering into the contract.
+        self.roll_flags = {'call' : None, 'put' : None} #Dates on which each option type is rolled.
+        self.option_book = OptionBook(self.option_maturity) #Options held with their strike prices, initial prices and maturity dates.
         self.option_purchase_structure = {'call' : {'buy' : 1, 'sell' : -1}, 'put': {'buy' : -1, 'sell' : 1}} #Indicates short selling payoff for calls and long payoff for puts.
+        #Strike, purchase structure and transaction costs of each leg of the option book.
+        self.leg_strike = np.array([self.option_strike[option] for option in self.option_book.option])
+        self.leg_buy = np.array([self.option_purchase_structure[option]['buy'] for option in self.option_book.option])
+        self.leg_sell = np.array([self.option_purchase_structure[option]['sell'] for option in self.option_book.option])
+        self.leg_transaction_costs = np.array([self.transaction_costs[option] for option in self.option_book.option])
         #Cash buffer size to provide extra cash when rolling options. Helps to prevent needing to sell stock when rolling options.
         self.cash_buffer_percent = kwargs['cash_buffer_percent']
         #Contract size for options.
         self.contract_size = kwargs['contract_size']
-        
-        self.process_maturity_dates()
+        #Option prices are memoized in the pricing cache shared by every strategy on the same data.
+        self.pricing_cache = self.data_process.get_pricing_cache() if self.kwargs.get('pricing_cache', True) else None
+        #With vol_surface the options are priced at the implied vol of their moneyness and time to expiry on the vol surface of the data,
+        #so strikes and maturities do not need their own implied vol column or tab. Otherwise at the implied vol of the leg's strike column and maturity tab.
+        self.vol_surface = self.data_process.get_vol_surface() if self.kwargs.get('vol_surface', False) else None
+        #With live the collar runs on the bars of a feed through on_bar. The market data and maturity dates are taken from each bar as it arrives
+        #and the market data arrays only hold the current bar, so nothing is calculated over the whole history.
+        self.live = self.kwargs.get('live', False)
+        self.live_state = None
+        if self.live:
+            if self.vol_surface is not None:
+                raise Exception("Please use the implied vol tabs (vol_surface False) for a live collar.")
+            self.init_live_state()
+        else:
+            self.process_maturity_dates()
+            self.process_market_data()
 
-    #Get all option maturity dates based on the beginning of the month.
-    #Using only start/end of month allows for easier option maturity management.
+    #Function: Option maturity and roll dates from the event calendar. All option maturity dates are based on the beginning of the month.
+    #The maturity dates continue one longest maturity past the last date, so options bought near the end of the data mature on the same dates
+    #as when more data is added (e.g. when a back test is resumed from a checkpoint).
+    #For each option type a flag for every date that has options to roll, and for each leg of the option book the maturity date of an option bought on every date.
     def process_maturity_dates(self):
-        dates = self.data_process.get_prices().index
+        calendar = self.data_process.get_calendar()
+        for option in self.option_maturity.keys():
+            maturity_dates = [calendar.maturity_dates(mat,max(self.option_maturity[option])) for mat in self.option_maturity[option]]
+            self.all_option_maturity_dates[option] = pd.DatetimeIndex(np.unique(np.concatenate([dates.to_numpy() for dates in maturity_dates])))
+            self.roll_flags[option] = calendar.roll_flags(self.all_option_maturity_dates[option])
+        self.leg_maturity_dates = np.column_stack([calendar.nearest(self.all_option_maturity_dates[option],mat) for option, mat in zip(self.option_book.option,self.option_book.maturity)])
+        #Implied vols start after the first date. The strategy starts on the first date with data.
+        if self.vol_surface is None:
+            self.available, self.start_index = calendar.data_start(str(self.option_maturity['call'][0]) + "IV",self.option_strike['call'])
+        else:
+            self.available, self.start_index = self.vol_surface.data_start(self.option_strike['call'],self.option_maturity['call'][0]/365)
 
+    #Function: Daily market data used to price the options as numpy arrays aligned with the price dates.
+    #Implied vol at the option strike and interest rate at the option maturity as a date x leg array for the legs of the option book, and the dividend yield.
+    #With the vol surface the implied vols are looked up when the options are priced, and the interest rates of maturities without a column are interpolated.
+    def process_market_data(self):
+        dates = self.data_process.get_prices().index
+        interest_rates = self.data_process.get_interest_rates()
+        self.dividend_yield = self.data_process.get_prices().loc[:,'12M Div Yield'].to_numpy(dtype = float)
+        if self.vol_surface is None:
+            implied_vol = self.data_process.get_implied_vol()
+            self.implied_vol = np.column_stack([implied_vol[str(mat) + "IV"].loc[:,self.option_strike[option]].to_numpy(dtype = float) for option, mat in zip(self.option_book.option,self.option_book.maturity)])
+            self.interest_rates = np.column_stack([interest_rates.loc[dates,mat].to_numpy(dtype = float) for mat in self.option_book.maturity])
+        else:
+            self.implied_vol = None
+            interest_rate_maturity = np.sort(interest_rates.columns.to_numpy())
+            self.interest_rates = interpolate_curves(self.option_book.maturity, interest_rate_maturity, interest_rates.loc[dates,interest_rate_maturity].to_numpy(dtype = float))
+
+    #Function: Market data arrays of a live collar, with one row for the current bar, and its maturity dates.
+    #For each option type the maturity dates around the current bar, and for each option type and maturity the last maturity date generated.
+    def init_live_state(self):
+        legs = len(self.option_book)
+        self.implied_vol = np.zeros((1,legs))
+        self.interest_rates = np.zeros((1,legs))
+        self.dividend_yield = np.zeros(1)
+        self.leg_maturity_dates = np.zeros((1,legs), dtype = 'M8[ns]')
+        self.roll_flags = {option : np.zeros(1, dtype = bool) for option in self.option_maturity.keys()}
+        self.available = np.zeros(1, dtype = bool)
+        self.start_index = -1
+        #Implied vol tab, strike column and interest rate maturity of each leg in the bars.
+        self.leg_market_data = [(str(mat) + "IV", self.option_strike[option], mat) for option, mat in zip(self.option_book.option,self.option_book.maturity)]
+        #Maturity dates are kept as sorted nanoseconds, so the searches of each bar compare integers.
+        self.live_state = {'previous_date' : None, 'started' : False, 'maturity_dates' : {option : [] for option in self.option_maturity.keys()}, 'last_maturity' : {}}
+
+    #Function: Signal for the next bar of a live feed, the same signal as signal(date) in a back test. The bar has the market data of the day (see analysis.chunk_bars).
+    #Maturity dates are generated from the first bar with the steps of EventCalendar.maturity_dates, up to the first one past the longest maturity
+    #after the bar, and the dates well behind the bar are dropped. A flag to roll is set when a maturity date is after the previous bar and not after this one.
+    def on_bar(self,bar):
+        if not self.live:
+            raise Exception("Please create the collar with live = True to run it on bars.")
+        date = bar['Date']
+        day = date.value
+        state = self.live_state
+        previous_day = state['previous_date']
         for option in self.option_maturity.keys():
+            longest = max(self.option_maturity[option])
+            maturity_dates = state['maturity_dates'][option]
+            horizon = day + longest * 86400 * 10**9
             for mat in self.option_maturity[option]:
-                cur_date = dates.min()
-                end_date = dates.max()
-                option_dates = []
-                while cur_date < end_date:
-                    option_dates.append(cur_date)
-                    cur_date = cur_date + pd.offsets.Day(mat)
-                    prev_date = cur_date - pd.offsets.Day(1)
-
-                    #Since implied vols/option maturity is not exactly monthly,
-                    #there can be times where the calculation of maturity dates gets stuck in a loop.
-                    #This prevents this infinite loop from occuring.
-                    if prev_date.month == cur_date.month:
-                        if cur_date.day <= 15:
-                            cur_date -= pd.offsets.MonthBegin(1)
-                        else:
-                            cur_date += pd.offsets.MonthBegin(1)
-                option_dates.append(cur_date)
-                if self.all_option_maturity_dates[option] is None:
-                    self.all_option_maturity_dates[option] = pd.Series(option_dates)
-                else:
-                    self.all_option_maturity_dates[option] = pd.concat([self.all_option_maturity_dates[option],pd.Series(option_dates)])
-            self.all_option_maturity_dates[option] = pd.DatetimeIndex(self.all_option_maturity_dates[option].values).unique()
+                last = state['last_maturity'].get((option,mat))
+                while last is None or last.value <= horizon:
+                    last = date if last is None else events.next_maturity_date(last, mat)
+                    if last.value not in maturity_dates:
+                        bisect.insort(maturity_dates, last.value)
+                state['last_maturity'][option,mat] = last
+
+            rolled = bisect.bisect_right(maturity_dates, day)
+            self.roll_flags[option][0] = rolled > (0 if previous_day is None else bisect.bisect_right(maturity_dates, previous_day))
+            series = self.option_book.series[option]
+            targets = day + self.option_book.maturity[series] * 86400 * 10**9
+            self.leg_maturity_dates[0,series] = events.nearest_dates(np.array(maturity_dates), targets).view('M8[ns]')
+            #Maturity dates a month before the nearest ones of the longest maturity are no longer needed.
+            del maturity_dates[:bisect.bisect_left(maturity_dates, day - (longest + 31) * 86400 * 10**9)]
+
+        implied_vol = bar['Implied Vol']
+        interest_rates = bar['Interest Rates']
+        for leg, (name, strike, mat) in enumerate(self.leg_market_data):
+            self.implied_vol[0,leg] = implied_vol[name][strike]
+            self.interest_rates[0,leg] = interest_rates[mat]
+        self.dividend_yield[0] = bar['12M Div Yield']
+        self.available[0] = implied_vol[str(self.option_maturity['call'][0]) + "IV"][self.option_strike['call']] != 0
+        #The strategy starts on the first bar with data.
+        self.start_index = 0 if self.available[0] and not state['started'] else -1
+        state['started'] = state['started'] or bool(self.available[0])
+        state['previous_date'] = day
+        return self.signal(date)
+
+    #Function: Position of a date in the market data arrays. The arrays of a live collar only hold the current bar.
+    def position(self,date):
+        if self.live:
+            return 0
+        return self.data_process.get_calendar().position(date)
+
+    #Function: Implied vol of legs of the option book on a date for options with strike prices and times to expiry (in years) at the current price.
+    #From the vol surface at the moneyness and time to expiry of the options, or the implied vol of each leg's strike and maturity without it.
+    #The arrays are broadcast together, e.g. with a row of prices per simulated path.
+    def leg_implied_vol(self,date_index,legs,current_price,strike_price,tau):
+        if self.vol_surface is None:
+            return self.implied_vol[date_index,legs]
+        return self.vol_surface.implied_vol(date_index,np.asarray(strike_price)/current_price,tau)
+
+    #Function: Price options of legs of the option book in one call to the batched Black Scholes engine, with their strike prices and times to expiry.
+    #Prices go through the pricing cache of the data unless pricing_cache or cached is False. With greeks True the prices
+    #are returned with their greeks from the same calculation, which does not go through the pricing cache.
+    def price_options(self,date_index,current_price,legs,strike_price,tau,greeks = False,cached = True):
+        implied_vol = self.leg_implied_vol(date_index,legs,current_price,strike_price,tau)
+        interest_rates = self.interest_rates[date_index,legs]
+        if self.pricing_cache is not None and cached and not greeks:
+            return self.pricing_cache.price(current_price,np.asarray(tau),np.asarray(strike_price),implied_vol,interest_rates,self.dividend_yield[date_index],self.option_book.option[legs])
+        return black_scholes(current_price,np.asarray(tau),np.asarray(strike_price),implied_vol,interest_rates,self.dividend_yield[date_index],self.option_book.option[legs],greeks)
+
+    #Function: Current price of every leg of an option book (the collar's by default), priced together. With a row of the book per path the
+    #current price is a column of the path prices.
+    def value_options(self,date,date_index,current_price,book = None,cached = True):
+        book = self.option_book if book is None else book
+        legs = np.arange(len(book))
+        return self.price_options(date_index,current_price,legs,book.legs['strike_price'],book.time_to_expiry(date),cached = cached)
 
     #Function: Determines when stocks/options should be purchased or rolled.
     #stocks/options should be purchased on first day with available implied vol data.
     #options should be rolled at the respective options expiry date.
     def signal(self,date):
-        prices = self.data_process.get_prices()
-        implied_vol = self.data_process.get_implied_vol()
-        if implied_vol[str(self.option_maturity['call'][0]) + "IV"].loc[date,self.option_strike['call']] == 0:
+        date_index = self.position(date)
+        signal = self.day_signal(date_index)
+        if signal == -1:
             print('No Implied Volatility Data For This Date. Cannot Generate Signal,', 'Date:', date)
+        return signal
+
+    #Function: Signal of a date by its position in the market data arrays. -1 without implied vol data, 1 when options are rolled and 0 otherwise.
+    def day_signal(self,date_index):
+        if not self.available[date_index]:
             return -1
         
-        for option in self.all_option_maturity_dates.keys():
-            if date in self.all_option_maturity_dates[option]:
+        for option in self.roll_flags.keys():
+            if self.roll_flags[option][date_index]:
                 return 1
         
         return 0
 
 
-    #Function: Stock and Option purchasing as well as rolling options. The function has three sections.
-    #1. At the start of the backtest, buy the stock and enough options to cover the stock.
-    #2. Roll the options and if needed sell stock to fund the option roll over.
-    #3. Calculate the current value of the portfolio.
+    #Function: Stock and Option purchasing as well as rolling options with the stock and cash of the back test (see rebalance_paths).
+    #Holdings only hold the stock. The options are held in the option book. The transactions are logged from the trades of rebalance_paths.
     def rebalance(self,signal,date,current_price,holdings,cash):
         
         #No implied vol data so can not execute strategy.
         if signal == -1:
             return holdings, cash, cash
 
-        option_price = {'call' : {}, 'put': {}} #current price of the option
-        option_payoff = {'call' : 0, 'put': 0} #option payoff after excerising
-        option_rebalance = {'call' : False, 'put': False} #which option type should be rolled
-        option_transaction = {'call' : 0, 'put': 0} #Store cost when buy/selling options
-        option_expired_holdings = {'call' : 0, 'put': 0} #store holdings of options expiring at the current date
-        first_maturity = {'call' : 0, 'put': 0} #store first maturity of option series (i.e. put, 90)
-        last_maturity = {'call' : 0, 'put': 0} #store last maturity of option series. (i.e. put, 360)
-        option_emergency_trasaction = 0 #store cost when buy/sell options in emergency rebalance
+        date_index = self.position(date)
+        stock, cash, portfolio_value, trades = self.rebalance_paths(signal,date,date_index,np.array([current_price]),np.array([holdings.get(self.stock_name,0)]),np.array([cash]),self.option_book)
+        holdings[self.stock_name] = stock[0]
+        self.log_trades(date,current_price,holdings,trades)
+        return holdings, portfolio_value[0], cash[0]
+
+    #Function: Stock and Option purchasing as well as rolling options for every path of an option book at once. The function has three sections.
+    #1. At the start of the backtest, buy the stock and enough options to cover the stock.
+    #2. Roll the options and if needed sell stock to fund the option roll over.
+    #3. Calculate the current value of the portfolio.
+    #The current price, stock and cash are arrays over the paths and the book has a row of options per path. The back test has one path and the
+    #simulation (simulation.PathCollarBackTest) one per simulated price path, with options priced without the pricing cache (cached False).
+    #Returns the stock, cash and portfolio value of each path and the trades made, which rebalance logs.
+    def rebalance_paths(self,signal,date,date_index,current_price,stock,cash,book,cached = True):
+        legs = book.legs
+        contract_size = self.contract_size
+        stock_transaction_costs = self.transaction_costs[self.stock_name]
+        max_series_length = max(book.series_length)
+        last_leg = [book.series[option].stop - 1 for option in self.option_maturity.keys()] #legs of the last maturity of each option series. (i.e. put, 360)
+        trades = {'bought' : False,
+                  'rolled' : [], #option types rolled
+                  'option_payoff' : {}, #option payoff after excerising
+                  'option_expired_holdings' : {}, #holdings of options expiring at the current date
+                  'emergency' : np.zeros(len(stock), dtype = bool), #paths without enough cash to roll the options
+                  'sold' : np.zeros(len(stock), dtype = bool), #paths selling stock in an emergency rebalance
+                  'stock_rebalance' : np.zeros(len(stock)), #stock sold in an emergency rebalance
+                  'option_price' : None} #option prices when options are sold in an emergency rebalance
 
+        #No implied vol data so can not execute strategy.
+        if signal == -1:
+            return stock, cash, cash.copy(), trades
 
-        
-        start_date = self.data_process.get_implied_vol()[str(self.option_maturity['call'][0]) + "IV"]
-        start_date = start_date.loc[start_date.loc[:,self.option_strike['call']] != 0].index[0]
         #Section 1. Buy stocks. As well as options to cover stock.
-        if date == start_date:
-            for option in option_price.keys():
-                holdings[option] = {}
-                for mat in self.option_maturity[option]:
-                    self.option_strike_price[option][mat] = self.option_strike[option]*current_price
-                    option_price[option][mat] = BlackScholes(current_price,mat/365,0,self.option_strike_price[option][mat], self.data_process.get_implied_vol()[str(mat) + "IV"].loc[date,self.option_strike[option]], self.data_process.get_interest_rates().loc[date,mat],self.data_process.get_prices().loc[date,'12M Div Yield'],option)
-                    self.option_maturity_dates[option][mat] = self.all_option_maturity_dates[option][self.all_option_maturity_dates[option].get_loc(date + pd.offsets.Day(mat),method='nearest')]
-                    self.option_initial_price[option][mat] = option_price[option][mat]
+        if date_index == self.start_index:
+            trades['bought'] = True
+            legs['strike_price'] = self.leg_strike*current_price[:,None]
+            legs['initial_price'] = self.price_options(date_index,current_price[:,None],np.arange(len(book)),legs['strike_price'],book.maturity/365,cached = cached)
+            legs['maturity_date'] = self.leg_maturity_dates[date_index]
+            option_transaction = 0
+            for option in self.option_maturity.keys():
                 #Cost to long/short the options.
-                option_transaction[option] = self.option_purchase_structure[option]['buy'] * np.average(list(self.option_initial_price[option].values())) - self.transaction_costs[option]*np.average(list(self.option_initial_price[option].values()))
+                average_price = np.average(legs['initial_price'][:,book.series[option]], axis = 1)
+                option_transaction = option_transaction + (self.option_purchase_structure[option]['buy'] * average_price - self.transaction_costs[option]*average_price)
             
             #The maximum amount of stock that can be purchased while ensuring the options on the collar strategy can be properly executed.
             #As well as maintaining a capital reserve of 10% of the starting balance after all transactions to be used as a liquidity buffer when rolling options.
-            holdings[self.stock_name] = (1-self.cash_buffer_percent)*cash // ((current_price+self.transaction_costs[self.stock_name]) - sum([option_transaction[option] for option in option_transaction.keys()]))
+            stock = (1-self.cash_buffer_percent)*cash // ((current_price+stock_transaction_costs) - option_transaction)
             
             #Find the nearest number lower than this amount of stock we want to purchase that is a multiple of the option contract size (100) and can be split evenly among all put option maturities.
-            holdings[self.stock_name] = nearest_divisible(holdings[self.stock_name] // self.contract_size,max([len(self.option_maturity[option]) for option in option_price.keys()])) * self.contract_size
-            
-            self.transaction_type.log_transaction(date,self.stock_name, holdings[self.stock_name],current_price,'Buy')
-            self.transaction_type.log_transaction(date,self.stock_name, holdings[self.stock_name],self.transaction_costs[self.stock_name],'Transaction Costs')
-            
-            cash -= holdings[self.stock_name]*(current_price + self.transaction_costs[self.stock_name])
+            stock = nearest_divisible(stock // contract_size,max_series_length) * contract_size
+            cash = cash - stock*(current_price + stock_transaction_costs)
 
-            for option in option_price.keys():
-                for mat in self.option_maturity[option]:
-                    #only purchase option amounts that will cover the stock and is in multiples of the contract size.
-                    holdings[option][mat] = ((holdings[self.stock_name] // len(self.option_maturity[option])) // self.contract_size) * self.contract_size
-                    self.transaction_type.log_transaction(date,'{}, Maturity:{}'.format(option,mat), holdings[option][mat],option_price[option][mat],'Buy')
-                    self.transaction_type.log_transaction(date,'{}, Maturity:{}'.format(option,mat), holdings[option][mat],self.transaction_costs[option],'Transaction Costs')
-                    cash += holdings[option][mat]*(self.option_purchase_structure[option]['buy']*option_price[option][mat] - self.transaction_costs[option])
+            #only purchase option amounts that will cover the stock and is in multiples of the contract size.
+            legs['quantity'] = ((stock[:,None] // book.series_length) // contract_size) * contract_size
+            cash = cash + np.sum(legs['quantity']*(self.leg_buy*legs['initial_price'] - self.leg_transaction_costs), axis = 1)
 
 
         #Section 2. Rebalance/roll options.
         elif signal == 1:
             
-            #Check which option types need to be rolled.
-            for option in self.all_option_maturity_dates.keys():
-                if date in self.all_option_maturity_dates[option]:
-                    option_rebalance[option] = True
-                    
-            
-            
-            for option in option_price.keys():
-                if option_rebalance[option]:
-                    first_maturity[option] = self.option_maturity[option][0]
-                    last_maturity[option] = self.option_maturity[option][-1]
-
-                    option_payoff[option] = OptionPayoff(current_price, self.option_strike_price[option][first_maturity[option]], option)
-                    option_expired_holdings[option] = holdings[option][first_maturity[option]]
-
-                    #Roll option maturities (eg. 12-month becomes 9 month, 9 month becomes 6 month etc.)
-                    for mat, next_mat in zip(self.option_maturity[option][:-1],self.option_maturity[option][1:]):
-                        self.option_strike_price[option][mat] = self.option_strike_price[option][next_mat]
-                        self.option_initial_price[option][mat] = self.option_initial_price[option][next_mat]
-                        self.option_maturity_dates[option][mat] = self.option_maturity_dates[option][next_mat] 
-                        holdings[option][mat] = holdings[option][next_mat] 
-                    
-                    self.option_strike_price[option][last_maturity[option]] = self.option_strike[option]*current_price
-                    self.option_initial_price[option][last_maturity[option]] =  BlackScholes(current_price,last_maturity[option]/365,0,self.option_strike_price[option][last_maturity[option]], self.data_process.get_implied_vol()[str(last_maturity[option]) + "IV"].loc[date,self.option_strike[option]], self.data_process.get_interest_rates().loc[date,last_maturity[option]],self.data_process.get_prices().loc[date,'12M Div Yield'],option)
-                    self.option_maturity_dates[option][last_maturity[option]] = self.all_option_maturity_dates[option][self.all_option_maturity_dates[option].get_loc(date + pd.offsets.Day(last_maturity[option]),method='nearest')]
-                    #How many options need to be purchased to maintain full coverage of the stock holdings. 
-                    holdings[option][last_maturity[option]] = (max(holdings[self.stock_name]-sum([holdings[option].get(mat,0) for mat in self.option_maturity[option][:-1]]),0) // self.contract_size) * self.contract_size
-                    #Cost to buy and roll options
-                    option_transaction[option] = self.option_rebalance_cost(holdings, option_expired_holdings, option_payoff,last_maturity[option],option)
+            option_transaction = 0 #Cost to buy and roll options
+            for option in self.option_maturity.keys():
+                #Check which option types need to be rolled.
+                if not self.roll_flags[option][date_index]:
+                    continue
+                trades['rolled'].append(option)
+                series = book.series[option]
+                last = series.stop - 1
+
+                #Roll option maturities (eg. 12-month becomes 9 month, 9 month becomes 6 month etc.)
+                expired = book.roll(option)
+                trades['option_payoff'][option] = OptionPayoff(current_price, expired['strike_price'], option)
+                trades['option_expired_holdings'][option] = expired['quantity']
+                
+                legs['strike_price'][:,last] = self.leg_strike[last]*current_price
+                legs['initial_price'][:,last] = self.price_options(date_index,current_price[:,None],[last],legs['strike_price'][:,[last]],[book.maturity[last]/365],cached = cached)[:,0]
+                legs['maturity_date'][:,last] = self.leg_maturity_dates[date_index,last]
+                #How many options need to be purchased to maintain full coverage of the stock holdings. 
+                legs['quantity'][:,last] = (np.maximum(stock - np.sum(legs['quantity'][:,series.start:last], axis = 1),0) // contract_size) * contract_size
+                option_transaction = option_transaction + self.option_rebalance_cost(book,trades,option)
 
             #Required capital to roll options        
-            required_balance = cash + sum([option_transaction[option] for option in option_transaction.keys()])
-            
-
-            
+            required_balance = cash + option_transaction
 
             #If the required capital is less than available cash then we need to sell stock.
-            if required_balance < 0:
-                print("Insufficient cash {} must be sold to reblance.".format(self.stock_name), 'Date:', date)
+            trades['emergency'] = required_balance < 0
+            stock_rebalance = trades['stock_rebalance']
+            if trades['emergency'].any():
                 #When selling stock, sell enough to replenish cash buffer based on stock holdings and price.
-                required_balance += -self.cash_buffer_percent*holdings[self.stock_name]*current_price
+                required_balance = required_balance - self.cash_buffer_percent*stock*current_price
 
                 #Get current option prices which is used when rolling options
-                for option in option_price.keys():
-                    for mat in self.option_maturity[option]: 
-                        option_present_time = max((mat - (self.option_maturity_dates[option][mat] - date).days)/365,0)
-                        option_price[option][mat] = BlackScholes(current_price,mat/365,option_present_time,self.option_strike_price[option][mat], self.data_process.get_implied_vol()[str(mat) + "IV"].loc[date,self.option_strike[option]], self.data_process.get_interest_rates().loc[date,mat],self.data_process.get_prices().loc[date,'12M Div Yield'],option)
+                option_price = self.value_options(date,date_index,current_price[:,None],book,cached)
+                trades['option_price'] = option_price
                 
                 #Cost from selling options
-                option_emergency_rebalance_cost = 0
-                for option in option_price.keys():
-                    for mat in self.option_maturity[option]: 
-                        option_emergency_rebalance_cost += self.option_purchase_structure[option]['sell']*(option_price[option][mat]) - self.transaction_costs[option]
+                option_emergency_rebalance_cost = np.sum(self.leg_sell*option_price - self.leg_transaction_costs, axis = 1)
                 
                 #Find the amount of stock to sell that will allow us to roll options and replenish cash buffer. 
                 #Used ceiling divison to ensure we are always selling whole stocks and on the side of more than we need.
-                stock_rebalance = -(-required_balance // (current_price - self.transaction_costs[self.stock_name] + option_emergency_rebalance_cost))
+                with np.errstate(invalid = 'ignore', divide = 'ignore'):
+                    stock_sale = -(-required_balance // (current_price - stock_transaction_costs + option_emergency_rebalance_cost))
                 #Make sure the amount of stock we are selling is never greater than what we hold in stock or what we hold in options. 
-                holdings_quantity = []
-                for option in option_price.keys():
-                    for mat in self.option_maturity[option]: 
-                        holdings_quantity.append(-holdings[option][mat]) 
-                stock_rebalance = max(stock_rebalance, -holdings[self.stock_name], max(holdings_quantity))
-            else:
-                stock_rebalance = 0
+                stock_sale = np.maximum(np.maximum(stock_sale, -stock), np.max(-legs['quantity'], axis = 1))
+                stock_rebalance = np.where(trades['emergency'], stock_sale, 0)
             
             #Sell stock and adjust the amount of options we are rolling based on the new amount of stock held.
-            if stock_rebalance != 0:
-                previous_stock_holdings = holdings[self.stock_name]
-                holdings[self.stock_name] = nearest_divisible((holdings[self.stock_name] + stock_rebalance) // self.contract_size,max([len(self.option_maturity[option]) for option in option_price.keys()])) * self.contract_size
-                stock_rebalance = holdings[self.stock_name] - previous_stock_holdings
-                self.transaction_type.log_transaction(date,self.stock_name, abs((stock_rebalance // self.contract_size) * self.contract_size),current_price,'Sell')
-                self.transaction_type.log_transaction(date,self.stock_name, abs((stock_rebalance // self.contract_size) * self.contract_size),self.transaction_costs[self.stock_name],'Transaction Costs')
-                for option in option_price.keys():
-                    for mat in self.option_maturity[option]:
-                        holdings[option][mat] += ((stock_rebalance // len(self.option_maturity[option])) // self.contract_size) * self.contract_size
-            
-
-            for option in option_price.keys():
-                if option_rebalance[option]:                    
-                    self.transaction_type.log_transaction(date,'{}, Maturity:{}'.format(option,last_maturity[option]),holdings[option][last_maturity[option]],self.option_initial_price[option][last_maturity[option]],'Buy')
-                    self.transaction_type.log_transaction(date,'{}, Maturity:{}'.format(option,last_maturity[option]),holdings[option][last_maturity[option]],self.transaction_costs[option],'Transaction Costs')
-                    if option_payoff[option] > 0:
-                        self.transaction_type.log_transaction(date,'{}, Maturity:{}'.format(option,first_maturity[option]), option_expired_holdings[option],option_payoff[option],'Sell')
-                        self.transaction_type.log_transaction(date,'{}, Maturity:{}'.format(option,first_maturity[option]), option_expired_holdings[option],self.transaction_costs[option],'Transaction Costs')
-                if stock_rebalance != 0:
-                    for mat in self.option_maturity[option][:-1]:
-                        self.transaction_type.log_transaction(date,'{}, Maturity:{}'.format(option,mat),abs(stock_rebalance),option_price[option][mat],'Sell')
-                        self.transaction_type.log_transaction(date,'{}, Maturity:{}'.format(option,mat),abs(stock_rebalance),self.transaction_costs[option],'Transaction Costs')
-                        option_emergency_trasaction += abs(stock_rebalance)*(self.option_purchase_structure[option]['sell']*option_price[option][mat] - self.transaction_costs[option])
-
-            cash += -1*stock_rebalance*(current_price - self.transaction_costs[self.stock_name]) + option_emergency_trasaction + sum([self.option_rebalance_cost(holdings,option_expired_holdings,option_payoff,last_maturity[option],option) for option in (option for option in option_rebalance.keys() if option_rebalance[option])])
+            sold = stock_rebalance != 0
+            option_emergency_transaction = np.zeros(len(stock)) #Cost when selling options in emergency rebalance
+            if sold.any():
+                previous_stock = stock
+                stock = np.where(sold, nearest_divisible((stock + stock_rebalance) // contract_size,max_series_length) * contract_size, stock)
+                stock_rebalance = np.where(sold, stock - previous_stock, 0)
+                legs['quantity'] += ((stock_rebalance[:,None] // book.series_length) // contract_size) * contract_size
+                #Every leg but the last maturity of each series is sold.
+                sold_legs = np.ones(len(book), dtype = bool)
+                sold_legs[last_leg] = False
+                option_emergency_transaction = np.where(stock_rebalance != 0, np.sum((np.abs(stock_rebalance)[:,None]*(self.leg_sell*option_price - self.leg_transaction_costs))[:,sold_legs], axis = 1), 0)
+            trades['sold'] = sold
+            trades['stock_rebalance'] = stock_rebalance
+
+            cash = cash + (-1*stock_rebalance*(current_price - stock_transaction_costs) + option_emergency_transaction + sum([self.option_rebalance_cost(book,trades,option) for option in trades['rolled']]))
 
         
 
         #Section 3. Determine portfolio value based on cash, stocks held and options held
-        portfolio_value = holdings[self.stock_name]*current_price + cash                        
-        for option in self.option_maturity.keys():
-            for mat in self.option_maturity[option]:
-
-                #Need to floor the option time to expiry at zero to account for difference in option maturity based on implied vols and month end dates.
-                option_present_time = max((mat - (self.option_maturity_dates[option][mat] - date).days)/365,0)
-                option_price[option][mat] = BlackScholes(current_price,mat/365,option_present_time,self.option_strike_price[option][mat], self.data_process.get_implied_vol()[str(mat) + "IV"].loc[date,self.option_strike[option]], self.data_process.get_interest_rates().loc[date,mat],self.data_process.get_prices().loc[date,'12M Div Yield'],option)
-                portfolio_value += option_price[option][mat]*holdings[option][mat]
+        option_price = self.value_options(date,date_index,current_price[:,None],book,cached)
+        portfolio_value = stock*current_price + cash + np.sum(option_price*legs['quantity'], axis = 1)
         
-        return holdings, portfolio_value, cash
+        return stock, cash, portfolio_value, trades
 
+    #Function: Log the transactions of the trades of rebalance_paths for the back test, which has one path.
+    def log_trades(self,date,current_price,holdings,trades):
+        book = self.option_book.legs[0]
+        if trades['bought']:
+            self.transaction_type.log_transaction(date,self.stock_name, holdings[self.stock_name],current_price,'Buy')
+            self.transaction_type.log_transaction(date,self.stock_name, holdings[self.stock_name],self.transaction_costs[self.stock_name],'Transaction Costs')
+            for leg in range(len(self.option_book)):
+                self.transaction_type.log_transaction(date,self.option_book.labels[leg], book['quantity'][leg],book['initial_price'][leg],'Buy')
+                self.transaction_type.log_transaction(date,self.option_book.labels[leg], book['quantity'][leg],self.leg_transaction_costs[leg],'Transaction Costs')
+            return
+
+        if trades['emergency'][0]:
+            print("Insufficient cash {} must be sold to reblance.".format(self.stock_name), 'Date:', date)
+        stock_rebalance = trades['stock_rebalance'][0]
+        if trades['sold'][0]:
+            self.transaction_type.log_transaction(date,self.stock_name, abs((stock_rebalance // self.contract_size) * self.contract_size),current_price,'Sell')
+            self.transaction_type.log_transaction(date,self.stock_name, abs((stock_rebalance // self.contract_size) * self.contract_size),self.transaction_costs[self.stock_name],'Transaction Costs')
 
-    #Provides the payoff from excerising the option and rolling/entering into a new option contract.
-    def option_rebalance_cost(self,holdings,option_expired_holdings,option_payoff,last_maturity,option):
-        roll_option = holdings[option].get(last_maturity,0)*(self.option_purchase_structure[option]['buy']*self.option_initial_price[option][last_maturity] - self.transaction_costs[option])
-        if option_payoff[option] == 0:
-            exercise_trans_cost = 0
-        else:
-            exercise_trans_cost = -self.transaction_costs[option]*option_expired_holdings[option]
-        exercise_option = option_expired_holdings[option]*self.option_purchase_structure[option]['sell']*option_payoff[option] + exercise_trans_cost
+        for option in self.option_maturity.keys():
+            last = self.option_book.series[option].stop - 1
+            if option in trades['rolled']:
+                first_maturity = self.option_maturity[option][0]
+                option_payoff = trades['option_payoff'][option][0]
+                option_expired_holdings = trades['option_expired_holdings'][option][0]
+                self.transaction_type.log_transaction(date,self.option_book.labels[last],book['quantity'][last],book['initial_price'][last],'Buy')
+                self.transaction_type.log_transaction(date,self.option_book.labels[last],book['quantity'][last],self.transaction_costs[option],'Transaction Costs')
+                if option_payoff > 0:
+                    self.transaction_type.log_transaction(date,'{}, Maturity:{}'.format(option,first_maturity), option_expired_holdings,option_payoff,'Sell')
+                    self.transaction_type.log_transaction(date,'{}, Maturity:{}'.format(option,first_maturity), option_expired_holdings,self.transaction_costs[option],'Transaction Costs')
+            if stock_rebalance != 0:
+                for leg in range(self.option_book.series[option].start,last):
+                    self.transaction_type.log_transaction(date,self.option_book.labels[leg],abs(stock_rebalance),trades['option_price'][0,leg],'Sell')
+                    self.transaction_type.log_transaction(date,self.option_book.labels[leg],abs(stock_rebalance),self.transaction_costs[option],'Transaction Costs')
+
+
+    #Provides the payoff from excerising the option and rolling/entering into a new option contract, for every path of the option book.
+    def option_rebalance_cost(self,book,trades,option):
+        legs = book.legs
+        last_leg = book.series[option].stop - 1
+        option_payoff = trades['option_payoff'][option]
+        option_expired_holdings = trades['option_expired_holdings'][option]
+        roll_option = legs['quantity'][:,last_leg]*(self.option_purchase_structure[option]['buy']*legs['initial_price'][:,last_leg] - self.transaction_costs[option])
+        exercise_trans_cost = np.where(option_payoff == 0, 0, -self.transaction_costs[option]*option_expired_holdings)
+        exercise_option = option_expired_holdings*self.option_purchase_structure[option]['sell']*option_payoff + exercise_trans_cost
         return  roll_option + exercise_option
@@ -0,0 +1,116 @@
+import yaml
+import copy
+import itertools
+import contextlib
+import io
+import os
+import multiprocessing
+import numpy as np
+import pandas as pd
+import time
+from utils import *
+import strategies as strategy
+import backtest as backtest
+import analysis as analysis
+
+
+#Parameter sweep: run every strategy in strategy_names over every combination of the parameter grids in the sweep section of config.yaml.
+#Grids are keyed by the dotted config path of the parameter (e.g. 'trend.short_average') and give the list of values to test.
+#A strategy is only run over the grids of the config entries it uses. The runs are spread over a pool of worker processes.
+#Each worker receives the loaded DataProcess once (inherited through fork where available) instead of re-reading the data file.
+#No plots are made. The output is one metrics table with a row per strategy and parameter set.
+
+
+#Loaded data for the worker processes. Set once per worker by init_worker.
+data_process = None
+
+#Function: Store the loaded data in the worker process.
+def init_worker(shared_data_process):
+    global data_process
+    data_process = shared_data_process
+
+#Function: Expand the parameter grids into one config per strategy and parameter combination.
+def expand_grid(config):
+    grid = config['sweep']['grid']
+    runs = []
+    for strategy_name in config['strategy_names']:
+        #Only sweep the parameters the strategy uses.
+        keys = [key for key in grid.keys() if any(key == entry or key.startswith(entry + '.') for entry in strategy.strategy_config[strategy_name])]
+        for values in itertools.product(*[grid[key] for key in keys]):
+            run_config = copy.deepcopy(config)
+            for key, value in zip(keys, values):
+                set_config_value(run_config, key, value)
+            runs.append((strategy_name, dict(zip(keys, values)), run_config))
+    return runs
+
+#Function: Maturities the collar needs implied vols and interest rates for, across all runs.
+#Maturities without their own implied vol sheet or interest rate are interpolated when the data is loaded.
+def required_maturities(runs):
+    maturities = set()
+    for strategy_name, parameters, run_config in runs:
+        if strategy_name == 'Collar':
+            maturities.update(run_config['collar']['call_maturity'])
+            maturities.update(run_config['collar']['put_maturity'])
+    return sorted(maturities)
+
+#Function: Load the data with the implied vols and interest rates of every maturity the runs need.
+def load_data(config, runs):
+    maturities = required_maturities(runs)
+    interpolate_maturity = sorted(set(np.atleast_1d(config['data']['interpolate_maturity']).tolist() + [mat for mat in maturities if str(mat) + 'IV' not in ['30IV', '60IV', '90IV', '180IV', '360IV']]))
+    interpolate_interest_rate = sorted(set(np.atleast_1d(config['data']['interpolate_interest_rate']).tolist() + maturities))
+    return analysis.DataProcess(config['data_file'],interpolate_maturity=interpolate_maturity,interpolate_interest_rate=interpolate_interest_rate,cache_directory=config['data']['cache_directory'],pricing_cache_size=config['data']['pricing_cache_size'],streaming=config['data']['streaming'],chunk_size=config['data']['chunk_size'],required_data=strategy.required_data([run[0] for run in runs]))
+
+#Function: Back test a strategy without output on data (a DataProcess or a DataView). Returns the back test and its performance metrics.
+def backtest_metrics(strategy_name, run_config, data):
+    transaction_log = analysis.Transactions(data)
+    strat = strategy.create_strategy(strategy_name, data, transaction_log, run_config, live = run_config['engine'] == 'stream')
+    #The strategies report days without enough data, which is not needed for every run of the sweep.
+    with contextlib.redirect_stdout(io.StringIO()):
+        backtester = backtest.BackTest(data, strat, transaction_log, stock_name = run_config['stock_name'], starting_balance = run_config['starting_balance'], engine = run_config['engine'])
+    results = analysis.Analysis(data, transaction_log, backtester, strategy_name = strategy_name, directory = None, timestr = None)
+    return backtester, results.calculate_metrics()
+
+#Function: Back test one strategy and parameter set in a worker and return its performance metrics.
+def run_parameter_set(run):
+    strategy_name, parameters, run_config = run
+    metrics = {'Strategy' : strategy_name}
+    metrics.update({key : str(value) if isinstance(value, list) else value for key, value in parameters.items()})
+    metrics.update(backtest_metrics(strategy_name, run_config, data_process)[1])
+    return metrics
+
+#Function: Run all parameter sets over a process pool and combine the metrics into a single table.
+def run_sweep(config, data_process, runs):
+    processes = config['sweep']['processes'] or os.cpu_count()
+    #fork lets the workers share the loaded data without copying it.
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+    with context.Pool(processes = processes, initializer = init_worker, initargs = (data_process,)) as pool:
+        metrics = pool.map(run_parameter_set, runs, chunksize = max(len(runs) // (4*processes), 1))
+    metrics_frame = pd.DataFrame(metrics)
+    #Strategy and parameter columns first, followed by the metrics.
+    parameters = [key for key in config['sweep']['grid'].keys() if key in metrics_frame.columns]
+    return metrics_frame.loc[:,['Strategy'] + parameters + [column for column in metrics_frame.columns if column not in ['Strategy'] + parameters]]
+
+
+def main():
+
+    with open('config.yaml', 'r') as file:
+        config = yaml.safe_load(file)
+
+    timestr = time.strftime("%Y%m%d_%H%M%S")
+    runs = expand_grid(config)
+    data_process = load_data(config, runs)
+
+    metrics_frame = run_sweep(config, data_process, runs)
+    print(metrics_frame)
+
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    directory = str(dir_path)+config['sweep']['directory']+timestr
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    metrics_frame.to_csv('{}/Sweep_Metrics.csv'.format(directory),index=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+import os
+import sys
+import pytest
+
+#The modules of the back tester are imported from the Code directory, as when running main.py.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import benchmark as benchmark
+
+
+#Function: Synthetic workbook with the layout of the data file (benchmark.generate_data), written once per test session.
+@pytest.fixture(scope = 'session')
+def data_file(tmp_path_factory):
+    return benchmark.generate_data(str(tmp_path_factory.mktemp('data') / 'data.xlsx'), 300)
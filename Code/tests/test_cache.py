@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import analysis as analysis
+
+
+#Tests that the processed data loaded from the cache is the same as the data parsed from the data file, including the dtypes and the index.
+
+data_parameters = {'interpolate_maturity' : 270, 'interpolate_interest_rate' : 270}
+
+
+#Function: Cache directory for a DataProcess in a temporary directory. The cache directory is given relative to the Code directory.
+def cache_directory(tmp_path):
+    return '/' + os.path.relpath(str(tmp_path), os.path.dirname(os.path.realpath(analysis.__file__)))
+
+#Function: Every processed frame of a DataProcess by name.
+def processed_frames(data_process):
+    frames = {'prices' : data_process.get_prices(), 'dividends' : data_process.get_dividends(), 'interest_rates' : data_process.get_interest_rates()}
+    frames.update({'implied_vol/' + name : frame for name, frame in data_process.get_implied_vol().items()})
+    return frames
+
+def test_cache_round_trip(data_file, tmp_path):
+    parsed = analysis.DataProcess(data_file, **data_parameters)
+    #The first DataProcess parses the data file and writes the cache, the second only reads the cache.
+    analysis.DataProcess(data_file, cache_directory = cache_directory(tmp_path), **data_parameters)
+    cached = analysis.DataProcess(data_file, cache_directory = cache_directory(tmp_path), **data_parameters)
+    for name in cached.datasets:
+        assert os.path.exists(cached.get_dataset_path(cached.get_cache_path(), name) + '/manifest.json')
+
+    parsed_frames, cached_frames = processed_frames(parsed), processed_frames(cached)
+    assert parsed_frames.keys() == cached_frames.keys()
+    for name, frame in parsed_frames.items():
+        pd.testing.assert_frame_equal(cached_frames[name], frame, check_exact = True, check_index_type = True, check_column_type = True)
+        assert cached_frames[name].index.name == frame.index.name
+
+def test_streamed_chunks_match_parsed_data(data_file, tmp_path):
+    parsed = analysis.DataProcess(data_file, **data_parameters)
+    streamed = analysis.DataProcess(data_file, cache_directory = cache_directory(tmp_path), streaming = True, chunk_size = 70, **data_parameters)
+    prices = pd.concat([chunk['prices'] for chunk in streamed.stream()])
+    pd.testing.assert_frame_equal(prices, parsed.get_prices(), check_exact = True, check_names = False)
+
+def test_text_columns_round_trip(data_file, tmp_path):
+    data_process = analysis.DataProcess(data_file, **data_parameters)
+    prices = data_process.get_prices().copy()
+    prices['Ticker'] = ['ABC' if day % 2 else 'ABCD' for day in range(len(prices))]
+    data_process.prices = prices
+    dataset_path = str(tmp_path / 'prices')
+    data_process.save_cache(dataset_path, 'prices')
+    loaded = data_process.load_frame(dataset_path, data_process.load_manifest(dataset_path), 'prices')
+    assert loaded.loc[:,'Ticker'].dtype == object
+    pd.testing.assert_frame_equal(loaded, prices, check_exact = True)
+
+def test_mixed_object_columns_are_rejected(data_file, tmp_path):
+    data_process = analysis.DataProcess(data_file, **data_parameters)
+    prices = data_process.get_prices().copy()
+    prices['Note'] = np.where(np.arange(len(prices)) % 2 == 0, 'ex', None)
+    data_process.prices = prices
+    with pytest.raises(Exception, match = 'Note column of the prices data'):
+        data_process.save_cache(str(tmp_path / 'prices'), 'prices')
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+import analysis as analysis
+import backtest as backtest
+import strategies as strategy
+from test_collar import collar_parameters
+
+
+#Tests that a back test saved to a checkpoint at day k and resumed on the data with the days after k added gives exactly the portfolio values
+#and transaction log of a back test of all the data. The first k days are a DataView of the data, so both runs read the same history.
+
+strategy_parameters = {'Buy_And_Hold' : (strategy.BuyandHoldStrategy, {'stock_name' : 'Price', 'starting_balance' : 1000000, 'transaction_costs' : 0.01}),
+                       'Trend' : (strategy.TrendStrategy, {'stock_name' : 'Price', 'starting_balance' : 1000000, 'transaction_costs' : 0.01,
+                                                           'short_average' : 3, 'long_average' : 7}),
+                       'Collar' : (strategy.CollarStrategy, collar_parameters)}
+
+#The synthetic data has a dividend ex-date every 63 days from day 60 and pays it 21 days later, so day 70 is saved between an ex-date and its pay date.
+#Day 200 is saved while the collar holds options bought before it.
+checkpoint_days = [70, 200]
+
+
+@pytest.fixture(scope = 'module')
+def data_process(data_file):
+    return analysis.DataProcess(data_file, interpolate_maturity = 270, interpolate_interest_rate = 270)
+
+#Function: Portfolio values and transaction log of a back test of the data, resumed from the checkpoint file if given.
+def run(data, strategy_name, engine, resume_from = None, checkpoint_file = None):
+    strategy_class, parameters = strategy_parameters[strategy_name]
+    transactions = analysis.Transactions(data)
+    #The stream engine runs the collar on the market data of the bars.
+    live = {'live' : True} if engine == 'stream' and strategy_class is strategy.CollarStrategy else {}
+    strat = strategy_class(data, transactions, **parameters, **live)
+    backtester = backtest.BackTest(data, strat, transactions, stock_name = 'Price', starting_balance = parameters['starting_balance'], engine = engine,
+                                   resume_from = resume_from)
+    if checkpoint_file is not None:
+        backtester.save_checkpoint(checkpoint_file)
+    return backtester.get_portfolio_value_frame(), transactions.get_log()
+
+@pytest.mark.parametrize('day', checkpoint_days)
+@pytest.mark.parametrize('engine', ['event','array','vectorized','stream'])
+@pytest.mark.parametrize('strategy_name', strategy_parameters.keys())
+def test_resume_matches_full_run(data_process, tmp_path, strategy_name, engine, day):
+    checkpoint_file = str(tmp_path / 'checkpoint.pkl')
+    values, log = run(analysis.DataView(data_process, 0, day), strategy_name, engine, checkpoint_file = checkpoint_file)
+    assert values.index[-1] == data_process.get_prices().index[day - 1]
+    resumed_values, resumed_log = run(data_process, strategy_name, engine, resume_from = checkpoint_file)
+    full_values, full_log = run(data_process, strategy_name, engine)
+    pd.testing.assert_series_equal(resumed_values, full_values, check_exact = True)
+    pd.testing.assert_frame_equal(resumed_log, full_log, check_exact = True)
+    assert len(full_log) > len(log) > 0
+
+def test_resume_with_another_engine_fails(data_process, tmp_path):
+    checkpoint_file = str(tmp_path / 'checkpoint.pkl')
+    run(analysis.DataView(data_process, 0, 100), 'Trend', 'vectorized', checkpoint_file = checkpoint_file)
+    with pytest.raises(Exception, match = 'vectorized engine'):
+        run(data_process, 'Trend', 'array', resume_from = checkpoint_file)
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.stats as stats
+import analysis as analysis
+import backtest as backtest
+import strategies as strategy
+import simulation as simulation
+
+
+#Tests of the collar strategy on synthetic data. The data starts on 2000-01-03, so the first option maturity dates after it are on month starts,
+#several of which are weekends (e.g. Saturday 2000-04-01).
+
+collar_parameters = {'stock_name' : 'Price', 'starting_balance' : 1000000, 'call_strike' : 1.05, 'call_maturity' : [30], 'put_strike' : 0.95,
+                     'put_maturity' : [90,180,270,360], 'contract_size' : 100, 'cash_buffer_percent' : 0.1,
+                     'transaction_costs' : {'stock' : 0.03, 'option' : 0.04}, 'vol_surface' : False}
+
+
+@pytest.fixture(scope = 'module')
+def data_process(data_file):
+    return analysis.DataProcess(data_file, interpolate_maturity = 270, interpolate_interest_rate = 270)
+
+@pytest.fixture(scope = 'module')
+def results(data_process):
+    return backtest.check_engine_parity(data_process, strategy.CollarStrategy, engines = ['array'], baseline = 'event', **collar_parameters)
+
+def test_engine_parity(results):
+    #check_engine_parity asserts the array engine gives exactly the portfolio values and transaction log of the event loop.
+    values, log = results['event']
+    assert not values.isna().any()
+    assert len(log) > 0
+
+def test_weekend_maturity_rolls_on_next_price_date(data_process, results):
+    log = results['event'][1]
+    dates = data_process.get_prices().index
+    weekend_maturity = pd.Timestamp('2000-04-01')
+    assert weekend_maturity.dayofweek == 5 and weekend_maturity not in dates
+    roll_date = dates[dates.searchsorted(weekend_maturity)]
+    assert roll_date == pd.Timestamp('2000-04-03')
+
+    #Both the 30 day calls and the 90 day puts bought at the start mature on the Saturday. They are rolled on the Monday: the call is bought back and
+    #sold again, and a new longest maturity put is bought.
+    rolled = log.loc[log.index == roll_date]
+    assert set(zip(rolled.loc[:,'Asset'].astype(str), rolled.loc[:,'Transaction Type'].astype(str))) >= {('call, Maturity:30', 'Buy'), ('call, Maturity:30', 'Sell'), ('put, Maturity:360', 'Buy')}
+    #Nothing is traded on the price dates just before the roll.
+    assert not (log.index == dates[dates.searchsorted(weekend_maturity) - 1]).any()
+
+def test_maturity_dates_run_past_the_last_date(data_process):
+    #The maturity dates continue one longest maturity past the last price date, so the options bought near the end of the data mature on
+    #the maturity date nearest to their maturity (the put maturity dates are quarter starts) instead of the first one after the end of the data.
+    collar = strategy.CollarStrategy(data_process, analysis.Transactions(data_process), **collar_parameters)
+    dates = data_process.get_prices().index
+    for option, maturity in collar.option_maturity.items():
+        assert collar.all_option_maturity_dates[option].max() >= dates[-1] + pd.offsets.Day(max(maturity))
+    last_leg_maturity = pd.DatetimeIndex(collar.leg_maturity_dates[-1])
+    assert (np.abs((last_leg_maturity - (dates[-1] + pd.to_timedelta(collar.option_book.maturity, unit = 'D'))).days) <= 46).all()
+
+#Function: Scalar Black Scholes price of a European call/put option with continuous dividends, the formula of utils.BlackScholes before it was batched.
+#The reference for the prices of the batched engine and the pricing cache.
+def reference_price(S,tau,K,sigma,r,q,option_type):
+    F = S * np.exp((r-q)*tau)
+    d1 = 1/(sigma * np.sqrt(tau)) * (np.log(S/K)+(r-q+ (1/2) * sigma ** 2)*tau)
+    d2 = d1 - sigma * np.sqrt(tau)
+    if option_type == 'call':
+        return np.exp(-r*tau) * (F * stats.norm.cdf(d1) - K*stats.norm.cdf(d2))
+    return np.exp(-r*tau) * (K * stats.norm.cdf(-d2) - F*stats.norm.cdf(-d1))
+
+def test_option_prices_match_black_scholes(data_process, results):
+    #Every option bought, at the start and on each roll, is priced at the scalar Black Scholes price of its strike and maturity with the
+    #implied vol, interest rate and dividend yield of the day in the data.
+    log = results['event'][1]
+    prices = data_process.get_prices()
+    implied_vol = data_process.get_implied_vol()
+    interest_rates = data_process.get_interest_rates()
+    strikes = {'call' : collar_parameters['call_strike'], 'put' : collar_parameters['put_strike']}
+    bought = log.loc[(log.loc[:,'Transaction Type'] == 'Buy') & (log.loc[:,'Asset'] != 'Price')]
+    assert len(bought) > len(collar_parameters['call_maturity']) + len(collar_parameters['put_maturity'])
+    for date, (asset, price) in zip(bought.index, zip(bought.loc[:,'Asset'].astype(str), bought.loc[:,'Price'])):
+        option, maturity = asset.split(', Maturity:')
+        maturity = int(maturity)
+        current_price = prices.loc[date,'Price']
+        expected = reference_price(current_price, maturity/365, strikes[option]*current_price, implied_vol[str(maturity) + 'IV'].loc[date,strikes[option]],
+                                   interest_rates.loc[date,maturity], prices.loc[date,'12M Div Yield'], option)
+        assert price == pytest.approx(expected, rel = 1e-10)
+
+#Without a cash buffer the collar sells stock to roll its options.
+@pytest.mark.parametrize('cash_buffer_percent', [0.1, 0.0])
+def test_historical_path_matches_back_test(data_process, cash_buffer_percent):
+    #PathCollarBackTest and BackTest share CollarStrategy.rebalance_paths. The historical prices as one of the simulated paths give exactly the
+    #portfolio values of the back test, whatever the other paths do.
+    parameters = dict(collar_parameters, cash_buffer_percent = cash_buffer_percent)
+    transactions = analysis.Transactions(data_process)
+    backtester = backtest.BackTest(data_process, strategy.CollarStrategy(data_process, transactions, **parameters), transactions, stock_name = 'Price',
+                                   starting_balance = parameters['starting_balance'])
+    if cash_buffer_percent == 0.0:
+        log = transactions.get_log()
+        assert ((log.loc[:,'Asset'] == 'Price') & (log.loc[:,'Transaction Type'] == 'Sell')).any()
+
+    dates = data_process.get_prices().index
+    prices = data_process.get_prices().loc[:,'Price'].to_numpy(dtype = float)
+    path_prices = np.vstack([prices, simulation.gbm_paths(prices, 3, np.random.default_rng(0))])
+    dividends = simulation.path_dividends(data_process.get_calendar(), prices, path_prices)
+    interest_rates = data_process.get_interest_rates().loc[dates,1].to_numpy(dtype = float)
+    collar = strategy.CollarStrategy(data_process, analysis.Transactions(data_process), **parameters)
+    path_values = simulation.PathCollarBackTest(collar, path_prices, dividends, interest_rates, starting_balance = parameters['starting_balance']).get_portfolio_value_frame()
+    np.testing.assert_array_equal(path_values[:,0], backtester.get_portfolio_value_frame().to_numpy())
@@ -0,0 +1,39 @@
+import pytest
+import analysis as analysis
+import backtest as backtest
+import strategies as strategy
+
+
+#Tests that the array, vectorized and stream engines give exactly the same portfolio values and transaction log as the event-driven back test.
+
+strategy_parameters = {'Buy_And_Hold' : (strategy.BuyandHoldStrategy, {}),
+                       'Trend' : (strategy.TrendStrategy, {'short_average' : 20, 'long_average' : 50}),
+                       'Fast_Trend' : (strategy.TrendStrategy, {'short_average' : 3, 'long_average' : 7})}
+
+
+@pytest.fixture(scope = 'module')
+def data_process(data_file):
+    return analysis.DataProcess(data_file, interpolate_maturity = 270, interpolate_interest_rate = 270)
+
+#A starting balance below the price of a share gives buy signals without enough cash, which the trend strategy logs as zero quantity buys.
+@pytest.mark.parametrize('starting_balance', [1000000, 50])
+@pytest.mark.parametrize('strategy_name', strategy_parameters.keys())
+def test_engine_parity(data_process, strategy_name, starting_balance):
+    strategy_class, parameters = strategy_parameters[strategy_name]
+    results = backtest.check_engine_parity(data_process, strategy_class, engines = ['array','vectorized','stream'], baseline = 'event',
+                                           stock_name = 'Price', starting_balance = starting_balance, transaction_costs = 0.01, **parameters)
+    log = results['event'][1]
+    if starting_balance == 1000000:
+        #The strategy trades, so the transaction logs compared are not empty.
+        assert (log.loc[:,'Quantity'] > 0).any()
+    elif strategy_class is strategy.TrendStrategy:
+        assert (log.loc[:,'Quantity'] == 0).any()
+
+def test_engine_parity_detects_differences(data_process):
+    #The vectorized engine rebalances on every buy signal unless the strategy skips unfunded buys. Skipping them for the trend strategy drops its
+    #zero quantity buys, which the check reports.
+    class SkippingTrend(strategy.TrendStrategy):
+        skip_unfunded_buys = True
+    with pytest.raises(AssertionError):
+        backtest.check_engine_parity(data_process, SkippingTrend, engines = ['vectorized'], baseline = 'event', stock_name = 'Price', starting_balance = 50,
+                                     transaction_costs = 0.01, short_average = 3, long_average = 7)
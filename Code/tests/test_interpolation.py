@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+import analysis as analysis
+from utils import interpolate_curves
+
+
+#Tests that the batched interpolation of utils.interpolate_curves and DataProcess.interpolate_data gives the same values as np.interp per curve.
+
+grid = np.array([30, 60, 90, 180, 360], dtype = float)
+#Below, on and above the grid, between grid points and on every grid point.
+points = [0, 10, 30, 45, 60, 75, 90, 120, 180, 270, 359.5, 360, 400]
+
+
+#Function: np.interp of every curve (last axis of fp) on its own.
+def interp_per_curve(x, xp, fp):
+    curves = np.asarray(fp, dtype = float).reshape(-1, len(xp))
+    return np.stack([np.interp(x, xp, curve) for curve in curves]).reshape(np.shape(fp)[:-1] + (len(np.atleast_1d(x)),))
+
+@pytest.mark.parametrize('x', points)
+def test_single_point(x):
+    fp = np.random.default_rng(0).normal(20, 5, (40, 5))
+    np.testing.assert_array_equal(interpolate_curves(x, grid, fp), interp_per_curve(x, grid, fp))
+
+def test_many_points_and_dimensions():
+    fp = np.random.default_rng(1).normal(20, 5, (6, 7, 5))
+    np.testing.assert_array_equal(interpolate_curves(points, grid, fp), interp_per_curve(points, grid, fp))
+
+def test_missing_and_infinite_values():
+    #Every combination of a NaN, inf or -inf value next to a finite value or another of them.
+    special = [np.nan, np.inf, -np.inf, 1.5]
+    fp = np.array([[a, b, c, 20, 25] for a in special for b in special for c in special] + [[d, 10, 15, 20, e] for d in special for e in special])
+    np.testing.assert_array_equal(interpolate_curves(points, grid, fp), interp_per_curve(points, grid, fp))
+
+def test_constant_curve():
+    fp = np.full((3, 5), 0.2)
+    np.testing.assert_array_equal(interpolate_curves(points, grid, fp), interp_per_curve(points, grid, fp))
+
+#Function: The interpolation of DataProcess.interpolate_data before it was vectorized, a loop over every date and strike of one maturity.
+def interpolate_loop(implied_vol, interest_rates, interpolate_maturity, interpolate_interest_rate):
+    implied_vol_maturity = [int(iv_mat[:-2]) for iv_mat in implied_vol.keys()]
+    interpolate_iv = pd.DataFrame(data = 0, index = implied_vol['30IV'].index, columns = implied_vol['30IV'].columns)
+    for date in interpolate_iv.index:
+        interpolate_date = np.zeros((interpolate_iv.shape[1],len(implied_vol)))
+        for j,iv in enumerate(implied_vol.keys()):
+            interpolate_date[:,j] = implied_vol[iv].loc[date].values
+        for strike, iv_per_strike in enumerate(interpolate_date):
+            interpolate_iv.loc[date,interpolate_iv.columns[strike]] = np.interp(interpolate_maturity,implied_vol_maturity,iv_per_strike)
+
+    interpolate_ir = pd.DataFrame(data = 0, index = interest_rates.index, columns = [interpolate_interest_rate])
+    for date in interpolate_ir.index:
+        interpolate_ir.loc[date,interpolate_interest_rate] = np.interp(interpolate_interest_rate, interest_rates.columns.to_numpy(),interest_rates.loc[date].values)
+    return interpolate_iv, interpolate_ir
+
+@pytest.mark.parametrize('maturities', [270, [45, 270, 400]])
+def test_interpolate_data(data_file, maturities):
+    data_process = analysis.DataProcess(data_file, interpolate_maturity = maturities, interpolate_interest_rate = maturities)
+    #Process the data again up to the interpolation, with missing and infinite values added to the implied vols.
+    data_process.read_data()
+    data_process.clean_data()
+    data_process.implied_vol['60IV'].iloc[20:25, 2] = np.nan
+    data_process.implied_vol['180IV'].iloc[30, :] = np.inf
+    data_process.implied_vol['360IV'].iloc[40, 4] = -np.inf
+    implied_vol = {iv : frame.copy() for iv, frame in data_process.implied_vol.items()}
+    interest_rates = data_process.interest_rates.copy()
+    data_process.interpolate_data()
+
+    for maturity in np.atleast_1d(maturities).tolist():
+        interpolate_iv, interpolate_ir = interpolate_loop(implied_vol, interest_rates, maturity, maturity)
+        pd.testing.assert_frame_equal(data_process.implied_vol[str(maturity)+"IV"], interpolate_iv, check_exact = True, check_dtype = False)
+        pd.testing.assert_series_equal(data_process.interest_rates.loc[:,maturity], interpolate_ir.loc[:,maturity], check_exact = True, check_dtype = False)
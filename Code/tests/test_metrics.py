@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+import analysis as analysis
+import backtest as backtest
+import strategies as strategy
+
+
+#Tests that the metrics accumulated during a back test (MetricsAccumulator) match the metrics of the whole portfolio value series (Analysis.calculate_metrics).
+
+accumulated_metrics = ['Terminal Value', 'Annualized Excess Return', 'Annualized Excess Return Volatility', 'Sharpe Ratio', 'Maximum Drawdown']
+
+
+@pytest.fixture(scope = 'module')
+def data_process(data_file):
+    return analysis.DataProcess(data_file, interpolate_maturity = 270, interpolate_interest_rate = 270)
+
+@pytest.fixture(scope = 'module')
+def trend_backtest(data_process):
+    transactions = analysis.Transactions(data_process)
+    strat = strategy.TrendStrategy(data_process, transactions, stock_name = 'Price', starting_balance = 1000000, transaction_costs = 0.01, short_average = 3, long_average = 7)
+    return backtest.BackTest(data_process, strat, transactions, stock_name = 'Price', starting_balance = 1000000, engine = 'event')
+
+#Function: Check accumulated metrics against the metrics of the portfolio value series of the back test.
+def check_metrics(metrics, data_process, backtester):
+    expected = analysis.Analysis(data_process, backtester.transactions, backtester, strategy_name = 'Trend', timestr = '', directory = None).calculate_metrics()
+    for name in accumulated_metrics:
+        assert metrics[name] == pytest.approx(expected[name], rel = 1e-9), name
+    portfolio_value = backtester.get_portfolio_value_frame()
+    assert metrics['Maximum Drawdown Date'] == ((portfolio_value.cummax() - portfolio_value)/portfolio_value.cummax()).idxmax()
+
+def test_update_matches_calculate_metrics(data_process, trend_backtest):
+    #The event loop updates the metrics every day (Welford's method).
+    assert trend_backtest.transactions.get_log().shape[0] > 0
+    check_metrics(trend_backtest.get_metrics(), data_process, trend_backtest)
+
+@pytest.mark.parametrize('splits', [[], [1], [1, 100], [150, 151, 299]])
+def test_extend_matches_calculate_metrics(data_process, trend_backtest, splits):
+    #The days are added with update for the first day and extend for blocks of days after it, whose statistics are merged (Chan's formula).
+    portfolio_value = trend_backtest.get_portfolio_value_frame()
+    dates = portfolio_value.index
+    interest_rates = data_process.get_interest_rates().loc[dates,1].to_numpy(dtype = float)
+    metrics = analysis.MetricsAccumulator()
+    metrics.update(dates[0], portfolio_value.iloc[0], interest_rates[0])
+    for start, stop in zip([1] + splits, splits + [len(dates)]):
+        metrics.extend(dates[start:stop], portfolio_value.to_numpy()[start:stop], interest_rates[start:stop])
+    check_metrics(metrics.get_metrics(), data_process, trend_backtest)
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+import analysis as analysis
+import backtest as backtest
+import benchmark as benchmark
+import strategies as strategy
+
+
+#Tests that the multi-asset back test of a panel gives every asset the portfolio values and transactions of a single stock back test of that asset
+#with the same starting balance.
+
+strategy_parameters = {'Buy_And_Hold' : (strategy.BuyandHoldStrategy, {}),
+                       'Trend' : (strategy.TrendStrategy, {'short_average' : 3, 'long_average' : 7})}
+seeds = [0, 1, 2]
+
+
+#Function: One DataProcess per asset, each with synthetic prices and dividends of its own seed and the interest rates of the first asset.
+@pytest.fixture(scope = 'module')
+def data_processes(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('panel')
+    data_processes = {'Asset {}'.format(seed) : analysis.DataProcess(benchmark.generate_data(str(directory / 'data_{}.xlsx'.format(seed)), 300, seed = seed),
+                                                                     interpolate_maturity = 270, interpolate_interest_rate = 270) for seed in seeds}
+    interest_rates = data_processes['Asset 0'].get_interest_rates()
+    for data_process in data_processes.values():
+        data_process.interest_rates = interest_rates
+    return data_processes
+
+@pytest.mark.parametrize('strategy_name', strategy_parameters.keys())
+def test_panel_matches_single_asset_back_tests(data_processes, strategy_name):
+    strategy_class, parameters = strategy_parameters[strategy_name]
+    panel_data = analysis.PanelData.from_data_processes(data_processes)
+    panel_transactions = analysis.Transactions(panel_data)
+    panel_strategy = strategy_class(panel_data, panel_transactions, stock_name = None, transaction_costs = 0.01, price_column = None, **parameters)
+    panel = backtest.MultiAssetBackTest(panel_data, panel_strategy, panel_transactions, starting_balance = 1000000, allocation = np.ones(len(seeds)))
+    asset_values = panel.get_asset_value_frame()
+    panel_log = panel_transactions.get_log()
+
+    for asset, data_process in data_processes.items():
+        transactions = analysis.Transactions(data_process)
+        strat = strategy_class(data_process, transactions, stock_name = 'Price', transaction_costs = 0.01, **parameters)
+        values = backtest.BackTest(data_process, strat, transactions, stock_name = 'Price', starting_balance = 1000000).get_portfolio_value_frame()
+        #The panel values an asset as holdings times price plus cash, the single stock back test adds the holdings' value to the cash it started the day with.
+        np.testing.assert_allclose(asset_values.loc[:,asset].to_numpy(), values.to_numpy(), rtol = 1e-12)
+
+        #The single stock trend strategy logs a buy signal without enough cash for a share as a zero quantity buy, which the panel does not log.
+        log = transactions.get_log()
+        log = log.loc[log.loc[:,'Quantity'] != 0]
+        asset_log = panel_log.loc[panel_log.loc[:,'Asset'] == asset]
+        assert len(log) > 0
+        pd.testing.assert_index_equal(asset_log.index, log.index)
+        assert (asset_log.loc[:,'Transaction Type'].astype(str).to_numpy() == log.loc[:,'Transaction Type'].astype(str).to_numpy()).all()
+        np.testing.assert_array_equal(asset_log.loc[:,'Quantity'].to_numpy(), log.loc[:,'Quantity'].to_numpy())
+        np.testing.assert_array_equal(asset_log.loc[:,'Price'].to_numpy(), log.loc[:,'Price'].to_numpy())
@@ -0,0 +1,103 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+import analysis as analysis
+import backtest as backtest
+import strategies as strategy
+from test_collar import collar_parameters
+
+
+#Tests that the typed, chunked transaction log gives the same log and aggregates as the list of lists it replaced.
+
+#Function: Transaction log as it was built from a list of [date, asset, quantity, price, transaction type] rows.
+def legacy_log(rows):
+    transactions = np.array(rows)
+    return pd.DataFrame(data = transactions[:,1:], index = transactions[:,0], columns = ['Asset', 'Quantity', 'Price', 'Transaction Type'])
+
+#Function: Turnover and transaction costs as they were calculated from the log.
+def legacy_aggregates(transactions):
+    turnover = (transactions.loc[transactions['Transaction Type'].str.contains('Buy|Sell')]['Quantity']).sum()
+    transaction_costs = transactions.loc[transactions['Transaction Type'] == 'Transaction Costs']
+    return {'Turnover Quantity' : turnover, 'Transaction Costs' : (transaction_costs['Price']).T.dot(transaction_costs['Quantity'])}
+
+#Class: Transaction log that also keeps every transaction as a row of the list of lists log.
+class RecordingTransactions(analysis.Transactions):
+    def __init__(self, data_process, **kwargs):
+        super().__init__(data_process, **kwargs)
+        self.rows = []
+
+    def log_transactions(self,dates,asset,quantities,prices,transaction_type):
+        quantities = np.broadcast_to(np.asarray(quantities, dtype = object), (len(dates),))
+        prices = np.broadcast_to(np.asarray(prices, dtype = object), (len(dates),))
+        for i, date in enumerate(dates):
+            self.rows.append([pd.Timestamp(date), asset if np.ndim(asset) == 0 else asset[i], quantities[i], prices[i], transaction_type])
+        super().log_transactions(dates,asset,quantities,prices,transaction_type)
+
+#Function: Check the log against the list of lists log of the same transactions.
+def check_log(log, rows):
+    expected = legacy_log(rows)
+    assert isinstance(log.index, pd.DatetimeIndex)
+    pd.testing.assert_index_equal(log.index, pd.DatetimeIndex(expected.index))
+    assert log.columns.tolist() == expected.columns.tolist()
+    assert log.loc[:,'Quantity'].dtype == np.float64 and log.loc[:,'Price'].dtype == np.float64
+    np.testing.assert_array_equal(log.loc[:,'Quantity'].to_numpy(), expected.loc[:,'Quantity'].to_numpy(dtype = float))
+    np.testing.assert_array_equal(log.loc[:,'Price'].to_numpy(), expected.loc[:,'Price'].to_numpy(dtype = float))
+    #The assets are coded in the order they were first logged, the transaction types in the order of Transactions.transaction_types.
+    codes, assets = pd.factorize(expected.loc[:,'Asset'])
+    assert log.loc[:,'Asset'].cat.categories.tolist() == assets.tolist()
+    np.testing.assert_array_equal(log.loc[:,'Asset'].cat.codes.to_numpy(), codes)
+    assert log.loc[:,'Transaction Type'].cat.categories.tolist() == analysis.Transactions.transaction_types
+    np.testing.assert_array_equal(log.loc[:,'Transaction Type'].astype(str).to_numpy(), expected.loc[:,'Transaction Type'].to_numpy(dtype = str))
+
+def test_log_matches_list_of_lists_across_chunks():
+    transactions = RecordingTransactions(None, chunk_size = 4)
+    dates = pd.date_range('2000-01-03', periods = 6, freq = 'B')
+    transactions.log_transaction(dates[0], 'Price', 100.0, 99.5, 'Buy')
+    transactions.log_transaction(dates[0], 'Price', 100.0, 0.03, 'Transaction Costs')
+    transactions.log_transaction(dates[1], 'put, Maturity:90', 25.0, 1.25, 'Buy')
+    #A batch of dividends written across the end of the first chunk and into the second.
+    transactions.log_transactions(dates[2:6], 'Price', 100.0, [0.1, 0.2, 0.3, 0.4], 'Dividend')
+    transactions.log_transactions(dates[5:6], ['put, Maturity:90'], [25.0], [0.5], 'Sell')
+    transactions.log_transaction(dates[5], 'Price', 50.0, 101.0, 'Sell')
+    assert len(transactions.chunks) == 3 and len(transactions) == 9
+    check_log(transactions.get_log(), transactions.rows)
+    assert transactions.get_aggregates() == legacy_aggregates(legacy_log(transactions.rows))
+    #Logging after the log was read adds to the consolidated ledger.
+    transactions.log_transaction(dates[5], 'Price', 50.0, 0.03, 'Transaction Costs')
+    check_log(transactions.get_log(), transactions.rows)
+    assert transactions.get_aggregates() == legacy_aggregates(legacy_log(transactions.rows))
+
+def test_csv_output():
+    #Quantities and prices are written as floats and the dates as the dates of a DatetimeIndex.
+    transactions = analysis.Transactions(None)
+    transactions.log_transaction(pd.Timestamp('2000-01-03'), 'Price', 100, 99.5, 'Buy')
+    transactions.log_transaction(pd.Timestamp('2000-01-03'), 'Price', 100, 1, 'Transaction Costs')
+    assert transactions.get_log().to_csv().splitlines() == [',Asset,Quantity,Price,Transaction Type', '2000-01-03,Price,100.0,99.5,Buy', '2000-01-03,Price,100.0,1.0,Transaction Costs']
+
+def test_empty_log():
+    transactions = analysis.Transactions(None)
+    log = transactions.get_log()
+    assert len(log) == 0 and isinstance(log.index, pd.DatetimeIndex)
+    assert log.columns.tolist() == ['Asset', 'Quantity', 'Price', 'Transaction Type']
+    assert log.loc[:,'Quantity'].dtype == np.float64 and log.loc[:,'Transaction Type'].dtype == 'category'
+    assert transactions.get_aggregates() == {'Turnover Quantity' : 0, 'Transaction Costs' : 0}
+    with pytest.raises(Exception, match = 'valid transaction type'):
+        transactions.log_transaction(pd.Timestamp('2000-01-03'), 'Price', 1, 1, 'Exercise')
+
+@pytest.mark.parametrize('engine', ['event','vectorized'])
+@pytest.mark.parametrize('strategy_name', ['Trend','Collar'])
+def test_back_test_log_and_aggregates(data_file, strategy_name, engine):
+    data_process = analysis.DataProcess(data_file, interpolate_maturity = 270, interpolate_interest_rate = 270)
+    transactions = RecordingTransactions(data_process, chunk_size = 16)
+    if strategy_name == 'Trend':
+        strat = strategy.TrendStrategy(data_process, transactions, stock_name = 'Price', starting_balance = 1000000, transaction_costs = 0.01, short_average = 3, long_average = 7)
+    else:
+        #Without a cash buffer the collar sells stock and options to roll its options.
+        strat = strategy.CollarStrategy(data_process, transactions, **dict(collar_parameters, cash_buffer_percent = 0.0))
+    backtest.BackTest(data_process, strat, transactions, stock_name = 'Price', starting_balance = 1000000, engine = engine)
+    log = transactions.get_log()
+    assert set(log.loc[:,'Transaction Type']) == set(analysis.Transactions.transaction_types)
+    check_log(log, transactions.rows)
+    assert transactions.get_aggregates() == legacy_aggregates(legacy_log(transactions.rows))
+    pd.testing.assert_frame_equal(pd.read_csv(io.StringIO(log.to_csv()), index_col = 0), pd.read_csv(io.StringIO(legacy_log(transactions.rows).to_csv()), index_col = 0))
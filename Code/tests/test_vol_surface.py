@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+import analysis as analysis
+
+
+#Tests of the first date with implied vol data on the vol surface, for one option and for arrays of options.
+
+@pytest.fixture
+def vol_surface(data_file):
+    vol_surface = analysis.DataProcess(data_file, interpolate_maturity = 270, interpolate_interest_rate = 270).get_vol_surface()
+    #The implied vols start on day 10. The 90 day, 0.95 strike vol is also missing on days 10 to 19.
+    vol_surface.grid = vol_surface.grid.copy()
+    vol_surface.grid[10:20, np.flatnonzero(vol_surface.strikes == 0.95)[0], np.flatnonzero(vol_surface.maturities == 90)[0]] = 0
+    return vol_surface
+
+def test_data_start_uses_the_grid_points_around_the_option(vol_surface):
+    assert vol_surface.data_start(1.05, 30/365)[1] == 10
+    #On a grid point only that point is used, between grid points the points around the option are used.
+    assert vol_surface.data_start(0.95, 90/365)[1] == 20
+    assert vol_surface.data_start(0.96, 120/365)[1] == 20
+    assert vol_surface.data_start(0.9, 90/365)[1] == 10
+    assert vol_surface.data_start(0.975, 90/365)[1] == 10
+
+def test_data_start_of_arrays_needs_data_for_every_option(vol_surface):
+    moneyness = np.array([1.05, 0.9, 0.96])
+    tau = np.array([30, 90, 120])/365
+    available, start = vol_surface.data_start(moneyness, tau)
+    np.testing.assert_array_equal(available, np.logical_and.reduce([vol_surface.data_start(x, y)[0] for x, y in zip(moneyness, tau)]))
+    assert start == 20
+    #Arrays are broadcast together.
+    assert vol_surface.data_start(moneyness[:2], 90/365)[1] == 10
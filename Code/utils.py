@@ -1,33 +1,154 @@
 import numpy as np
-import scipy.stats as stats
+import collections
+import pickle
+import os
 
 #Function: Equation for price of a European call/put option in the Black Scholes model with continious dividends
 def BlackScholes(S,T_Mat,t,K,sigma,r,q,option_type):
-    tau = T_Mat - t
+    return black_scholes(S,T_Mat - t,K,sigma,r,q,option_type)[()]
+
+#Function: Black Scholes prices of many European call/put options at once with continuous dividends.
+#The inputs are numbers or numpy arrays that are broadcast together, e.g. every option held or every day of the back test in one call.
+#option_type is 'call', 'put' or an array of them. The normal CDF is scipy's ndtr ufunc, which avoids the overhead of scipy.stats.
+#When greeks is True the delta, gamma, vega, theta (per year) and rho are returned with the prices from the same calculation.
+#scipy is imported on the first call, so runs that price no options do not load it.
+def black_scholes(S,tau,K,sigma,r,q,option_type,greeks = False):
+    import scipy.special as special
+    S, tau, K, sigma, r, q = (np.asarray(value, dtype = float) for value in (S, tau, K, sigma, r, q))
+    option_type = np.asarray(option_type)
+    call = option_type == 'call'
+    if not np.all(call | (option_type == 'put')):
+        raise Exception("Please input a valid option type.")
     F = S * np.exp((r-q)*tau)
     d1 = 1/(sigma * np.sqrt(tau)) * (np.log(S/K)+(r-q+ (1/2) * sigma ** 2)*tau)
     d2 = d1 - sigma * np.sqrt(tau)
-    if option_type == 'call':
-        C_P = np.exp(-r*tau) * (F * stats.norm.cdf(d1) - K*stats.norm.cdf(d2))
-    elif option_type == 'put':
-        C_P = np.exp(-r*tau) * (K * stats.norm.cdf(-d2) - F*stats.norm.cdf(-d1))
-    else:
-        raise Exception("Please input a valid option type.")
-    return C_P
+    discount = np.exp(-r*tau)
+    C_P = np.where(call, discount * (F * special.ndtr(d1) - K*special.ndtr(d2)), discount * (K * special.ndtr(-d2) - F*special.ndtr(-d1)))
+    if not greeks:
+        return C_P
+
+    dividend_discount = np.exp(-q*tau)
+    density = np.exp(-d1**2/2)/np.sqrt(2*np.pi)
+    N1 = np.where(call, special.ndtr(d1), -special.ndtr(-d1))
+    N2 = np.where(call, special.ndtr(d2), -special.ndtr(-d2))
+    greek_values = {}
+    greek_values['delta'] = dividend_discount * N1
+    greek_values['gamma'] = dividend_discount * density / (S * sigma * np.sqrt(tau))
+    greek_values['vega'] = S * dividend_discount * density * np.sqrt(tau)
+    greek_values['theta'] = -S * dividend_discount * density * sigma / (2*np.sqrt(tau)) - r * K * discount * N2 + q * S * dividend_discount * N1
+    greek_values['rho'] = K * tau * discount * N2
+    return C_P, greek_values
+
+#Class: Bounded cache of Black Scholes prices keyed on the pricing inputs (spot, time to expiry, strike, vol, interest rate, dividend yield and option type).
+#Once max_size prices are stored the least recently used price is evicted. Hits and misses are counted.
+#The cache can be saved to a file and is loaded from it when created, so runs on the same data reuse the prices.
+class PricingCache:
+
+    def __init__(self, max_size = 100000, file = None):
+        self.max_size = max_size
+        self.file = file
+        self.prices = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if self.file is not None and os.path.exists(self.file):
+            self.load()
 
-#Function: Payoff of a call/put option at expiry
+    #Function: Prices of the options, with the same inputs as black_scholes. Only the options that are not in the cache are priced, in one call to black_scholes.
+    def price(self,S,tau,K,sigma,r,q,option_type):
+        inputs = np.broadcast_arrays(np.asarray(S, dtype = float), np.asarray(tau, dtype = float), np.asarray(K, dtype = float), np.asarray(sigma, dtype = float), np.asarray(r, dtype = float), np.asarray(q, dtype = float), np.asarray(option_type))
+        shape = inputs[0].shape
+        inputs = [np.ravel(values) for values in inputs]
+        keys = list(zip(*[values.tolist() for values in inputs]))
+        prices = np.empty(len(keys))
+        missing = []
+        for i, key in enumerate(keys):
+            price = self.prices.get(key)
+            if price is None:
+                missing.append(i)
+            else:
+                self.prices.move_to_end(key)
+                prices[i] = price
+        self.hits += len(keys) - len(missing)
+
+        if len(missing) > 0:
+            prices[missing] = black_scholes(*[values[missing] for values in inputs])
+            for i in missing:
+                self.prices[keys[i]] = prices[i]
+            while len(self.prices) > self.max_size:
+                self.prices.popitem(last = False)
+            self.misses += len(missing)
+        return prices.reshape(shape)
+
+    def get_statistics(self):
+        lookups = self.hits + self.misses
+        return {'Hits' : self.hits, 'Misses' : self.misses, 'Size' : len(self.prices), 'Hit Rate' : self.hits / lookups if lookups > 0 else np.nan}
+
+    #Function: Save the cached prices. Written to a temporary file first so a partially written cache is never read.
+    def save(self):
+        if self.file is None:
+            return
+        with open(self.file + '.tmp{}'.format(os.getpid()), 'wb') as file:
+            pickle.dump(self.prices, file)
+        os.replace(self.file + '.tmp{}'.format(os.getpid()), self.file)
+
+    def load(self):
+        with open(self.file, 'rb') as file:
+            self.prices = pickle.load(file)
+        while len(self.prices) > self.max_size:
+            self.prices.popitem(last = False)
+
+#Function: Linear interpolation of every curve in fp (along the last axis) at the points x. Equivalent to calling np.interp for each curve.
+#fp can have any number of leading axes (e.g. date x strike x maturity) so a whole history of curves is interpolated in one call.
+#Points outside of xp take the value of the nearest end point. The result has shape fp.shape[:-1] + (len(x),).
+def interpolate_curves(x, xp, fp):
+    x = np.atleast_1d(np.asarray(x, dtype = float))
+    xp = np.asarray(xp, dtype = float)
+    fp = np.asarray(fp, dtype = float)
+    j = np.clip(np.searchsorted(xp, x, side = 'right') - 1, 0, len(xp) - 2)
+    left = fp[..., j]
+    right = fp[..., j + 1]
+    with np.errstate(invalid = 'ignore'):
+        slope = (right - left) / (xp[j + 1] - xp[j])
+        curve = slope * (x - xp[j]) + left
+        #Same handling of missing and infinite values as np.interp.
+        curve = np.where(np.isnan(curve), slope * (x - xp[j + 1]) + right, curve)
+    curve = np.where(np.isnan(curve) & (left == right), left, curve)
+    curve = np.where(x == xp[j], left, curve)
+    curve = np.where(x < xp[0], fp[..., :1], curve)
+    curve = np.where(x >= xp[-1], fp[..., -1:], curve)
+    return curve
+
+#Function: Payoff of a call/put option at expiry. S and K can be numpy arrays, e.g. one price per simulated path.
 def OptionPayoff(S,K,option_type):
     if option_type == 'call':
-        payoff = max(S-K,0)
+        payoff = np.maximum(S-K,0)
     elif option_type == 'put':
-        payoff = max(K-S,0)
+        payoff = np.maximum(K-S,0)
     else:
         raise Exception("Please input a valid option type.")
     return payoff
 
 #Function: Find nearest integer to x that is divisible by y. 
 #Used in collar strategy for ensuring numnber of stocks purchased can be evenly split between all put option contracts.
+#x can be a numpy array. Halves are rounded to even, as with round.
 def nearest_divisible(x, y):    
-    near_multiple = round(x / y)
+    near_multiple = np.round(x / y)
     closest_number = near_multiple * y
     return closest_number
+
+#Function: Flatten a nested config into a dictionary keyed by the dotted path of each entry (e.g. 'trend.short_average').
+def flatten_config(config, prefix = ''):
+    flat = {}
+    for key, value in config.items():
+        if isinstance(value, dict):
+            flat.update(flatten_config(value, prefix + str(key) + '.'))
+        else:
+            flat[prefix + str(key)] = value
+    return flat
+
+#Function: Set the entry of a nested config at a dotted path (e.g. 'trend.short_average').
+def set_config_value(config, key, value):
+    *sections, name = key.split('.')
+    for section in sections:
+        config = config[section]
+    config[name] = value
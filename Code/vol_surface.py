@@ -0,0 +1,66 @@
+import numpy as np
+
+
+#Class: Implied vol surface of the data as a date x strike x maturity grid, built once per dataset from the implied vol tabs.
+#Strikes are the moneyness columns of the tabs (strike over stock price) and maturities the days of the tabs (e.g. 30 for '30IV').
+#Between grid points the vol is linear in moneyness and maturity. The coefficients of each grid cell (a + b*x + c*y + d*x*y, with x and y
+#the position in the cell along moneyness and maturity) are calculated once, so a query is a search of both axes and one evaluation.
+#Outside the grid the vol of the nearest edge is used, as in utils.interpolate_curves. The grid is padded with a copy of its last strike and maturity
+#one unit further out, so that the vols of the edges and of the grid points are returned exactly.
+#Queries are batched: the dates, moneyness and times to expiry are arrays that are broadcast together, e.g. every leg of an option book or every path of a simulation.
+class VolSurface:
+
+    def __init__(self, data_process):
+        self.data_process = data_process
+        self.dates = self.data_process.get_prices().index
+        implied_vol = self.data_process.get_implied_vol()
+        names = sorted(implied_vol.keys(), key = lambda iv_mat: int(iv_mat[:-2]))
+        self.maturities = np.array([int(name[:-2]) for name in names], dtype = float)
+        self.strikes = np.array(implied_vol[names[0]].columns, dtype = float)
+        strike_order = np.argsort(self.strikes)
+        self.strikes = self.strikes[strike_order]
+        #Missing implied vols are 0 in the tabs.
+        grid = np.stack([implied_vol[name].reindex(self.dates).to_numpy(dtype = float)[:, strike_order] for name in names], axis = -1)
+        self.strikes = np.append(self.strikes, self.strikes[-1] + 1)
+        self.maturities = np.append(self.maturities, self.maturities[-1] + 1)
+        grid = np.concatenate([grid, grid[:, -1:]], axis = 1)
+        self.grid = np.concatenate([grid, grid[:, :, -1:]], axis = 2)
+        self.coefficients = self.cell_coefficients(self.grid)
+
+    #Function: Coefficients a, b, c and d of every grid cell, as a date x strike cell x maturity cell x 4 array.
+    def cell_coefficients(self, grid):
+        v00 = grid[:, :-1, :-1]
+        v10 = grid[:, 1:, :-1]
+        v01 = grid[:, :-1, 1:]
+        v11 = grid[:, 1:, 1:]
+        return np.stack([v00, v10 - v00, v01 - v00, v11 - v10 - v01 + v00], axis = -1)
+
+    #Function: Cell and position in the cell of values along an axis of the grid. Values outside the axis are moved to its edge.
+    def locate(self, axis, values):
+        cell = np.clip(np.searchsorted(axis, values, side = 'right') - 1, 0, len(axis) - 2)
+        position = np.clip((values - axis[cell]) / (axis[cell + 1] - axis[cell]), 0, 1)
+        return cell, position
+
+    #Function: Implied vol at date positions, moneyness (strike over stock price) and times to expiry in years.
+    def implied_vol(self, date_index, moneyness, tau):
+        date_index, moneyness, tau = np.broadcast_arrays(np.asarray(date_index), np.asarray(moneyness, dtype = float), np.asarray(tau, dtype = float))
+        #Rounded so that the float error of strike/price and tau*365 lands on the grid points.
+        strike_cell, x = self.locate(self.strikes, np.round(moneyness, 10))
+        maturity_cell, y = self.locate(self.maturities, np.round(tau * 365, 10))
+        coefficients = self.coefficients[date_index, strike_cell, maturity_cell]
+        return coefficients[..., 0] + coefficients[..., 1] * x + coefficients[..., 2] * y + coefficients[..., 3] * x * y
+
+    #Function: Whether the grid points used for a moneyness and time to expiry in years have data (non-zero) on each date,
+    #and the position of the first date with data (-1 if there is none). Same layout as EventCalendar.data_start.
+    #The moneyness and times to expiry can be arrays that are broadcast together. A date has data when it has data for all of them.
+    #A corner of a cell is only used when the position in the cell is past its lower grid point.
+    def data_start(self, moneyness, tau):
+        moneyness, tau = np.broadcast_arrays(np.asarray(moneyness, dtype = float), np.asarray(tau, dtype = float))
+        strike_cell, x = self.locate(self.strikes, np.round(moneyness.ravel(), 10))
+        maturity_cell, y = self.locate(self.maturities, np.round(tau.ravel() * 365, 10))
+        available = np.ones(len(self.dates), dtype = bool)
+        for strike_step, strike_used in [(0, x >= 0), (1, x > 0)]:
+            for maturity_step, maturity_used in [(0, y >= 0), (1, y > 0)]:
+                points = self.grid[:, strike_cell + strike_step, maturity_cell + maturity_step]
+                available &= np.all((points != 0) | ~(strike_used & maturity_used), axis = 1)
+        return available, np.argmax(available) if available.any() else -1
@@ -0,0 +1,142 @@
+import yaml
+import os
+import time
+import multiprocessing
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import analysis as analysis
+import sweep as sweep
+
+
+#Walk-forward analysis: split the history into rolling in-sample/out-of-sample windows. In each window the parameters of every strategy in the
+#walkforward section are picked over the sweep grids on the in-sample days (the set with the highest objective metric) and back tested on the
+#following out-of-sample days. The window moves forward by out_of_sample days, so the out-of-sample segments follow each other without overlap.
+#Windows are independent and run on a pool of worker processes sharing the loaded DataProcess. Each window back tests on DataViews, zero-copy
+#date-range views of the DataProcess frames, so no frame is copied per window and the indicators of the whole history are reused.
+#The out-of-sample portfolio values of each strategy are chained into one equity curve, each segment continuing from the end value of the previous one.
+
+
+#Loaded data for the worker processes. Set once per worker by init_worker.
+data_process = None
+
+#Function: Store the loaded data in the worker process.
+def init_worker(shared_data_process):
+    global data_process
+    data_process = shared_data_process
+
+#Function: Windows of the walk-forward analysis as (in-sample start, out-of-sample start, out-of-sample stop) positions in the price dates.
+#The last window stops at the last date and is shorter when the days left are fewer than out_of_sample.
+def walk_forward_windows(days, in_sample, out_of_sample):
+    windows = []
+    start = 0
+    while start + in_sample < days:
+        windows.append((start, start + in_sample, min(start + in_sample + out_of_sample, days)))
+        start += out_of_sample
+    return windows
+
+#Function: Pick the parameters of each strategy on the in-sample days of a window and back test them on the out-of-sample days in a worker.
+#Returns a row of results and the out-of-sample portfolio values per strategy.
+def run_window(task):
+    window, (start, split, stop), config = task
+    settings = config['walkforward']
+    objective = settings['objective']
+    in_sample = analysis.DataView(data_process, start, split)
+    out_of_sample = analysis.DataView(data_process, split, stop)
+    results = []
+    for strategy_name in settings['strategy_names']:
+        runs = sweep.expand_grid(dict(config, strategy_names = [strategy_name]))
+        scores = [sweep.backtest_metrics(strategy_name, run_config, in_sample)[1][objective] for _, _, run_config in runs]
+        #Parameter sets without a valid objective (e.g. no trades in the window) are never picked, unless none has one.
+        scores = np.where(np.isfinite(scores), scores, -np.inf)
+        _, parameters, run_config = runs[int(np.argmax(scores))]
+        backtester, metrics = sweep.backtest_metrics(strategy_name, run_config, out_of_sample)
+
+        row = {'Window' : window, 'Strategy' : strategy_name, 'In-Sample Start' : in_sample.dates[0], 'Out-of-Sample Start' : out_of_sample.dates[0], 'Out-of-Sample End' : out_of_sample.dates[-1]}
+        row.update({key : str(value) if isinstance(value, list) else value for key, value in parameters.items()})
+        row['In-Sample ' + objective] = np.max(scores)
+        row.update({'Out-of-Sample ' + key : value for key, value in metrics.items()})
+        results.append((row, backtester.get_portfolio_value_frame()))
+    return results
+
+#Function: Chain the out-of-sample portfolio values of the windows into one equity curve. Each window starts with starting_balance,
+#so its values are scaled by the end value of the curve so far over starting_balance.
+def stitch(portfolio_values, starting_balance):
+    segments = []
+    value = starting_balance
+    for segment in portfolio_values:
+        segment = segment * (value / starting_balance)
+        segments.append(segment)
+        if segment.notnull().any():
+            value = segment.dropna().iloc[-1]
+    return pd.concat(segments)
+
+#Function: Run the windows over a process pool. Returns the table of window results and the stitched equity curve of each strategy.
+def run_walk_forward(config, data_process):
+    settings = config['walkforward']
+    windows = walk_forward_windows(len(data_process.get_prices()), settings['in_sample'], settings['out_of_sample'])
+    if len(windows) == 0:
+        raise Exception("Please input an in_sample period shorter than the data.")
+    processes = settings['processes'] or min(len(windows), os.cpu_count())
+    #fork lets the workers share the loaded data without copying it.
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+    with context.Pool(processes = processes, initializer = init_worker, initargs = (data_process,)) as pool:
+        window_results = pool.map(run_window, [(window, positions, config) for window, positions in enumerate(windows)], chunksize = 1)
+
+    rows = [row for results in window_results for row, _ in results]
+    equity = pd.DataFrame({strategy_name : stitch([portfolio_value for results in window_results for row, portfolio_value in results if row['Strategy'] == strategy_name], config['starting_balance'])
+                           for strategy_name in settings['strategy_names']})
+    equity.index.name = 'Date'
+    return pd.DataFrame(rows), equity
+
+#Function: Performance metrics of the stitched equity curves.
+def equity_metrics(equity, data_process):
+    interest_rates = data_process.get_interest_rates().loc[:,1].reindex(equity.index).to_numpy()
+    metrics = {}
+    for strategy_name in equity.columns:
+        accumulator = analysis.MetricsAccumulator()
+        accumulator.extend(equity.index, equity.loc[:,strategy_name].to_numpy(), interest_rates)
+        metrics[strategy_name] = accumulator.get_metrics()
+    metrics = pd.DataFrame(metrics)
+    metrics.index.name = 'Performance Metric'
+    return metrics
+
+def save_chart(equity, directory):
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    for strategy_name in equity.columns:
+        equity.loc[:,strategy_name].plot(ax = axes, label = strategy_name)
+    axes.legend()
+    axes.set_xlabel('Date')
+    axes.set_ylabel('Portfolio Value ($)')
+    axes.set_title('Walk-Forward Out-of-Sample Portfolio Values')
+    figure.savefig('{}/Walk_Forward.png'.format(directory))
+
+def main():
+
+    with open('config.yaml', 'r') as file:
+        config = yaml.safe_load(file)
+
+    timestr = time.strftime("%Y%m%d_%H%M%S")
+    data_process = sweep.load_data(config, sweep.expand_grid(dict(config, strategy_names = config['walkforward']['strategy_names'])))
+    windows, equity = run_walk_forward(config, data_process)
+    metrics = equity_metrics(equity, data_process)
+    print(windows)
+    print(metrics)
+
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    directory = str(dir_path)+config['walkforward']['directory']+timestr
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    windows.to_csv('{}/Walk_Forward_Windows.csv'.format(directory),index=False)
+    equity.to_csv('{}/Walk_Forward_Equity.csv'.format(directory))
+    metrics.to_csv('{}/Walk_Forward_Metrics.csv'.format(directory))
+    save_chart(equity, directory)
+
+if __name__ == '__main__':
+    main()